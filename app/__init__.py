@@ -4,12 +4,15 @@ Church Information System - Application Factory
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from app.cache import Cache
+from app.database import RoutingSession
 from config import config
 import os
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
+cache = Cache()
 
 def create_app(config_name='development'):
     """Create and configure the Flask application"""
@@ -22,13 +25,26 @@ def create_app(config_name='development'):
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize extensions
+    from app import database
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
+    cache.init_app(app)
+    
+    from app import instrumentation, auth, counters, jobs, fragments, assets, sync
+    instrumentation.init_app(app)
+    fragments.init_app(app)
+    assets.init_app(app)
+    auth.init_app(app)
+    counters.init_app(app)
+    sync.init_app(app)
+    jobs.init_app(app)
     
     # Register blueprints
-    from app.routes import auth_bp, main_bp, members_bp, caregroups_bp, settings_bp, admin_bp
+    from app.routes import auth_bp, main_bp, members_bp, caregroups_bp, settings_bp, admin_bp, attendance_bp, reports_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -36,22 +52,43 @@ def create_app(config_name='development'):
     app.register_blueprint(caregroups_bp)
     app.register_blueprint(settings_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(attendance_bp)
+    app.register_blueprint(reports_bp)
+    
+    from app.api import api_bp
+    app.register_blueprint(api_bp)
     
-    # Create database tables
+    # CLI commands
+    from app.migrations import schema_cli
+    from app.importer import members_cli
+    from app.jobs import jobs_cli
+    from app.assets import assets_cli
+    from app.reports import reports_cli
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(members_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(reports_cli)
+    
+    # Create or migrate database tables
     with app.app_context():
-        db.create_all()
+        from app import migrations
+        migrations.upgrade()
+        
+        # Full-text search index over members
+        from app import search
+        search.ensure_index()
         # Initialize default data
         from app.models import User, CareGroup, Setting, Ministry
         
         # Create default admin if no users exist
         if User.query.first() is None:
-            from werkzeug.security import generate_password_hash
             admin = User(
                 username='admin',
-                password=generate_password_hash('admin123'),
                 role='admin',
                 status='active'
             )
+            admin.set_password('admin123')
             db.session.add(admin)
             
             # Create default care groups
@@ -77,23 +114,25 @@ def create_app(config_name='development'):
                 db.session.add(ministry)
             
             # Create default settings
-            default_settings = [
-                Setting(setting_name='church_name', setting_value='Mountain Brook Church'),
-                Setting(setting_name='church_address', setting_value=''),
-                Setting(setting_name='church_contact', setting_value=''),
-                Setting(setting_name='default_theme', setting_value='light'),
-                Setting(setting_name='items_per_page', setting_value='10'),
-                Setting(setting_name='enable_baptism_field', setting_value='true'),
-            ]
-            for setting in default_settings:
-                db.session.add(setting)
+            from app.settings_store import DEFAULTS
+            for name, value in DEFAULTS.items():
+                db.session.add(Setting(setting_name=name, setting_value=value))
             
             db.session.commit()
+        
+        # Don't hand startup connections to forked gunicorn workers
+        database.release_connections()
+    
+    # Settings available to every template as site_settings
+    @app.context_processor
+    def inject_settings():
+        from app.settings_store import settings
+        return {'site_settings': settings}
     
-    # User loader for Flask-Login
+    # User loader for Flask-Login (short-TTL identity cache, see app/auth.py)
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        from app import auth
+        return auth.load_user(user_id)
     
     return app
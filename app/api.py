@@ -0,0 +1,482 @@
+"""
+Church Information System - JSON API (v1)
+"""
+import hashlib
+from datetime import date, datetime
+from functools import wraps
+from flask import Blueprint, current_app, jsonify, request, make_response
+from flask_login import current_user
+from app import db, cache, queries, sync, attendance, reports, typeahead
+from app.models import Member, CareGroup, Ministry, User
+from app.pagination import keyset_paginate
+from app.database import use_replica, use_primary
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Public field name -> column, per resource. Joined names are only
+# selected (and joined) when a client asks for them.
+MEMBER_FIELDS = {
+    'id': Member.id,
+    'fullname': Member.fullname,
+    'gender': Member.gender,
+    'date_of_birth': Member.date_of_birth,
+    'age': Member.age,
+    'address': Member.address,
+    'contact': Member.contact,
+    'baptism_date': Member.baptism_date,
+    'ministry_id': Member.ministry_id,
+    'ministry': Ministry.name,
+    'caregroup_id': Member.caregroup_id,
+    'caregroup': CareGroup.name,
+    'status': Member.status,
+    'created_at': Member.created_at,
+    'updated_at': Member.updated_at,
+}
+
+CAREGROUP_FIELDS = {
+    'id': CareGroup.id,
+    'name': CareGroup.name,
+    'color': CareGroup.color,
+    'leader_id': CareGroup.leader_id,
+    'leader': User.username,
+    'status': CareGroup.status,
+    'created_at': CareGroup.created_at,
+    'updated_at': CareGroup.updated_at,
+    'member_count': CareGroup.member_count,
+}
+
+MINISTRY_FIELDS = {
+    'id': Ministry.id,
+    'name': Ministry.name,
+    'description': Ministry.description,
+    'status': Ministry.status,
+    'created_at': Ministry.created_at,
+    'updated_at': Ministry.updated_at,
+    'member_count': Ministry.member_count,
+}
+
+
+class FieldError(ValueError):
+    """Raised for an unknown sparse fieldset entry"""
+
+
+# ==================== HELPERS ====================
+
+def api_login_required(f):
+    """Like login_required, but answers with 401 JSON instead of a redirect"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return error('Authentication required.', 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def error(message, status):
+    return jsonify({'success': False, 'message': message}), status
+
+
+def json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def requested_fields(available):
+    """Field names from ?fields=a,b (always including id), in request order"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(available)
+    names = ['id']
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in available:
+            raise FieldError(name)
+        names.append(name)
+    return names
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional(etag, build):
+    """Return 304 when the client already has etag, else build the body"""
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def rows_to_dicts(names, rows):
+    return [{name: json_value(value) for name, value in zip(names, row)} for row in rows]
+
+
+def _member_query(base, names):
+    columns = [MEMBER_FIELDS[name].label(name) for name in names]
+    query = base.with_entities(*columns)
+    if 'ministry' in names:
+        query = query.outerjoin(Ministry, Member.ministry_id == Ministry.id)
+    if 'caregroup' in names:
+        query = query.outerjoin(CareGroup, Member.caregroup_id == CareGroup.id)
+    return query
+
+
+# ==================== MEMBERS ====================
+
+@api_bp.route('/members')
+@use_replica
+@api_login_required
+def list_members():
+    """Members filtered like the members page, keyset paginated"""
+    try:
+        names = requested_fields(MEMBER_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+
+    filters = queries.member_filters(request.args)
+    base, rank = queries.filtered_members(current_user, filters)
+
+    latest, total = base.with_entities(
+        db.func.max(Member.updated_at), db.func.count(Member.id)
+    ).order_by(None).one()
+    # Ages are derived from date_of_birth, so the body also changes daily
+    etag = make_etag('members', sorted(request.args.items(multi=True)), current_user.id,
+                     json_value(latest), total, cache.stamp('ministries', 'caregroups'),
+                     date.today())
+
+    def build():
+        order_by = [Member.fullname, Member.id]
+        if rank is not None:
+            order_by.insert(0, rank)
+        page = keyset_paginate(_member_query(base, names), order_by,
+                               cursor=request.args.get('cursor'),
+                               per_page=min(request.args.get('per_page', 50, type=int), 500),
+                               with_total=False)
+        return {
+            'data': rows_to_dicts(names, page.items),
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+            'total': total,
+        }
+
+    return conditional(etag, build)
+
+
+@api_bp.route('/members/<int:member_id>')
+@use_replica
+@api_login_required
+def get_member(member_id):
+    """A single member visible to the current user"""
+    try:
+        names = requested_fields(MEMBER_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+
+    base = queries.scoped_members(current_user).filter(Member.id == member_id)
+    row = _member_query(base, names).add_columns(Member.updated_at.label('_version')).first()
+    if row is None:
+        return error('Member not found.', 404)
+
+    etag = make_etag('member', member_id, json_value(row[-1]), names,
+                     cache.stamp('ministries', 'caregroups'), date.today())
+    return conditional(etag, lambda: {'data': rows_to_dicts(names, [row[:-1]])[0]})
+
+
+def _celebrations(column):
+    """Active members whose date in column recurs within ?start=YYYY-MM-DD&days=N"""
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.today()
+    except ValueError:
+        return error('start must be a YYYY-MM-DD date.', 400)
+    days = request.args.get('days', 7, type=int)
+    if not 1 <= days <= 366:
+        return error('days must be between 1 and 366.', 400)
+
+    base = queries.scoped_members(current_user, status='active')
+    etag = make_etag('celebrations', column.key, start, days, current_user.id,
+                     cache.stamp('members'))
+
+    def build():
+        rows = queries.celebration_rows(base, column, start, days)
+        return {
+            'data': [{name: json_value(value) for name, value in row.items()} for row in rows],
+            'start': start.isoformat(),
+            'days': days,
+        }
+
+    return conditional(etag, build)
+
+
+@api_bp.route('/members/birthdays')
+@use_replica
+@api_login_required
+def member_birthdays():
+    """Upcoming birthdays, in calendar order from start"""
+    return _celebrations(Member.date_of_birth)
+
+
+@api_bp.route('/members/anniversaries')
+@use_replica
+@api_login_required
+def member_anniversaries():
+    """Upcoming baptism anniversaries, in calendar order from start"""
+    return _celebrations(Member.baptism_date)
+
+
+# ==================== CARE GROUPS ====================
+
+def _caregroup_rows(names, caregroup_id=None):
+    columns = [CAREGROUP_FIELDS[name].label(name) for name in names if name in CAREGROUP_FIELDS]
+    query = db.session.query(*columns).filter(CareGroup.status == 'active')
+    if 'leader' in names:
+        query = query.outerjoin(User, CareGroup.leader_id == User.id)
+    if caregroup_id is not None:
+        query = query.filter(CareGroup.id == caregroup_id)
+    return rows_to_dicts(names, query.order_by(CareGroup.name).all())
+
+
+def _caregroups_etag(caregroup_id=None):
+    query = db.session.query(db.func.max(CareGroup.updated_at), db.func.count(CareGroup.id))
+    if caregroup_id is not None:
+        query = query.filter(CareGroup.id == caregroup_id)
+    latest, total = query.one()
+    return make_etag('caregroups', caregroup_id, request.args.get('fields'),
+                     json_value(latest), total, cache.stamp('members', 'users'))
+
+
+@api_bp.route('/caregroups')
+@use_replica
+@api_login_required
+def list_caregroups():
+    """Active care groups with member counts"""
+    try:
+        names = requested_fields(CAREGROUP_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+    return conditional(_caregroups_etag(), lambda: {'data': _caregroup_rows(names)})
+
+
+@api_bp.route('/caregroups/<int:caregroup_id>')
+@use_replica
+@api_login_required
+def get_caregroup(caregroup_id):
+    """A single active care group with its member count"""
+    try:
+        names = requested_fields(CAREGROUP_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+    if not db.session.query(CareGroup.id).filter_by(id=caregroup_id, status='active').first():
+        return error('Care group not found.', 404)
+    return conditional(_caregroups_etag(caregroup_id),
+                       lambda: {'data': _caregroup_rows(names, caregroup_id)[0]})
+
+
+# ==================== MINISTRIES ====================
+
+def _ministry_rows(names, ministry_id=None):
+    columns = [MINISTRY_FIELDS[name].label(name) for name in names if name in MINISTRY_FIELDS]
+    query = db.session.query(*columns).filter(Ministry.status == 'active')
+    if ministry_id is not None:
+        query = query.filter(Ministry.id == ministry_id)
+    return rows_to_dicts(names, query.order_by(Ministry.name).all())
+
+
+def _ministries_etag(ministry_id=None):
+    query = db.session.query(db.func.max(Ministry.updated_at), db.func.count(Ministry.id))
+    if ministry_id is not None:
+        query = query.filter(Ministry.id == ministry_id)
+    latest, total = query.one()
+    return make_etag('ministries', ministry_id, request.args.get('fields'),
+                     json_value(latest), total, cache.stamp('members'))
+
+
+@api_bp.route('/ministries')
+@use_replica
+@api_login_required
+def list_ministries():
+    """Active ministries with member counts"""
+    try:
+        names = requested_fields(MINISTRY_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+    return conditional(_ministries_etag(), lambda: {'data': _ministry_rows(names)})
+
+
+@api_bp.route('/ministries/<int:ministry_id>')
+@use_replica
+@api_login_required
+def get_ministry(ministry_id):
+    """A single active ministry with its member count"""
+    try:
+        names = requested_fields(MINISTRY_FIELDS)
+    except FieldError as e:
+        return error(f'Unknown field: {e}', 400)
+    if not db.session.query(Ministry.id).filter_by(id=ministry_id, status='active').first():
+        return error('Ministry not found.', 404)
+    return conditional(_ministries_etag(ministry_id),
+                       lambda: {'data': _ministry_rows(names, ministry_id)[0]})
+
+
+# ==================== TYPEAHEAD ====================
+
+@api_bp.route('/typeahead')
+@api_login_required
+def typeahead_lookup():
+    """Name suggestions for ?q, from this process's prefix index
+
+    ?kind=members (default; active members the user can see, or any
+    status with ?status=) or leaders (admins only: active users who can
+    lead a care group). ?limit=N, 1-50.
+    """
+    kind = request.args.get('kind', 'members')
+    limit = request.args.get('limit', current_app.config.get('TYPEAHEAD_LIMIT', 10), type=int)
+    if not 1 <= limit <= 50:
+        return error('limit must be between 1 and 50.', 400)
+    term = request.args.get('q', '')
+
+    if kind == 'members':
+        status = request.args.get('status', 'active')
+        matches = typeahead.member_matches(current_user, term, limit, status)
+        data = [{'id': entry.id, 'label': entry.label, 'status': entry.status} for entry in matches]
+    elif kind == 'leaders':
+        if not current_user.is_admin():
+            return error('Only admins can look up leaders.', 403)
+        data = [{'id': entry.id, 'label': entry.label, 'role': entry.role}
+                for entry in typeahead.leader_matches(term, limit)]
+    else:
+        return error(f'Unknown kind: {kind}', 400)
+
+    response = jsonify({'data': data})
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+# ==================== CHANGE FEED ====================
+
+@api_bp.route('/changes')
+@use_primary
+@api_login_required
+def list_changes():
+    """Members, care groups and ministries changed since ?cursor
+
+    Start without a cursor for a full sync, then pass back the returned
+    cursor; keep going while has_more is true. Rows listed under deleted
+    were deactivated (or left the caller's scope) and should be dropped.
+    """
+    limit = request.args.get('limit', current_app.config.get('SYNC_PAGE_SIZE', 500), type=int)
+    if not 1 <= limit <= 5000:
+        return error('limit must be between 1 and 5000.', 400)
+    try:
+        feed = sync.changes(current_user, request.args.get('cursor'), limit)
+    except sync.CursorError:
+        return error('Invalid cursor; start a full sync without one.', 400)
+
+    response = jsonify({
+        'data': {name: [{field: json_value(value) for field, value in row.items()} for row in rows]
+                 for name, rows in feed['data'].items()},
+        'deleted': feed['deleted'],
+        'cursor': feed['cursor'],
+        'has_more': feed['has_more'],
+    })
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+# ==================== ATTENDANCE ====================
+
+MAX_CHECKIN_IDS = 500
+
+
+def _service_key(values):
+    try:
+        return attendance.service_key(values.get('service_date') or None, values.get('service'))
+    except ValueError as e:
+        raise FieldError(str(e))
+
+
+@api_bp.route('/attendance/checkin', methods=['POST'])
+@api_login_required
+def attendance_checkin():
+    """Check one member ({"member_id": 1}) or many ({"member_ids": [...]}) in
+
+    Optional service_date (YYYY-MM-DD, default today) and service pick the
+    service. Repeating a check-in is harmless; it reports
+    already_checked_in. total is the service's headcount so far.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return error('Expected a JSON object.', 400)
+    raw_ids = data.get('member_ids', [data['member_id']] if 'member_id' in data else [])
+    if not isinstance(raw_ids, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in raw_ids):
+        return error('member_id must be an integer and member_ids a list of integers.', 400)
+    try:
+        key = _service_key(data)
+    except ValueError as e:
+        return error(f'Invalid check-in: {e}', 400)
+    member_ids = list(dict.fromkeys(raw_ids))
+    if not member_ids:
+        return error('No members to check in.', 400)
+    if len(member_ids) > MAX_CHECKIN_IDS:
+        return error(f'Check in at most {MAX_CHECKIN_IDS} members per request.', 400)
+
+    outcomes = attendance.check_in(current_user, member_ids, key)
+    return jsonify({
+        'success': True,
+        'service_date': key[0].isoformat(),
+        'service': key[1],
+        'results': [{'member_id': member_id, 'status': status} for member_id, status in outcomes.items()],
+        'total': sum(attendance.get_buffer().headcount(key).values()),
+    })
+
+
+@api_bp.route('/attendance/headcount')
+@api_login_required
+def attendance_headcount():
+    """Live headcount per care group for ?service_date&service"""
+    try:
+        key = _service_key(request.args)
+    except (FieldError, ValueError) as e:
+        return error(f'Invalid service: {e}', 400)
+    response = jsonify(dict(attendance.headcounts(key),
+                            service_date=key[0].isoformat(), service=key[1]))
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+# ==================== REPORTS ====================
+
+@api_bp.route('/reports/<name>')
+@use_replica
+@api_login_required
+def report_chart(name):
+    """Chart-ready report data: growth, retention or distribution
+
+    growth and retention take ?months=N (1-120); growth also takes
+    ?caregroup=<id> (0 for members without one) and distribution
+    ?ministry=<id>. Each body has labels plus Chart.js-style datasets.
+    """
+    if not current_user.is_admin():
+        return error('Reports are available to admins only.', 403)
+    if name not in ('growth', 'retention', 'distribution'):
+        return error(f'Unknown report: {name}', 404)
+
+    params = {}
+    if name in ('growth', 'retention'):
+        params['months'] = request.args.get('months', current_app.config.get('REPORTS_MONTHS', 12), type=int)
+        if not 1 <= params['months'] <= 120:
+            return error('months must be between 1 and 120.', 400)
+    if name == 'growth' and request.args.get('caregroup') not in (None, ''):
+        params['caregroup_id'] = request.args.get('caregroup', type=int)
+    if name == 'distribution' and request.args.get('ministry') not in (None, ''):
+        params['ministry_id'] = request.args.get('ministry', type=int)
+
+    etag = make_etag('report', name, sorted(params.items()), date.today(),
+                     cache.stamp('reports', 'caregroups', 'ministries'))
+    return conditional(etag, lambda: reports.chart(name, **params))
@@ -0,0 +1,322 @@
+"""
+Church Information System - Static Asset Pipeline
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import click
+from flask import current_app, request, send_file
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip alone still works
+    brotli = None
+
+assets_cli = AppGroup('assets', help='Static asset pipeline.')
+
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Precompressed variants, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# ==================== MINIFICATION ====================
+
+# A / after one of these (or at the start) begins a regex literal, not a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%~^<>')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void',
+                  'throw', 'instanceof', 'yield', 'await'}
+
+
+def _regex_end(source, i):
+    """Index just past the regex literal starting at i (flags included), or None"""
+    in_class = False
+    j, length = i + 1, len(source)
+    while j < length:
+        char = source[j]
+        if char == '\\':
+            j += 2
+            continue
+        if char == '\n':
+            return None
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            j += 1
+            while j < length and (source[j].isalnum() or source[j] == '_'):
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def _strip_comments(source, javascript):
+    """Drop /* */ (and in JavaScript //) comments outside of literals
+
+    In JavaScript, regex literals are copied as they are, so '//' or a
+    quote inside one is not mistaken for a comment or a string. Returns
+    the text plus, for each output line, whether it starts inside a
+    template literal and so must be left untouched.
+    """
+    out = []
+    protected = [False]
+    quote = None
+    last, word = None, ''  # Last significant character and identifier outside literals
+    i, length = 0, len(source)
+    while i < length:
+        char = source[i]
+        if quote:
+            out.append(char)
+            if char == '\\' and i + 1 < length:
+                out.append(source[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+                last, word = char, ''
+            elif char == '\n':
+                protected.append(quote == '`')
+            i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            newlines = source.count('\n', i, end)
+            out.append('\n' * newlines)
+            protected.extend([False] * newlines)
+            i = end
+        elif javascript and source.startswith('//', i):
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        elif javascript and char == '/' and (last is None or last in REGEX_PRECEDERS
+                                              or word in REGEX_KEYWORDS):
+            end = _regex_end(source, i)
+            if end is None:  # Not a regex after all; copy the operator
+                end = i + 1
+            out.append(source[i:end])
+            last, word = source[end - 1], ''
+            i = end
+        else:
+            if char in '\'"`':
+                quote = char
+            elif char == '\n':
+                protected.append(False)
+            if not char.isspace():
+                if char.isalnum() or char in '_$':
+                    word = word + char if last is not None and (last.isalnum() or last in '_$') else char
+                else:
+                    word = ''
+                last = char
+            out.append(char)
+            i += 1
+    return ''.join(out), protected
+
+
+def minify_css(source):
+    """Conservative CSS minifier: comments, whitespace and redundant semicolons"""
+    text, _ = _strip_comments(source, javascript=False)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    text = text.replace(';}', '}')
+    return text.strip() + '\n'
+
+
+def minify_js(source):
+    """Conservative JS minifier: comments, indentation and blank lines
+
+    Newlines are kept so automatic semicolon insertion behaves exactly
+    as in the source.
+    """
+    text, protected = _strip_comments(source, javascript=True)
+    lines = []
+    for line, in_template in zip(text.split('\n'), protected):
+        if in_template:
+            lines.append(line)
+        elif line.strip():
+            lines.append(line.strip())
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+# ==================== BUILD ====================
+
+def output_folder(app):
+    return os.path.join(app.static_folder, app.config.get('ASSETS_FOLDER', 'build'))
+
+
+def _write(path, data):
+    """Write a file atomically so concurrent workers never serve half of it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def build(app):
+    """Minify, fingerprint and precompress every asset; returns the manifest
+
+    The manifest maps each source name (e.g. 'css/style.css') to its
+    built name (e.g. 'build/css/style.1a2b3c4d.css'), relative to the
+    static folder. Unchanged assets keep their names, so rebuilding is
+    cheap and safe while other workers are serving.
+    """
+    static = app.static_folder
+    folder = app.config.get('ASSETS_FOLDER', 'build')
+    output = os.path.abspath(output_folder(app))
+    manifest = {}
+    for directory, subdirectories, files in os.walk(static):
+        # Never re-process earlier build output
+        subdirectories[:] = [d for d in subdirectories
+                             if os.path.abspath(os.path.join(directory, d)) != output]
+        for filename in sorted(files):
+            stem, extension = os.path.splitext(filename)
+            minify = MINIFIERS.get(extension)
+            if minify is None:
+                continue
+            source_path = os.path.join(directory, filename)
+            name = os.path.relpath(source_path, static).replace(os.sep, '/')
+            with open(source_path, encoding='utf-8') as f:
+                data = minify(f.read()).encode('utf-8')
+
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            built = posixpath.join(folder, posixpath.dirname(name), f'{stem}.{digest}{extension}')
+            target = os.path.join(static, built)
+            # The plain file goes last: once it exists the variants do too
+            if not os.path.exists(target):
+                _write(target + '.gz', gzip.compress(data, 9, mtime=0))
+                if brotli is not None:
+                    _write(target + '.br', brotli.compress(data, quality=11))
+                _write(target, data)
+            manifest[name] = built
+
+    path = os.path.join(output_folder(app), MANIFEST_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary, path)
+    return manifest
+
+
+def load_manifest(app):
+    path = os.path.join(output_folder(app), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# ==================== SERVING ====================
+
+def _accepted(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def _hashed_static_urls(endpoint, values):
+    """url_for('static', filename='css/style.css') -> the fingerprinted file"""
+    if endpoint == 'static':
+        built = current_app.extensions['assets'].get(values.get('filename'))
+        if built is not None:
+            values['filename'] = built
+
+
+def _serve_precompressed():
+    """Send the .br/.gz variant of a fingerprinted asset when the client takes it"""
+    if request.endpoint != 'static':
+        return None
+    filename = (request.view_args or {}).get('filename', '')
+    if filename not in current_app.extensions['assets_built']:
+        return None
+    path = os.path.join(current_app.static_folder, filename)
+    for encoding, suffix in ENCODINGS:
+        if _accepted(encoding) and os.path.exists(path + suffix):
+            response = send_file(path + suffix, mimetype=_mimetype(filename), conditional=True,
+                                 etag=f'{os.path.basename(filename)}-{encoding}', max_age=None)
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Cache-Control'] = IMMUTABLE
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def _mimetype(filename):
+    return {'.css': 'text/css', '.js': 'text/javascript'}.get(
+        os.path.splitext(filename)[1], 'application/octet-stream')
+
+
+def _cache_headers(response):
+    """Far-future caching for fingerprinted assets, gzip/brotli for HTML pages"""
+    if request.endpoint == 'static':
+        filename = (request.view_args or {}).get('filename', '')
+        if filename in current_app.extensions['assets_built']:
+            response.headers['Cache-Control'] = IMMUTABLE
+            response.vary.add('Accept-Encoding')
+        return response
+    return compress_response(response)
+
+
+def compress_response(response):
+    """Compress a buffered text response in place when it is worth it"""
+    config = current_app.config
+    if (not config.get('HTML_COMPRESSION')
+            or response.mimetype not in config.get('COMPRESS_MIMETYPES', ('text/html',))
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+        return response
+    if brotli is not None and _accepted('br'):
+        response.set_data(brotli.compress(data, quality=config.get('COMPRESS_BROTLI_QUALITY', 4)))
+        response.headers['Content-Encoding'] = 'br'
+    elif _accepted('gzip'):
+        response.set_data(gzip.compress(data, config.get('COMPRESS_LEVEL', 6)))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    """Build assets at startup (ASSETS_BUILD_ON_STARTUP) and install the serving hooks"""
+    manifest = {}
+    if app.config.get('ASSETS_ENABLED', True):
+        if app.config.get('ASSETS_BUILD_ON_STARTUP', True):
+            manifest = build(app)
+        else:
+            manifest = load_manifest(app) or {}
+    app.extensions['assets'] = manifest
+    app.extensions['assets_built'] = frozenset(manifest.values())
+
+    if manifest:
+        app.url_defaults(_hashed_static_urls)
+        app.before_request(_serve_precompressed)
+    app.after_request(_cache_headers)
+
+
+@assets_cli.command('build')
+def build_command():
+    """Minify, fingerprint and precompress static assets."""
+    app = current_app._get_current_object()
+    manifest = build(app)
+    for name, built in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(app.static_folder, name))
+        built_size = os.path.getsize(os.path.join(app.static_folder, built))
+        gz_size = os.path.getsize(os.path.join(app.static_folder, built + '.gz'))
+        click.echo(f'{name} -> {built}  {size} B, minified {built_size} B, gzip {gz_size} B')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
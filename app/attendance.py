@@ -0,0 +1,281 @@
+"""
+Church Information System - Attendance Check-in
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+import sqlalchemy as sa
+from flask import current_app
+from app import db, cache, queries
+from app.models import Attendance, CareGroup, Member
+
+logger = logging.getLogger('cis.attendance')
+
+# Services whose tallies a process keeps in memory at once
+MAX_TALLIES = 16
+
+
+def service_key(service_date=None, service=None):
+    """Normalize a (service_date, service) pair, defaulting to today's main service"""
+    if isinstance(service_date, str):
+        service_date = date.fromisoformat(service_date)
+    service = (service or current_app.config.get('ATTENDANCE_SERVICES', ('sunday',))[0]).strip().lower()
+    if service not in current_app.config.get('ATTENDANCE_SERVICES', ('sunday',)):
+        raise ValueError(f'Unknown service "{service}"')
+    return service_date or date.today(), service
+
+
+def insert_new(conn, rows):
+    """Insert attendance rows, skipping any already recorded"""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        insert = None
+
+    if insert is not None:
+        conn.execute(insert(Attendance).on_conflict_do_nothing(
+            index_elements=['service_date', 'service', 'member_id']
+        ), rows)
+        return
+    # Elsewhere drop the rows already there; a check-in racing in from
+    # another worker fails the flush, which keeps the batch and retries
+    keys = {(row['service_date'], row['service']) for row in rows}
+    existing = set()
+    for service_date, service in keys:
+        existing.update(conn.execute(
+            sa.select(Attendance.service_date, Attendance.service, Attendance.member_id).where(
+                Attendance.service_date == service_date, Attendance.service == service,
+                Attendance.member_id.in_([row['member_id'] for row in rows]))
+        ).all())
+    fresh = [row for row in rows
+             if (row['service_date'], row['service'], row['member_id']) not in existing]
+    if fresh:
+        conn.execute(sa.insert(Attendance), fresh)
+
+
+class Tally:
+    """Who is checked in to one service and the headcount per care group"""
+
+    def __init__(self):
+        self.members = {}  # member id -> care group id
+        self.counts = Counter()
+        self.last_id = 0  # Highest attendance row id merged from the database
+        self.synced_at = 0.0
+
+    def add(self, member_id, caregroup_id):
+        if member_id in self.members:
+            return False
+        self.members[member_id] = caregroup_id
+        self.counts[caregroup_id] += 1
+        return True
+
+
+class CheckInBuffer:
+    """Write-behind buffer for check-ins
+
+    A check-in is answered from memory: the tally decides whether it is
+    new and moves the headcount at once, and the row joins a pending
+    batch. A background thread writes each batch in one transaction
+    every ATTENDANCE_FLUSH_MS, or sooner once ATTENDANCE_FLUSH_ROWS are
+    waiting. The unique (service_date, service, member_id) constraint
+    and INSERT ... ON CONFLICT DO NOTHING keep the table idempotent even
+    when several processes see the same member.
+    """
+
+    def __init__(self, app, write_behind=None):
+        self.app = app
+        self.write_behind = app.config.get('ATTENDANCE_WRITE_BEHIND', True) if write_behind is None else write_behind
+        self.max_rows = app.config.get('ATTENDANCE_FLUSH_ROWS', 200)
+        self.interval = app.config.get('ATTENDANCE_FLUSH_MS', 250) / 1000
+        self.sync_seconds = app.config.get('ATTENDANCE_SYNC_SECONDS', 10)
+        self.stats = {'flushes': 0, 'rows': 0, 'failures': 0, 'largest_batch': 0}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._tallies = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.write_behind:
+            self._thread = threading.Thread(target=self._loop, name='cis-attendance', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the writer thread after writing everything still pending"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    # ---------- Check-in ----------
+
+    def check_in(self, key, member_id, caregroup_id, user_id=None):
+        """Record a check-in; returns False if the member was already in"""
+        tally = self.tally(key)
+        with self._lock:
+            if not tally.add(member_id, caregroup_id):
+                return False
+            self._pending.append({
+                'member_id': member_id,
+                'caregroup_id': caregroup_id,
+                'service_date': key[0],
+                'service': key[1],
+                'checked_in_at': datetime.utcnow(),
+                'checked_in_by': user_id,
+            })
+            full = len(self._pending) >= self.max_rows
+        if not self.write_behind:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+        return True
+
+    def headcount(self, key):
+        """{care group id: members checked in} for a service"""
+        tally = self.tally(key)
+        with self._lock:
+            return {caregroup_id: count for caregroup_id, count in tally.counts.items() if count}
+
+    def checked_in(self, key):
+        """Ids of the members checked in to a service"""
+        tally = self.tally(key)
+        with self._lock:
+            return set(tally.members)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ---------- Tallies ----------
+
+    def tally(self, key):
+        """The in-memory tally for a service, merged with rows other processes wrote
+
+        The first use loads the service from the database; after that only
+        rows newer than the last one seen are read, every
+        ATTENDANCE_SYNC_SECONDS.
+        """
+        with self._lock:
+            tally = self._tallies.get(key)
+            if tally is None:
+                tally = self._tallies[key] = Tally()
+                if len(self._tallies) > MAX_TALLIES:
+                    del self._tallies[min(k for k in self._tallies if k != key)]
+            due = time.monotonic() - tally.synced_at >= self.sync_seconds
+            if due:
+                tally.synced_at = time.monotonic()
+            last_id = tally.last_id
+        if due:
+            rows = db.session.query(
+                Attendance.id, Attendance.member_id, Attendance.caregroup_id
+            ).filter(
+                Attendance.service_date == key[0],
+                Attendance.service == key[1],
+                Attendance.id > last_id
+            ).all()
+            with self._lock:
+                for row_id, member_id, caregroup_id in rows:
+                    tally.add(member_id, caregroup_id)
+                    tally.last_id = max(tally.last_id, row_id)
+        return tally
+
+    # ---------- Writing ----------
+
+    def flush(self):
+        """Write every pending check-in in one transaction; returns the row count"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        insert_new(conn, batch)
+                    cache.bump('attendance')
+            except Exception:
+                logger.exception('Writing %s check-ins failed; keeping them for the next flush', len(batch))
+                with self._lock:
+                    self._pending[:0] = batch
+                    self.stats['failures'] += 1
+                return 0
+            with self._lock:
+                self.stats['flushes'] += 1
+                self.stats['rows'] += len(batch)
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            return len(batch)
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+# ==================== APP INTEGRATION ====================
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's check-in buffer, started on first use
+
+    Starting lazily keeps a preloading gunicorn master from forking a
+    running writer thread (and its pending rows) into every worker.
+    """
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        if _buffer_pid != os.getpid():
+            _buffer = CheckInBuffer(current_app._get_current_object()).start()
+            _buffer_pid = os.getpid()
+            atexit.register(_buffer.stop, 5)
+        return _buffer
+
+
+def check_in(user, member_ids, key):
+    """Check members in to a service; returns {member id: outcome}
+
+    Outcomes are 'checked_in', 'already_checked_in' or 'not_found' (not
+    an active member the user can see).
+    """
+    buffer = get_buffer()
+    outcomes = {}
+    rows = {}
+    if member_ids:
+        rows = dict(queries.scoped_members(user, status='active').filter(
+            Member.id.in_(member_ids)
+        ).with_entities(Member.id, Member.caregroup_id).all())
+    for member_id in member_ids:
+        if member_id not in rows:
+            outcomes[member_id] = 'not_found'
+        elif buffer.check_in(key, member_id, rows[member_id], user.id):
+            outcomes[member_id] = 'checked_in'
+        else:
+            outcomes[member_id] = 'already_checked_in'
+    return outcomes
+
+
+def headcounts(key):
+    """Live headcount for a service: total plus one entry per care group"""
+    counts = get_buffer().headcount(key)
+    groups = db.session.query(CareGroup.id, CareGroup.name, CareGroup.color).filter(
+        sa.or_(CareGroup.status == 'active', CareGroup.id.in_([k for k in counts if k]))
+    ).order_by(CareGroup.name).all()
+    rows = [{'id': id_, 'name': name, 'color': color, 'count': counts.get(id_, 0)}
+            for id_, name, color in groups]
+    if counts.get(None):
+        rows.append({'id': None, 'name': 'Unassigned', 'color': None, 'count': counts[None]})
+    return {'total': sum(counts.values()), 'caregroups': rows}
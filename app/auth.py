@@ -0,0 +1,71 @@
+"""
+Church Information System - Authentication Helpers
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db, cache
+from app.models import User
+
+# Columns kept in the identity cache. The password hash stays out; it is
+# loaded on demand in the rare request that touches it.
+CACHED_COLUMNS = ('id', 'username', 'role', 'caregroup_id', 'theme', 'status',
+                  'created_at', 'updated_at')
+
+_listening = False
+
+
+def _key(user_id):
+    return f'user:{int(user_id)}'
+
+
+def load_user(user_id):
+    """current_user for Flask-Login, from the identity cache when possible
+
+    A cached user is attached to the session without a SELECT, so lazy
+    relationships and updates (e.g. set_theme) behave as usual.
+    """
+    ttl = current_app.config.get('USER_CACHE_TTL', 60)
+    if not ttl:
+        return db.session.get(User, int(user_id))
+
+    values = cache.get(_key(user_id))
+    if values is None:
+        user = db.session.get(User, int(user_id))
+        if user is not None:
+            cache.set(_key(user_id), {name: getattr(user, name) for name in CACHED_COLUMNS}, ttl)
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def forget_user(user_id):
+    cache.delete(_key(user_id))
+
+
+def _collect_changed_users(session, flush_context):
+    changed = [obj.id for obj in list(session.dirty) + list(session.deleted)
+               if isinstance(obj, User) and obj.id is not None]
+    if changed:
+        session.info.setdefault('changed_users', set()).update(changed)
+
+
+def _forget_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        forget_user(user_id)
+
+
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
+
+
+def init_app(app):
+    """Drop a user's cached identity whenever a commit changes that user"""
+    global _listening
+    if not _listening:
+        event.listen(Session, 'after_flush', _collect_changed_users)
+        event.listen(Session, 'after_commit', _forget_changed_users)
+        event.listen(Session, 'after_rollback', _discard_changed_users)
+        _listening = True
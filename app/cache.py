@@ -0,0 +1,232 @@
+"""
+Church Information System - Cache Backends and Write Tracking
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class MemoryCache:
+    """Per-process cache; each gunicorn worker keeps its own copy"""
+
+    def __init__(self):
+        self._data = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires < time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+    def counters(self, keys):
+        return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class SQLiteCache:
+    """Cache in a local SQLite file shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                     '(key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_counters '
+                     '(key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value, expires FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+        self._sets += 1
+        if self._sets % 200 == 0:
+            conn.execute('DELETE FROM cache_entries WHERE expires < ?', (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_entries')
+        conn.execute('DELETE FROM cache_counters')
+
+    def counters(self, keys):
+        placeholders = ', '.join('?' for _ in keys)
+        rows = dict(self._conn().execute(
+            f'SELECT key, value FROM cache_counters WHERE key IN ({placeholders})', list(keys)
+        ).fetchall())
+        return [rows.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        # Upsert then read back in one write transaction; RETURNING would
+        # need SQLite 3.35
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT INTO cache_counters (key, value) VALUES (?, 1) '
+                         'ON CONFLICT(key) DO UPDATE SET value = value + 1', (key,))
+            value = conn.execute('SELECT value FROM cache_counters WHERE key = ?', (key,)).fetchone()[0]
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return value
+
+
+class Cache:
+    """Application cache with per-table data versions
+
+    Every committed write bumps the version of the tables it touched, so
+    keys built from stamp() change as soon as their source data does.
+    """
+
+    def __init__(self):
+        self.backend = MemoryCache()
+        self.default_ttl = 300
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'sqlite':
+            path = app.config.get('CACHE_PATH') or os.path.join(app.instance_path, 'cache.db')
+            self.backend = SQLiteCache(path)
+        elif backend == 'memory':
+            self.backend = MemoryCache()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        app.extensions['cache'] = self
+        _register_write_tracking(self)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl if ttl is not None else self.default_ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def stamp(self, *tables):
+        """Version stamp for a set of tables, e.g. 'members:4.ministries:1'"""
+        versions = self.backend.counters([f'version:{t}' for t in tables])
+        return '.'.join(f'{t}:{v}' for t, v in zip(tables, versions))
+
+    def bump(self, *tables):
+        """Invalidate everything derived from the given tables"""
+        for table in tables:
+            self.backend.incr(f'version:{table}')
+
+
+# ==================== WRITE TRACKING ====================
+
+_tracking_cache = None
+
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+def mark_changed(session, *tables):
+    """Record tables written outside the ORM unit of work"""
+    _changed_tables(session).update(tables)
+
+
+def _register_write_tracking(cache):
+    global _tracking_cache
+    if _tracking_cache is None:
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'do_orm_execute', _do_orm_execute)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+    _tracking_cache = cache
+
+
+def _after_flush(session, flush_context):
+    tables = _changed_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+
+
+def _do_orm_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, 'table', None)
+        if table is not None and getattr(table, 'name', None):
+            _changed_tables(state.session).add(table.name)
+
+
+def _after_commit(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables and _tracking_cache is not None:
+        _tracking_cache.bump(*sorted(tables))
+
+
+def _after_rollback(session):
+    session.info.pop('changed_tables', None)
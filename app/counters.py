@@ -0,0 +1,140 @@
+"""
+Church Information System - Denormalized Member Counters
+"""
+from collections import Counter
+import click
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db, queries
+from app.models import Member, CareGroup, Ministry
+from app.importer import members_cli
+
+TRACKED = ('status', 'caregroup_id', 'ministry_id')
+
+_listening = False
+
+
+class CounterDeltas:
+    """Pending +/- changes to CareGroup.member_count and Ministry.member_count"""
+
+    def __init__(self):
+        self.caregroups = Counter()
+        self.ministries = Counter()
+
+    def move(self, old, new, count=1):
+        """Account for members going from old to new (status, caregroup_id, ministry_id)"""
+        for state, sign in ((old, -count), (new, count)):
+            if state is None or state[0] != 'active':
+                continue
+            if state[1] is not None:
+                self.caregroups[state[1]] += sign
+            if state[2] is not None:
+                self.ministries[state[2]] += sign
+
+    def apply(self, session):
+        """Issue one atomic increment per changed row"""
+        for model, deltas in ((CareGroup, self.caregroups), (Ministry, self.ministries)):
+            for id_, delta in deltas.items():
+                if delta:
+                    _set_count(session, model, id_, model.member_count + delta)
+
+
+def bulk_deltas(member_ids, values):
+    """Deltas for a set-based UPDATE of members, from one grouped query
+
+    member_ids is a selectable of Member ids and values the column values
+    the UPDATE will set. Call it before the UPDATE runs.
+    """
+    deltas = CounterDeltas()
+    groups = db.session.query(
+        Member.status, Member.caregroup_id, Member.ministry_id, sa.func.count(Member.id)
+    ).filter(
+        Member.id.in_(member_ids)
+    ).group_by(Member.status, Member.caregroup_id, Member.ministry_id)
+    for status, caregroup_id, ministry_id, count in groups:
+        old = (status, caregroup_id, ministry_id)
+        new = tuple(values.get(name, value) for name, value in zip(TRACKED, old))
+        deltas.move(old, new, count)
+    return deltas
+
+
+def _set_count(session, model, id_, value):
+    # updated_at is kept as-is: a member moving is not an edit of the group
+    session.execute(
+        sa.update(model).where(model.id == id_).values(
+            member_count=value, updated_at=model.updated_at
+        ).execution_options(synchronize_session=False)
+    )
+    cached = session.identity_map.get(session.identity_key(model, id_))
+    if cached is not None:
+        session.expire(cached, ['member_count'])
+
+
+def _member_state(member, before):
+    """(status, caregroup_id, ministry_id) on either side of a flush"""
+    inspected = sa.inspect(member)
+    state = []
+    for name in TRACKED:
+        history = inspected.attrs[name].history
+        values = (history.deleted if before else history.added) or history.unchanged
+        state.append(values[0] if values else inspected.dict.get(name))
+    if state[0] is None:
+        state[0] = 'active'
+    return tuple(state)
+
+
+def _after_flush(session, flush_context):
+    deltas = CounterDeltas()
+    for obj in session.new:
+        if isinstance(obj, Member):
+            deltas.move(None, _member_state(obj, before=False))
+    for obj in session.dirty:
+        if isinstance(obj, Member) and session.is_modified(obj):
+            deltas.move(_member_state(obj, before=True), _member_state(obj, before=False))
+    for obj in session.deleted:
+        if isinstance(obj, Member):
+            deltas.move(_member_state(obj, before=True), None)
+    deltas.apply(session)
+
+
+def reconcile(dry_run=False):
+    """Recompute every counter from one grouped query per table
+
+    Returns (table, id, name, stored, actual) for each counter that had
+    drifted; they are corrected unless dry_run is set. The caller commits.
+    """
+    drift = []
+    for model, actual in ((CareGroup, queries.caregroup_member_counts()),
+                          (Ministry, queries.ministry_member_counts())):
+        for id_, name, stored in db.session.query(model.id, model.name, model.member_count):
+            expected = actual.get(id_, 0)
+            if stored != expected:
+                drift.append((model.__tablename__, id_, name, stored, expected))
+                if not dry_run:
+                    _set_count(db.session, model, id_, expected)
+    return drift
+
+
+@members_cli.command('reconcile-counts')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_command(dry_run):
+    """Recompute stored care group and ministry member counts."""
+    drift = reconcile(dry_run=dry_run)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    for table, id_, name, stored, actual in drift:
+        click.echo(f'{table} {id_} ({name}): stored {stored}, actual {actual}')
+    verb = 'found' if dry_run else 'fixed'
+    click.echo(f'{len(drift)} drifted counter(s) {verb}.')
+
+
+def init_app(app):
+    """Keep member counters in step with every ORM flush of members"""
+    global _listening
+    if not _listening:
+        event.listen(Session, 'after_flush', _after_flush)
+        _listening = True
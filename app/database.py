@@ -0,0 +1,167 @@
+"""
+Church Information System - Database Engine Configuration and Read Routing
+"""
+import time
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, request, session as flask_session
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+
+def is_memory_database(uri):
+    url = sa.engine.make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def read_only_uri(uri):
+    """The same SQLite file opened with mode=ro, e.g. sqlite:///file:cis.db?mode=ro&uri=true"""
+    url = sa.engine.make_url(uri)
+    return url.set(database=f'file:{url.database}', query={'mode': 'ro', 'uri': 'true'})
+
+
+def replica_uri(app):
+    """Where reads go: READ_REPLICA_URI, the SQLite file read-only, or None"""
+    if app.config.get('READ_REPLICA_URI'):
+        return app.config['READ_REPLICA_URI']
+    primary = app.config['SQLALCHEMY_DATABASE_URI']
+    if app.config.get('SQLITE_READ_ONLY_POOL') and not is_memory_database(primary) \
+            and sa.engine.make_url(primary).get_backend_name() == 'sqlite':
+        return read_only_uri(primary)
+    return None
+
+
+def engine_options(app):
+    """SQLALCHEMY_ENGINE_OPTIONS with the pool sized from DB_POOL_* settings
+
+    Each worker process gets its own pool, so DB_POOL_SIZE should match
+    the threads per worker. In-memory SQLite keeps Flask-SQLAlchemy's
+    single shared connection.
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_memory_database(app.config['SQLALCHEMY_DATABASE_URI']):
+        return options
+
+    options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 5))
+    options.setdefault('pool_timeout', app.config.get('DB_POOL_TIMEOUT', 10))
+    if sa.engine.make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'sqlite':
+        options.setdefault('pool_pre_ping', True)
+    return options
+
+
+def configure(app):
+    """Set engine options and the replica bind before Flask-SQLAlchemy starts"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app)
+    replica = replica_uri(app)
+    if replica is not None:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = replica
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run PRAGMA name=value for each setting on a raw DB-API connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+# ==================== READ ROUTING ====================
+
+class RoutingSession(BaseSession):
+    """Session that sends reads to the replica bind when the request allows it
+
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary, and
+    once a session has written, its later reads do too, so a request sees
+    its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif self.info.get('read_from_replica') and not self.info.get('wrote'):
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica(f):
+    """Route a view's reads to the replica, whatever the HTTP method"""
+    f.db_route = 'replica'
+    return f
+
+
+def use_primary(f):
+    """Keep a view on the primary, e.g. a GET that must see the latest data"""
+    f.db_route = 'primary'
+    return f
+
+
+def _choose_route():
+    db = current_app.extensions['sqlalchemy']
+    view = current_app.view_functions.get(request.endpoint)
+    route = getattr(view, 'db_route', None)
+    if route is None and current_app.config.get('READ_ROUTING') == 'method' \
+            and request.method in READ_METHODS:
+        route = 'replica'
+    # Replicas can lag; the page after a write (usually the redirect) reads the primary
+    if route == 'replica' and flask_session.get('_primary_until', 0) > time.time():
+        route = 'primary'
+    db.session.info['read_from_replica'] = route == 'replica'
+
+
+def _remember_writes(response):
+    db = current_app.extensions['sqlalchemy']
+    window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 0)
+    if window and db.session.info.get('wrote'):
+        flask_session['_primary_until'] = time.time() + window
+    return response
+
+
+def init_app(app):
+    """Apply SQLITE_PRAGMAS to new SQLite connections and install read routing"""
+    db = app.extensions['sqlalchemy']
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    # A read-only connection cannot change the journal mode; query_only
+    # makes any stray write fail loudly instead
+    replica_pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    replica_pragmas['query_only'] = 'ON'
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            selected = replica_pragmas if key == REPLICA_BIND else pragmas
+            if selected:
+                event.listen(engine, 'connect', _pragma_listener(selected))
+        routing = REPLICA_BIND in db.engines
+
+    if routing:
+        app.before_request(_choose_route)
+        app.after_request(_remember_writes)
+
+
+def _pragma_listener(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+    return on_connect
+
+
+def release_connections():
+    """Close pooled connections so forked workers never share a SQLite handle"""
+    db = current_app.extensions['sqlalchemy']
+    # Return the session's connection first, or it lands in the discarded pool
+    db.session.remove()
+    for engine in db.engines.values():
+        # Disposing would throw away an in-memory database
+        if not is_memory_database(engine.url):
+            engine.dispose()
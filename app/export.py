@@ -0,0 +1,83 @@
+"""
+Church Information System - Member Directory Export
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from app.models import Member, CareGroup, Ministry
+
+# Exported column name -> selected expression
+EXPORT_COLUMNS = [
+    ('id', Member.id),
+    ('fullname', Member.fullname),
+    ('gender', Member.gender),
+    ('date_of_birth', Member.date_of_birth),
+    ('age', Member.age),
+    ('address', Member.address),
+    ('contact', Member.contact),
+    ('baptism_date', Member.baptism_date),
+    ('ministry', Ministry.name),
+    ('caregroup', CareGroup.name),
+    ('status', Member.status),
+    ('created_at', Member.created_at),
+    ('updated_at', Member.updated_at),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+BATCH_SIZE = 1000
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_rows(query, batch_size=BATCH_SIZE):
+    """Yield one tuple per member, fetched from the database in batches"""
+    rows = query.outerjoin(Ministry, Member.ministry_id == Ministry.id).outerjoin(
+        CareGroup, Member.caregroup_id == CareGroup.id
+    ).with_entities(
+        *[column.label(name) for name, column in EXPORT_COLUMNS]
+    ).order_by(None).order_by(Member.id).execution_options(
+        yield_per=batch_size, stream_results=True
+    )
+    for row in rows:
+        yield tuple(_plain(value) for value in row)
+
+
+def stream_csv(rows, batch_size=BATCH_SIZE):
+    """Encode rows as CSV, yielding the header first and then batches"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(rows, batch_size=BATCH_SIZE):
+    """Encode rows as one JSON object per line, yielding in batches"""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    lines = []
+    for count, row in enumerate(rows, 1):
+        lines.append(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+        # Send the first row on its own so the client gets bytes at once
+        if count == 1 or len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
@@ -0,0 +1,58 @@
+"""
+Church Information System - Template Fragment Cache
+"""
+import time
+from flask import current_app
+from flask_login import current_user
+from markupsafe import Markup
+from app import cache
+from app.instrumentation import metrics
+
+
+def fragment_key(name, depends=(), vary=()):
+    """Cache key for a fragment as the current user would see it
+
+    Role and theme are always part of the key; depends names the tables
+    whose version stamps invalidate it and vary adds anything else the
+    markup depends on (e.g. the active endpoint).
+    """
+    if current_user.is_authenticated:
+        viewer = f'{current_user.role}:{current_user.theme or "light"}'
+    else:
+        viewer = 'anonymous:light'
+    parts = ['fragment', name, viewer, cache.stamp(*depends) if depends else '-']
+    parts.extend(str(value) for value in vary)
+    return ':'.join(parts)
+
+
+def cached_fragment(name, depends=(), vary=(), ttl=None, caller=None):
+    """Render the body of a call block once per key and reuse the HTML
+
+        {% call cached_fragment('caregroup_list', depends=('caregroups', 'users')) %}
+            ...
+        {% endcall %}
+
+    Nothing user-specific beyond role and theme (usernames, flashed
+    messages, form values) may appear inside the block.
+    """
+    if ttl is None:
+        ttl = current_app.config.get('FRAGMENT_CACHE_TTL', 300)
+    if not ttl:
+        return caller()
+
+    started = time.perf_counter()
+    key = fragment_key(name, depends, vary)
+    html = cache.get(key)
+    if html is not None:
+        metrics.record_fragment(name, True, time.perf_counter() - started)
+        return Markup(html)
+
+    html = caller()
+    cache.set(key, str(html), ttl)
+    metrics.record_fragment(name, False, time.perf_counter() - started)
+    return Markup(html)
+
+
+def init_app(app):
+    """Make cached_fragment available to every template"""
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
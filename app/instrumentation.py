@@ -0,0 +1,290 @@
+"""
+Church Information System - Request and SQL Instrumentation
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from flask import g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_log = logging.getLogger('cis.slow_sql')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= rank:
+                return bound
+        return self.max
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            yield bound, running
+
+
+class EndpointStats:
+    """Aggregated measurements for one endpoint"""
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.sql_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.errors = 0
+
+
+class FragmentStats:
+    """Hits and misses for one cached template fragment"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0  # Cache lookups that served the fragment
+        self.miss_seconds = 0.0  # Lookups plus rendering on a miss
+
+
+class Metrics:
+    """Per-process registry of endpoint statistics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.fragments = {}
+        self.slow_queries = 0
+        self.started = time.time()
+
+    def record(self, endpoint, duration, sql_count, sql_seconds, render_seconds, status):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.duration.observe(duration)
+            stats.sql_queries.observe(sql_count)
+            stats.sql_seconds += sql_seconds
+            stats.render_seconds += render_seconds
+            if status >= 500:
+                stats.errors += 1
+
+    def record_fragment(self, name, hit, seconds):
+        with self._lock:
+            stats = self.fragments.get(name)
+            if stats is None:
+                stats = self.fragments[name] = FragmentStats()
+            if hit:
+                stats.hits += 1
+                stats.hit_seconds += seconds
+            else:
+                stats.misses += 1
+                stats.miss_seconds += seconds
+
+    def record_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def fragment_snapshot(self):
+        """Fragment cache rows, with render time saved estimated from the misses"""
+        with self._lock:
+            rows = []
+            for name, s in self.fragments.items():
+                render_ms = s.miss_seconds * 1000 / s.misses if s.misses else 0.0
+                rows.append({
+                    'fragment': name,
+                    'hits': s.hits,
+                    'misses': s.misses,
+                    'hit_rate': s.hits / (s.hits + s.misses),
+                    'render_ms': render_ms,
+                    'hit_ms': s.hit_seconds * 1000 / s.hits if s.hits else 0.0,
+                    'saved_ms': s.hits * render_ms - s.hit_seconds * 1000,
+                })
+        return sorted(rows, key=lambda r: r['saved_ms'], reverse=True)
+
+    def snapshot(self):
+        """Rows for the admin metrics page, slowest endpoints first"""
+        with self._lock:
+            rows = [{
+                'endpoint': endpoint,
+                'requests': s.duration.count,
+                'errors': s.errors,
+                'mean_ms': s.duration.mean * 1000,
+                'p50_ms': s.duration.quantile(0.5) * 1000,
+                'p95_ms': s.duration.quantile(0.95) * 1000,
+                'max_ms': s.duration.max * 1000,
+                'sql_per_request': s.sql_queries.mean,
+                'sql_max': int(s.sql_queries.max),
+                'sql_ms': s.sql_seconds * 1000 / s.duration.count,
+                'render_ms': s.render_seconds * 1000 / s.duration.count,
+            } for endpoint, s in self.endpoints.items()]
+        return sorted(rows, key=lambda r: r['p95_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.fragments.clear()
+            self.slow_queries = 0
+            self.started = time.time()
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram(name, help_text, attr):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for endpoint, stats in sorted(self.endpoints.items()):
+                h = getattr(stats, attr)
+                for bound, count in h.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {h.sum}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {h.count}')
+
+        def counter(name, help_text, value_of):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, stats in sorted(self.endpoints.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value_of(stats)}')
+
+        with self._lock:
+            histogram('cis_request_duration_seconds', 'Request latency by endpoint.', 'duration')
+            histogram('cis_request_sql_queries', 'SQL statements per request by endpoint.', 'sql_queries')
+            counter('cis_request_sql_seconds_total', 'Time spent in SQL by endpoint.',
+                    lambda s: s.sql_seconds)
+            counter('cis_request_render_seconds_total', 'Time spent rendering templates by endpoint.',
+                    lambda s: s.render_seconds)
+            counter('cis_request_errors_total', 'Responses with a 5xx status by endpoint.',
+                    lambda s: s.errors)
+            for name, help_text, value_of in (
+                ('cis_fragment_cache_hits_total', 'Template fragments served from the cache.',
+                 lambda f: f.hits),
+                ('cis_fragment_cache_misses_total', 'Template fragments rendered and stored.',
+                 lambda f: f.misses),
+                ('cis_fragment_cache_miss_seconds_total', 'Time spent rendering missed fragments.',
+                 lambda f: f.miss_seconds),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for fragment, stats in sorted(self.fragments.items()):
+                    lines.append(f'{name}{{fragment="{fragment}"}} {value_of(stats)}')
+            lines.append('# HELP cis_slow_queries_total SQL statements slower than the threshold.')
+            lines.append('# TYPE cis_slow_queries_total counter')
+            lines.append(f'cis_slow_queries_total {self.slow_queries}')
+            lines.append('# HELP cis_process_id Worker process reporting these metrics.')
+            lines.append('# TYPE cis_process_id gauge')
+            lines.append(f'cis_process_id {os.getpid()}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+_settings = {'enabled': False, 'slow_threshold': 0.2}
+
+
+# ==================== SQLALCHEMY EVENTS ====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    if has_app_context():
+        stats = g.get('_request_metrics')
+        if stats is not None:
+            stats['sql_count'] += 1
+            stats['sql_seconds'] += elapsed
+
+    if elapsed >= _settings['slow_threshold']:
+        metrics.record_slow_query()
+        slow_query_log.warning('Slow query (%.1f ms): %s | params=%r',
+                               elapsed * 1000, statement, parameters)
+
+
+# ==================== FLASK HOOKS ====================
+
+def _before_request():
+    g._request_metrics = {
+        'start': time.perf_counter(),
+        'sql_count': 0,
+        'sql_seconds': 0.0,
+        'render_seconds': 0.0,
+        'render_start': None,
+    }
+
+
+def _before_render(sender, template, context, **extra):
+    stats = g.get('_request_metrics')
+    if stats is not None:
+        stats['render_start'] = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    stats = g.get('_request_metrics')
+    if stats is not None and stats['render_start'] is not None:
+        stats['render_seconds'] += time.perf_counter() - stats['render_start']
+        stats['render_start'] = None
+
+
+def _after_request(response):
+    stats = g.pop('_request_metrics', None)
+    if stats is not None:
+        metrics.record(request.endpoint or 'unmatched',
+                       time.perf_counter() - stats['start'],
+                       stats['sql_count'],
+                       stats['sql_seconds'],
+                       stats['render_seconds'],
+                       response.status_code)
+    return response
+
+
+def init_app(app):
+    """Install request hooks and SQL timing when METRICS_ENABLED is set"""
+    _settings['slow_threshold'] = app.config.get('SLOW_QUERY_THRESHOLD', 0.2)
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    if not _settings['enabled']:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _settings['enabled'] = True
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
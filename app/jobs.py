@@ -0,0 +1,439 @@
+"""
+Church Information System - Background Jobs
+"""
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.models import Job
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+logger = logging.getLogger('cis.jobs')
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# Task name -> (function, default max attempts)
+TASKS = {}
+
+_wakeup = threading.Event()
+
+
+class JobCancelled(Exception):
+    """Raised inside a task once cancellation has been requested"""
+
+
+def task(name, max_attempts=3):
+    """Register a function as a background task
+
+    The function is called as f(job, **params) inside an application
+    context, where job is a JobContext. Its return value must be JSON
+    serializable and becomes the job result.
+    """
+    def decorator(f):
+        TASKS[name] = (f, max_attempts)
+        return f
+    return decorator
+
+
+def enqueue(name, params=None, user_id=None, max_attempts=None, delay=0):
+    """Add a job to the queue and commit it so workers can see it"""
+    if name not in TASKS:
+        raise LookupError(f'Unknown task "{name}"')
+    job = Job(name=name,
+              params=json.dumps(params or {}),
+              max_attempts=max_attempts or TASKS[name][1],
+              run_after=datetime.utcnow() + timedelta(seconds=delay),
+              created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    _wakeup.set()
+    return job
+
+
+def cancel(job_id):
+    """Cancel a queued job now, or ask a running one to stop. The caller commits."""
+    now = datetime.utcnow()
+    if Job.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'cancelled', 'finished_at': now, 'message': 'Cancelled before it started'},
+            synchronize_session=False):
+        return True
+    return bool(Job.query.filter_by(id=job_id, status='running').update(
+        {'cancel_requested': True}, synchronize_session=False))
+
+
+def retry(job_id):
+    """Queue a failed or cancelled job again with a fresh set of attempts. The caller commits."""
+    requeued = Job.query.filter(Job.id == job_id, Job.status.in_(('failed', 'cancelled'))).update({
+        'status': 'queued', 'attempts': 0, 'progress': 0, 'message': None, 'error': None,
+        'result': None, 'cancel_requested': False, 'finished_at': None,
+        'run_after': datetime.utcnow(),
+    }, synchronize_session=False)
+    if requeued:
+        _wakeup.set()
+    return bool(requeued)
+
+
+def job_folder(job_id=None, create=True):
+    """Directory for a job's files, under JOBS_FOLDER (default <instance>/jobs)"""
+    root = current_app.config.get('JOBS_FOLDER') or os.path.join(current_app.instance_path, 'jobs')
+    path = os.path.join(root, str(job_id)) if job_id is not None else os.path.join(root, 'uploads')
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_upload(upload):
+    """Save an uploaded file where a worker can read it; returns the path"""
+    extension = os.path.splitext(upload.filename or '')[1].lower()
+    path = os.path.join(job_folder(), f'{uuid.uuid4().hex}{extension}')
+    upload.save(path)
+    return path
+
+
+def job_status(job):
+    """Plain-data view of a job for the status polling endpoint"""
+    def timestamp(value):
+        return value.isoformat() if value else None
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'cancel_requested': job.cancel_requested,
+        'error': job.error,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+    }
+
+
+# ==================== RUNNING JOBS ====================
+
+class JobContext:
+    """Handle a task uses to report progress and notice cancellation"""
+
+    def __init__(self, job):
+        self.id = job.id
+        self.attempt = job.attempts
+
+    def update(self, progress=None, message=None):
+        """Record progress (0-100) and a status line; raises JobCancelled if asked to stop
+
+        Written on its own connection and committed at once, so pollers see
+        it while the task's own transaction is still open.
+        """
+        values = {'heartbeat_at': datetime.utcnow()}
+        if progress is not None:
+            values['progress'] = max(0, min(100, int(progress)))
+        if message is not None:
+            values['message'] = message[:255]
+        with db.engine.begin() as conn:
+            conn.execute(sa.update(Job).where(Job.id == self.id).values(**values))
+            cancelled = conn.execute(sa.select(Job.cancel_requested).where(Job.id == self.id)).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+    def path(self, filename):
+        """Where the task should write an output file"""
+        return os.path.join(job_folder(self.id), filename)
+
+
+def _finish(job_id, status, **values):
+    values.update(status=status, finished_at=datetime.utcnow())
+    db.session.execute(sa.update(Job).where(Job.id == job_id).values(**values))
+    db.session.commit()
+
+
+def recover_stale(stale_after):
+    """Requeue running jobs whose worker stopped sending heartbeats"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    stale = Job.query.filter(Job.status == 'running', Job.heartbeat_at < cutoff)
+    requeued = stale.filter(Job.attempts < Job.max_attempts).update(
+        {'status': 'queued', 'message': 'Worker stopped; requeued', 'run_after': datetime.utcnow()},
+        synchronize_session=False)
+    failed = stale.update(
+        {'status': 'failed', 'error': 'Worker stopped while running the job', 'finished_at': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    return requeued + failed
+
+
+def claim(worker_name):
+    """Take the next due job, or return None if there is none"""
+    while True:
+        now = datetime.utcnow()
+        job_id = db.session.query(Job.id).filter(
+            Job.status == 'queued', Job.run_after <= now
+        ).order_by(Job.run_after, Job.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        # Only one worker wins the conditional UPDATE; the rest look again
+        claimed = db.session.execute(sa.update(Job).where(
+            Job.id == job_id, Job.status == 'queued'
+        ).values(status='running', attempts=Job.attempts + 1, worker=worker_name,
+                 started_at=now, heartbeat_at=now, progress=0, cancel_requested=False)).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+
+def execute(job):
+    """Run a claimed job and record how it ended"""
+    function, _ = TASKS.get(job.name, (None, None))
+    context = JobContext(job)
+    try:
+        if function is None:
+            raise LookupError(f'Unknown task "{job.name}"')
+        result = function(context, **json.loads(job.params or '{}'))
+        db.session.commit()
+    except JobCancelled:
+        db.session.rollback()
+        _finish(job.id, 'cancelled', message='Cancelled')
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed on attempt %s', job.id, job.name, job.attempts)
+        if job.attempts < job.max_attempts:
+            delay = current_app.config.get('JOBS_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+            db.session.execute(sa.update(Job).where(Job.id == job.id).values(
+                status='queued', error=str(e), message=f'Retrying in {delay}s',
+                run_after=datetime.utcnow() + timedelta(seconds=delay)))
+            db.session.commit()
+        else:
+            _finish(job.id, 'failed', error=str(e))
+    else:
+        _finish(job.id, 'succeeded', progress=100, error=None,
+                result=json.dumps(result) if result is not None else None)
+
+
+class Worker:
+    """Thread pool that claims and runs queued jobs, each in an app context"""
+
+    def __init__(self, app, threads=None, poll_interval=None):
+        self.app = app
+        self.threads = threads or app.config.get('JOBS_THREADS', 2)
+        self.poll_interval = poll_interval or app.config.get('JOBS_POLL_INTERVAL', 2.0)
+        self.stale_after = app.config.get('JOBS_STALE_SECONDS', 300)
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f'cis-jobs-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_once(self):
+        """Run at most one job; returns whether there was one"""
+        with self.app.app_context():
+            try:
+                job = claim(self.name)
+                if job is None:
+                    return False
+                execute(job)
+                return True
+            finally:
+                db.session.remove()
+
+    def run_pending(self):
+        """Run due jobs until the queue is empty; returns how many ran"""
+        count = 0
+        while self.run_once():
+            count += 1
+        return count
+
+    def _loop(self):
+        next_recovery = 0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() >= next_recovery:
+                    with self.app.app_context():
+                        recover_stale(self.stale_after)
+                        db.session.remove()
+                    next_recovery = time.monotonic() + self.stale_after / 2
+                worked = self.run_once()
+            except Exception:
+                logger.exception('Job worker error')
+                worked = False
+            if not worked:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+
+# ==================== APP INTEGRATION ====================
+
+_worker = None
+_worker_pid = None
+
+
+def _start_thread_worker(app):
+    """Start this process's worker pool the first time it serves a request
+
+    Starting lazily means a gunicorn master that preloads the app never
+    forks running threads into its workers.
+    """
+    global _worker, _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+    _worker = Worker(app).start()
+
+
+def init_app(app):
+    """Run jobs in-process (JOBS_WORKER='thread') or leave them to `flask jobs work`"""
+    if app.config.get('JOBS_WORKER') == 'thread':
+        @app.before_request
+        def start_worker():
+            _start_thread_worker(app)
+
+
+@jobs_cli.command('work')
+@click.option('--threads', type=int, help='Defaults to JOBS_THREADS.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due, then exit.')
+def work_command(threads, once):
+    """Run a job worker in the foreground."""
+    worker = Worker(current_app._get_current_object(), threads=threads)
+    if once:
+        click.echo(f'Ran {worker.run_pending()} job(s).')
+        return
+    click.echo(f'Worker {worker.name} running {worker.threads} thread(s); Ctrl+C to stop.')
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop(timeout=30)
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(('queued', 'running') + FINISHED_STATUSES))
+@click.option('--limit', default=20, show_default=True)
+def list_command(status, limit):
+    """Show recent jobs."""
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter_by(status=status)
+    for job in query.limit(limit):
+        click.echo(f'{job.id:6d}  {job.name:<28} {job.status:<10} {job.progress:3d}%  {job.message or ""}')
+
+
+@jobs_cli.command('prune')
+@click.option('--days', default=30, show_default=True, help='Keep finished jobs newer than this.')
+def prune_command(days):
+    """Delete finished jobs and their files."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    old = Job.query.filter(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+    ids = []
+    for job_id, params in old.with_entities(Job.id, Job.params):
+        ids.append(job_id)
+        shutil.rmtree(job_folder(job_id, create=False), ignore_errors=True)
+        # Staged uploads of imports that never succeeded are kept for retries until now
+        staged = json.loads(params or '{}').get('path')
+        if staged and os.path.exists(staged):
+            os.remove(staged)
+    old.delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {len(ids)} job(s).')
+
+
+# ==================== TASKS ====================
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+@task('members.import', max_attempts=1)
+def import_members_task(job, path, import_format='csv', dry_run=False):
+    """Import a staged upload; not retried automatically, as earlier batches are already committed
+
+    The upload is deleted once the import succeeds. After a failure it
+    stays for /admin/jobs/<id>/retry until `flask jobs prune` removes it.
+    """
+    from app.importer import import_members
+    lines = max(1, _count_lines(path))
+
+    def progress(report):
+        verb = 'validated' if dry_run else 'imported'
+        job.update(report.total * 100 // lines, f'{report.inserted} rows {verb}, {report.skipped} skipped')
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_members(stream, import_format, dry_run=dry_run,
+                                commit_batches=True, progress=progress)
+    os.remove(path)
+    return {
+        'dry_run': dry_run,
+        'total': report.total,
+        'inserted': report.inserted,
+        'skipped': report.skipped,
+        'error_count': report.error_count,
+        'errors': report.errors,
+    }
+
+
+@task('members.export')
+def export_members_task(job, user_id, export_format='csv', filters=None):
+    """Write the filtered member directory to a file in the job folder"""
+    from app import export, queries
+    from app.models import User
+    user = db.session.get(User, user_id)
+    query, _ = queries.filtered_members(user, queries.member_filters(filters or {}))
+    total = max(1, query.order_by(None).count())
+    mimetype, extension = export.EXPORT_FORMATS[export_format]
+    filename = f'members-{datetime.utcnow():%Y%m%d}.{extension}'
+
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            exported += 1
+            if exported % export.BATCH_SIZE == 0:
+                job.update(exported * 100 // total, f'{exported} of {total} members written')
+            yield row
+
+    encode = export.stream_csv if export_format == 'csv' else export.stream_jsonl
+    with open(job.path(filename), 'w', encoding='utf-8', newline='') as f:
+        for chunk in encode(counted(export.export_rows(query))):
+            f.write(chunk)
+    return {'file': filename, 'mimetype': mimetype, 'rows': exported}
+
+
+@task('members.reconcile_counts')
+def reconcile_counts_task(job):
+    """Recompute stored member counts"""
+    from app import counters
+    drift = counters.reconcile()
+    db.session.commit()
+    return {'fixed': len(drift), 'drift': [list(row) for row in drift]}
+
+
+@task('reports.refresh', max_attempts=1)
+def refresh_reports_task(job, rebuild=False):
+    """Fold member changes into the report rollups; the next refresh picks up where this stopped"""
+    from app import reports
+    folded = reports.rebuild() if rebuild else reports.refresh()
+    return {'folded': folded}
@@ -0,0 +1,225 @@
+"""
+Church Information System - Schema Migrations
+"""
+from datetime import datetime
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from app import db
+
+schema_cli = AppGroup('schema', help='Database schema migrations.')
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a schema migration; versions must be applied in order"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+
+def head_version():
+    """Latest known migration version"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _ensure_version_table(conn):
+    conn.execute(sa.text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)'
+    ))
+
+
+def current_version(conn):
+    """Highest migration version recorded in the database"""
+    _ensure_version_table(conn)
+    version = conn.execute(sa.text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+
+def _record(conn, version, description):
+    conn.execute(sa.text(
+        'INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'
+    ), {'v': version, 'd': description, 't': datetime.utcnow()})
+
+
+def upgrade():
+    """Bring the database schema up to the latest version
+
+    A database without any tables is created from the models and stamped
+    at the head version. Otherwise missing tables are created and every
+    pending migration is applied in its own transaction.
+    """
+    fresh = 'members' not in sa.inspect(db.engine).get_table_names()
+    # Primary only: the replica bind is the same data, and its key outlives
+    # the app on db.metadatas, so another app in this process lacks it
+    db.create_all(bind_key=None)
+
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+        if fresh and version == 0:
+            for migration_version, description, _ in MIGRATIONS:
+                _record(conn, migration_version, description)
+            return []
+
+    applied = []
+    for migration_version, description, apply in MIGRATIONS:
+        with db.engine.begin() as conn:
+            if migration_version <= current_version(conn):
+                continue
+            apply(conn)
+            _record(conn, migration_version, description)
+            applied.append(migration_version)
+    return applied
+
+
+def has_column(conn, table, column):
+    """Check whether a table already has a column"""
+    return column in {c['name'] for c in sa.inspect(conn).get_columns(table)}
+
+
+# ==================== MIGRATIONS ====================
+
+def create_indexes(conn, model, *names):
+    """Create named indexes declared on a model if they are missing"""
+    for index in model.__table__.indexes:
+        if index.name in names:
+            # IF NOT EXISTS rather than checkfirst: reflection cannot see expression indexes
+            conn.execute(sa.schema.CreateIndex(index, if_not_exists=True))
+
+
+@migration(1, 'Composite indexes for member filter paths')
+def add_member_filter_indexes(conn):
+    from app.models import Member
+    create_indexes(conn, Member,
+                   'ix_members_status_caregroup',
+                   'ix_members_status_ministry',
+                   'ix_members_status_created',
+                   'ix_members_status_fullname')
+
+
+@migration(2, 'Stored active member counts on care groups and ministries')
+def add_member_counts(conn):
+    for table, column in (('caregroups', 'caregroup_id'), ('ministries', 'ministry_id')):
+        if not has_column(conn, table, 'member_count'):
+            conn.execute(sa.text(
+                f'ALTER TABLE {table} ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0'
+            ))
+        conn.execute(sa.text(
+            f'UPDATE {table} SET member_count = ('
+            f'SELECT COUNT(*) FROM members WHERE members.{column} = {table}.id '
+            f"AND members.status = 'active')"
+        ))
+
+
+@migration(3, 'Month/day expression indexes for birthdays and anniversaries')
+def add_celebration_indexes(conn):
+    from app.models import Member
+    create_indexes(conn, Member,
+                   'ix_members_status_birth_md',
+                   'ix_members_status_baptism_md')
+
+
+@migration(4, 'updated_at indexes for the change feed')
+def add_change_feed_indexes(conn):
+    from app.models import Member, CareGroup, Ministry
+    for model in (Member, CareGroup, Ministry):
+        table = model.__tablename__
+        # Rows without a timestamp would never reach a syncing client
+        conn.execute(sa.text(
+            f'UPDATE {table} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) '
+            f'WHERE updated_at IS NULL'
+        ))
+        create_indexes(conn, model, f'ix_{table}_updated')
+
+
+# ==================== QUERY PLAN CHECKS ====================
+
+def hot_queries():
+    """Statements that must be served from an index, keyed by name"""
+    from datetime import date
+    from app.models import Member
+    from app.queries import celebrations
+    active = Member.query.filter(Member.status == 'active')
+
+    def celebrating(column, start, days):
+        # The filter only; sorting the handful of matches is expected
+        return celebrations(active, column, start, days).with_entities(Member.id).order_by(None)
+
+    return {
+        'dashboard recent members': active.order_by(Member.created_at.desc()).limit(5),
+        'list by care group': active.filter(Member.caregroup_id == 1).order_by(Member.fullname, Member.id),
+        'list by ministry': active.filter(Member.ministry_id == 1).order_by(Member.fullname, Member.id),
+        'list all active': active.order_by(Member.fullname, Member.id).limit(10),
+        'care group member count': active.filter(Member.caregroup_id == 1).with_entities(sa.func.count(Member.id)),
+        'care group counts': active.with_entities(Member.caregroup_id, sa.func.count(Member.id)).group_by(Member.caregroup_id),
+        'ministry counts': active.with_entities(Member.ministry_id, sa.func.count(Member.id)).group_by(Member.ministry_id),
+        'birthdays this week': celebrating(Member.date_of_birth, date(2024, 6, 10), 7),
+        'birthdays across new year': celebrating(Member.date_of_birth, date(2024, 12, 29), 7),
+        'baptism anniversaries this month': celebrating(Member.baptism_date, date(2024, 6, 1), 30),
+        'member changes since cursor': Member.query.filter(
+            sa.tuple_(Member.updated_at, Member.id) > sa.tuple_(sa.literal(datetime(2024, 6, 1)), sa.literal(1))
+        ).order_by(Member.updated_at, Member.id).limit(500),
+    }
+
+
+def explain(query):
+    """EXPLAIN QUERY PLAN detail lines for a query (SQLite only)"""
+    statement = query.statement.compile(dialect=db.engine.dialect,
+                                        compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(sa.text(f'EXPLAIN QUERY PLAN {statement}')).all()
+    return [row[-1] for row in rows]
+
+
+def _is_regression(line):
+    # SCAN walks the whole table (or a whole index); a temp b-tree sorts
+    # every matching row. Hot queries should only SEARCH an index.
+    return line.startswith('SCAN') or 'USE TEMP B-TREE' in line
+
+
+def check_query_plans():
+    """Return {name: plan} for hot queries that scan or sort the table"""
+    failures = {}
+    for name, query in hot_queries().items():
+        plan = explain(query)
+        if any(_is_regression(line) for line in plan):
+            failures[name] = plan
+    return failures
+
+
+# ==================== CLI ====================
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending schema migrations."""
+    applied = upgrade()
+    if applied:
+        click.echo(f'Applied migrations: {", ".join(str(v) for v in applied)}')
+    else:
+        click.echo(f'Schema is up to date (version {head_version()}).')
+
+
+@schema_cli.command('version')
+def version_command():
+    """Show the current schema version."""
+    with db.engine.connect() as conn:
+        click.echo(f'Current: {current_version(conn)}  Head: {head_version()}')
+
+
+@schema_cli.command('check-plans')
+def check_plans_command():
+    """Fail if a hot query plan scans or sorts the members table."""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Query plan checks only run on SQLite.')
+        return
+    failures = check_query_plans()
+    for name, plan in failures.items():
+        click.echo(f'REGRESSION: {name}', err=True)
+        for line in plan:
+            click.echo(f'    {line}', err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo(f'All {len(hot_queries())} hot queries use an index.')
@@ -2,10 +2,35 @@
 Church Information System - Database Models
 """
 from app import db
+from flask import current_app
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import check_password_hash, generate_password_hash
 
+
+def password_hash_method():
+    """Werkzeug hash method from PASSWORD_HASH_METHOD, e.g. 'pbkdf2:sha256:600000'"""
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+
+def month_day(column):
+    """Month and day of a date as one integer (Dec 25 -> 1225), ignoring the year
+
+    Birthday and anniversary lookups filter on this exact expression so
+    they can use the matching expression indexes on members.
+    """
+    return db.extract('month', column) * db.literal_column('100') + db.extract('day', column)
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    # Werkzeug fills in defaults ('pbkdf2' -> 'pbkdf2:sha256:600000'), so
+    # hash once to learn the exact prefix new hashes get
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
 class User(UserMixin, db.Model):
     """User model for authentication and role management"""
     __tablename__ = 'users'
@@ -25,12 +50,16 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password = generate_password_hash(password)
+        self.password = generate_password_hash(password, method=password_hash_method())
     
     def check_password(self, password):
         """Check if provided password matches hash"""
         return check_password_hash(self.password, password)
     
+    def password_needs_rehash(self):
+        """True when the stored hash was made with other parameters than configured"""
+        return self.password.split('$', 1)[0] != _hash_prefix(password_hash_method())
+    
     def has_role(self, role):
         """Check if user has specific role"""
         return self.role == role
@@ -54,38 +83,82 @@ class User(UserMixin, db.Model):
 class Member(db.Model):
     """Member model for church members"""
     __tablename__ = 'members'
+    __table_args__ = (
+        db.Index('ix_members_status_caregroup', 'status', 'caregroup_id', 'fullname'),
+        db.Index('ix_members_status_ministry', 'status', 'ministry_id', 'fullname'),
+        db.Index('ix_members_status_created', 'status', 'created_at'),
+        db.Index('ix_members_status_fullname', 'status', 'fullname'),
+        db.Index('ix_members_updated', 'updated_at', 'id'),  # Change feed, see app/sync.py
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     fullname = db.Column(db.String(120), nullable=False, index=True)
     date_of_birth = db.Column(db.Date)
-    age = db.Column(db.Integer)
+    recorded_age = db.Column('age', db.Integer)  # Entered by hand; only used without a date of birth
     gender = db.Column(db.String(20))  # Male, Female, Other
     address = db.Column(db.Text)
     contact = db.Column(db.String(20))
     baptism_date = db.Column(db.Date)
-    ministry_id = db.Column(db.Integer, db.ForeignKey('ministries.id'))
-    caregroup_id = db.Column(db.Integer, db.ForeignKey('caregroups.id'))
-    status = db.Column(db.String(20), default='active')  # active or inactive
+    # active_history keeps the old values around for the member counters
+    # in app/counters.py, even when they were never loaded
+    ministry_id = db.column_property(db.Column(db.Integer, db.ForeignKey('ministries.id')), active_history=True)
+    caregroup_id = db.column_property(db.Column(db.Integer, db.ForeignKey('caregroups.id')), active_history=True)
+    status = db.column_property(db.Column(db.String(20), default='active'), active_history=True)  # active or inactive
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    ministry = db.relationship('Ministry', backref='members')
-    caregroup = db.relationship('CareGroup', backref='members')
+    # Relationships; the member collections are dynamic queries so a
+    # large group is never loaded whole (filter, order and paginate them)
+    ministry = db.relationship('Ministry', backref=db.backref('members', lazy='dynamic'))
+    caregroup = db.relationship('CareGroup', backref=db.backref('members', lazy='dynamic'))
+    
+    @hybrid_property
+    def age(self):
+        """Age in years from date_of_birth, else the recorded age"""
+        if self.date_of_birth is None:
+            return self.recorded_age
+        today = date.today()
+        born = self.date_of_birth
+        return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+    
+    @age.setter
+    def age(self, value):
+        self.recorded_age = value
+    
+    @age.expression
+    def age(cls):
+        # Bound at execution from date.today(), like the Python side: the
+        # database's current_date is UTC and the expression may be built
+        # once at import (export and API column maps)
+        today = db.bindparam('today', callable_=lambda: date.today(), type_=db.Date, unique=True)
+        return db.case(
+            (cls.date_of_birth.is_(None), cls.recorded_age),
+            else_=db.extract('year', today) - db.extract('year', cls.date_of_birth)
+            - db.case((month_day(cls.date_of_birth) > month_day(today), 1), else_=0)
+        )
     
     def __repr__(self):
         return f'<Member {self.fullname}>'
 
 
+# Birthday and anniversary lookups (see queries.celebrations)
+db.Index('ix_members_status_birth_md', Member.status, month_day(Member.date_of_birth))
+db.Index('ix_members_status_baptism_md', Member.status, month_day(Member.baptism_date))
+
+
 class CareGroup(db.Model):
     """Care group model"""
     __tablename__ = 'caregroups'
+    __table_args__ = (
+        db.Index('ix_caregroups_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False, unique=True, index=True)
     color = db.Column(db.String(7), default='#000000')  # Hex color
     leader_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     status = db.Column(db.String(20), default='active')
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # active members, see app/counters.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -93,8 +166,8 @@ class CareGroup(db.Model):
     leader = db.relationship('User', backref='led_caregroups', foreign_keys=[leader_id])
     
     def get_member_count(self):
-        """Get count of members in this care group"""
-        return Member.query.filter_by(caregroup_id=self.id, status='active').count()
+        """Get count of active members in this care group"""
+        return self.member_count
     
     def __repr__(self):
         return f'<CareGroup {self.name}>'
@@ -103,22 +176,113 @@ class CareGroup(db.Model):
 class Ministry(db.Model):
     """Ministry model"""
     __tablename__ = 'ministries'
+    __table_args__ = (
+        db.Index('ix_ministries_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False, unique=True, index=True)
     description = db.Column(db.Text)
     status = db.Column(db.String(20), default='active')
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # active members, see app/counters.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def get_member_count(self):
-        """Get count of members in this ministry"""
-        return Member.query.filter_by(ministry_id=self.id, status='active').count()
+        """Get count of active members in this ministry"""
+        return self.member_count
     
     def __repr__(self):
         return f'<Ministry {self.name}>'
 
 
+class Attendance(db.Model):
+    """A member's check-in to one service, written by app/attendance.py"""
+    __tablename__ = 'attendance'
+    __table_args__ = (
+        # One row per member per service; repeated check-ins are ignored
+        db.UniqueConstraint('service_date', 'service', 'member_id', name='uq_attendance_member_service'),
+        db.Index('ix_attendance_service_caregroup', 'service_date', 'service', 'caregroup_id'),
+        db.Index('ix_attendance_member', 'member_id', 'service_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    caregroup_id = db.Column(db.Integer, db.ForeignKey('caregroups.id'))  # The member's group at check-in
+    service_date = db.Column(db.Date, nullable=False)
+    service = db.Column(db.String(40), nullable=False, default='sunday')  # e.g. sunday, evening, youth
+    checked_in_at = db.Column(db.DateTime, default=datetime.utcnow)
+    checked_in_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    # Relationships
+    member = db.relationship('Member', backref=db.backref('attendance', lazy='dynamic'))
+    caregroup = db.relationship('CareGroup')
+    user = db.relationship('User', foreign_keys=[checked_in_by])
+    
+    def __repr__(self):
+        return f'<Attendance {self.member_id} {self.service_date} {self.service}>'
+
+
+class MemberMove(db.Model):
+    """A member leaving a care group, kept so the change feed can tell that group's leader"""
+    __tablename__ = 'member_moves'
+    __table_args__ = (
+        db.Index('ix_member_moves_caregroup', 'caregroup_id', 'moved_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    caregroup_id = db.Column(db.Integer, db.ForeignKey('caregroups.id'), nullable=False)  # The group left
+    moved_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MemberMove {self.member_id} from {self.caregroup_id}>'
+
+
+class ReportMember(db.Model):
+    """The state of a member the reports last saw, kept by app/reports.py"""
+    __tablename__ = 'report_members'
+    __table_args__ = (
+        # The newest copy is where the next refresh resumes
+        db.Index('ix_report_members_source', 'source_updated_at', 'member_id'),
+    )
+    
+    member_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    caregroup_id = db.Column(db.Integer, nullable=False, default=0)  # 0 when unassigned
+    active = db.Column(db.Boolean, nullable=False)
+    source_updated_at = db.Column(db.DateTime, nullable=False)  # members.updated_at when copied
+    
+    def __repr__(self):
+        return f'<ReportMember {self.member_id}>'
+
+
+class ReportDaily(db.Model):
+    """Members who joined or left each care group per day, kept by app/reports.py"""
+    __tablename__ = 'report_daily'
+    
+    day = db.Column(db.Date, primary_key=True)
+    caregroup_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 when unassigned
+    joined = db.Column(db.Integer, nullable=False, default=0)
+    left = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ReportDaily {self.day} {self.caregroup_id}>'
+
+
+class ReportDistribution(db.Model):
+    """Daily snapshot of active members by ministry, gender and age band"""
+    __tablename__ = 'report_distribution'
+    
+    day = db.Column(db.Date, primary_key=True)
+    ministry_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 when unassigned
+    gender = db.Column(db.String(20), primary_key=True)  # '' when not recorded
+    age_band = db.Column(db.String(20), primary_key=True)
+    members = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ReportDistribution {self.day} {self.ministry_id}>'
+
+
 class Setting(db.Model):
     """Settings model for system and user preferences"""
     __tablename__ = 'settings'
@@ -131,3 +295,41 @@ class Setting(db.Model):
     
     def __repr__(self):
         return f'<Setting {self.setting_name}>'
+
+
+class Job(db.Model):
+    """Background job run by the queue in app/jobs.py"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)  # Registered task name
+    params = db.Column(db.Text)  # JSON keyword arguments
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, succeeded, failed, cancelled
+    progress = db.Column(db.Integer, default=0, nullable=False)  # 0-100
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    worker = db.Column(db.String(80))
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    heartbeat_at = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', foreign_keys=[created_by])
+    
+    def is_finished(self):
+        """Check if the job has stopped for good"""
+        return self.status in ('succeeded', 'failed', 'cancelled')
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.name}>'
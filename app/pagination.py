@@ -0,0 +1,148 @@
+"""
+Church Information System - Keyset Pagination
+"""
+import hashlib
+from datetime import date, datetime
+import sqlalchemy as sa
+from sqlalchemy.sql.util import find_tables
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from app import db, cache
+from app.settings_store import settings
+
+
+class KeysetPage:
+    """One page of results plus the cursors to reach its neighbours"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def page_size():
+    """Configured number of rows per page"""
+    return settings.items_per_page
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='keyset-cursor')
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load_value(value, column):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    """Opaque token pointing before ('prev') or after ('next') a row"""
+    return _serializer().dumps([direction, [_dump_value(v) for v in values]])
+
+
+def decode_cursor(token, order_by):
+    """Return (direction, values) for a token, or ('next', None) if invalid"""
+    if not token:
+        return 'next', None
+    try:
+        direction, values = _serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return 'next', None
+    if direction not in ('next', 'prev') or len(values) != len(order_by):
+        return 'next', None
+    try:
+        return direction, [_load_value(v, c) for v, c in zip(values, order_by)]
+    except (TypeError, ValueError):
+        return 'next', None
+
+
+def cached_count(query):
+    """COUNT(*) for a query, reused for PAGINATION_COUNT_TTL seconds
+
+    The key carries the cache stamp of every table the query reads, so
+    any commit to one of them starts a fresh count.
+    """
+    ttl = current_app.config.get('PAGINATION_COUNT_TTL', 60)
+    query = query.order_by(None)
+    if ttl <= 0:
+        return query.count()
+    statement = query.statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    digest = hashlib.sha1(f'{compiled}|{sorted(compiled.params.items())!r}'.encode()).hexdigest()
+    tables = sorted({table.name for table in find_tables(statement, include_joins=True)
+                     if isinstance(table, sa.Table)})
+    key = f'count:{digest}:{cache.stamp(*tables)}'
+    return cache.get_or_set(key, query.count, ttl=ttl)
+
+
+def keyset_paginate(query, order_by, cursor=None, per_page=None, with_total=True):
+    """Paginate by comparing the ordering key instead of using OFFSET
+
+    order_by is a list of ascending column expressions whose combined
+    value is unique per row, e.g. [Member.fullname, Member.id]. Items are
+    entities for single-entity queries and row tuples otherwise.
+    """
+    per_page = per_page or page_size()
+    direction, anchor = decode_cursor(cursor, order_by)
+    total = cached_count(query) if with_total else None
+
+    key = sa.tuple_(*order_by)
+    if anchor is not None:
+        bound = sa.tuple_(*[sa.literal(v) for v in anchor])
+        query = query.filter(key > bound if direction == 'next' else key < bound)
+
+    width = len(query.column_descriptions)
+    ordering = order_by if direction == 'next' else [c.desc() for c in order_by]
+    rows = query.add_columns(*order_by).order_by(None).order_by(*ordering).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    keys = [list(row[width:]) for row in rows]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'next':
+            if has_more:
+                next_cursor = encode_cursor('next', keys[-1])
+            if anchor is not None:
+                prev_cursor = encode_cursor('prev', keys[0])
+        else:
+            next_cursor = encode_cursor('next', keys[-1])
+            if has_more:
+                prev_cursor = encode_cursor('prev', keys[0])
+
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total)
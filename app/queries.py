@@ -0,0 +1,222 @@
+"""
+Church Information System - Query Layer
+"""
+import calendar
+from datetime import date, timedelta
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Member, CareGroup, Ministry, User, month_day
+from app import search as member_search
+
+
+def scoped_members(user, status=None, ministry_id=None, caregroup_id=None):
+    """Members visible to a user, narrowed by the list filters"""
+    query = Member.query
+
+    if status:
+        query = query.filter(Member.status == status)
+
+    if user.is_leader() and not user.is_admin():
+        # Leaders can only see their care group members
+        query = query.filter(Member.caregroup_id == user.caregroup_id)
+
+    if ministry_id:
+        query = query.filter(Member.ministry_id == ministry_id)
+
+    if caregroup_id:
+        query = query.filter(Member.caregroup_id == caregroup_id)
+
+    return query
+
+
+def _optional_int(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def member_filters(args):
+    """Read the member list filters from request args or form data"""
+    return {
+        'search': args.get('search', ''),
+        'ministry_id': _optional_int(args.get('ministry')),
+        'caregroup_id': _optional_int(args.get('caregroup')),
+        'status': args.get('status', 'active'),
+    }
+
+
+def filtered_members(user, filters):
+    """Members matching the list filters, plus a search rank expression"""
+    query = scoped_members(user,
+                           status=filters['status'],
+                           ministry_id=filters['ministry_id'],
+                           caregroup_id=filters['caregroup_id'])
+    rank = None
+    if filters['search']:
+        query, rank = member_search.apply_search(query, filters['search'])
+    return query, rank
+
+
+def with_member_relations(query):
+    """Load each member's ministry and care group in the same SELECT"""
+    return query.options(
+        joinedload(Member.ministry),
+        joinedload(Member.caregroup)
+    )
+
+
+def active_caregroups():
+    """Active care groups with their leaders joined in"""
+    return CareGroup.query.options(
+        joinedload(CareGroup.leader)
+    ).filter_by(status='active').all()
+
+
+def active_ministries():
+    """Active ministries"""
+    return Ministry.query.filter_by(status='active').all()
+
+
+def eligible_leader(user_id):
+    """The user if they can lead a care group (active and not an admin), else None"""
+    return User.query.filter(User.id == user_id, User.role != 'admin', User.status == 'active').first()
+
+
+def _active_member_counts(column):
+    """Count active members per value of column in one grouped query"""
+    rows = db.session.query(
+        column,
+        db.func.count(Member.id)
+    ).filter(
+        Member.status == 'active',
+        column.isnot(None)
+    ).group_by(column).all()
+    return dict(rows)
+
+
+def caregroup_member_counts():
+    """Map of care group id to active member count"""
+    return _active_member_counts(Member.caregroup_id)
+
+
+def ministry_member_counts():
+    """Map of ministry id to active member count"""
+    return _active_member_counts(Member.ministry_id)
+
+
+ROSTER_STATUSES = ('active', 'inactive')
+
+
+def caregroup_roster(caregroup, status='active'):
+    """A care group's members (all of them when status is empty) with
+    their ministries joined in, as a query for the caller to paginate"""
+    query = caregroup.members.options(joinedload(Member.ministry))
+    if status:
+        query = query.filter(Member.status == status)
+    return query
+
+
+def _md(day):
+    return day.month * 100 + day.day
+
+
+def celebrations(query, column, start, days):
+    """Members whose date in column falls, ignoring the year, within days from start
+
+    Filters on month_day(column), which the expression indexes cover. A
+    window that crosses New Year becomes md >= start OR md <= end, and
+    rows come back in calendar order from start. In common years Feb 29
+    dates count as Feb 28, matching next_occurrence.
+    """
+    key = month_day(column)
+    end = start + timedelta(days=days - 1)
+    first, last = _md(start), _md(end)
+    if last == 228 and not calendar.isleap(end.year):
+        last = 229  # Celebrated on Feb 28 this year
+    if days >= 366:
+        condition = column.isnot(None)
+    elif first <= last:
+        condition = key.between(first, last)
+    else:
+        condition = db.or_(key >= first, key <= last)
+    return query.filter(condition).order_by(
+        db.case((key >= first, 0), else_=1), key, Member.fullname
+    )
+
+
+def next_occurrence(original, start):
+    """The first anniversary of original on or after start"""
+    year = start.year if _md(original) >= _md(start) else start.year + 1
+    if original.month == 2 and original.day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return original.replace(year=year)
+
+
+def celebration_rows(query, column, start, days, limit=None):
+    """Plain dicts for the dashboard and API: who, when, and how many years"""
+    rows = celebrations(query, column, start, days).with_entities(
+        Member.id, Member.fullname, column
+    ).limit(limit).all()
+    result = []
+    for member_id, fullname, original in rows:
+        occurs = next_occurrence(original, start)
+        result.append({
+            'id': member_id,
+            'fullname': fullname,
+            'date': original,
+            'next': occurs,
+            'years': occurs.year - original.year,
+        })
+    return result
+
+
+def week_celebrations(today=None, limit=20):
+    """Birthdays this week (Monday to Sunday) and baptism anniversaries this month"""
+    today = today or date.today()
+    active = Member.query.filter(Member.status == 'active')
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    return {
+        'birthdays': celebration_rows(active, Member.date_of_birth, week_start, 7, limit),
+        'anniversaries': celebration_rows(active, Member.baptism_date, month_start,
+                                          calendar.monthrange(today.year, today.month)[1], limit),
+    }
+
+
+def dashboard_stats():
+    """Plain-data snapshot of everything the dashboard shows, safe to cache"""
+    caregroups = active_caregroups()
+
+    ministry_stats = db.session.query(
+        Ministry.name, Ministry.member_count
+    ).filter(
+        Ministry.status == 'active', Ministry.member_count > 0
+    ).order_by(Ministry.id).all()
+
+    recent_members = with_member_relations(
+        Member.query.filter_by(status='active')
+    ).order_by(Member.created_at.desc()).limit(5).all()
+
+    return {
+        'celebrations': week_celebrations(),
+        'total_members': Member.query.filter_by(status='active').count(),
+        'total_caregroups': len(caregroups),
+        'ministry_stats': [(name, count) for name, count in ministry_stats],
+        'recent_members': [{
+            'id': m.id,
+            'fullname': m.fullname,
+            'age': m.age,
+            'contact': m.contact,
+            'ministry_name': m.ministry.name if m.ministry else None,
+            'caregroup_name': m.caregroup.name if m.caregroup else None,
+            'caregroup_color': m.caregroup.color if m.caregroup else None,
+        } for m in recent_members],
+        'caregroups': [{
+            'id': cg.id,
+            'name': cg.name,
+            'color': cg.color,
+            'leader_name': cg.leader.username if cg.leader else None,
+            'member_count': cg.member_count,
+        } for cg in caregroups],
+    }
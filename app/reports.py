@@ -0,0 +1,422 @@
+"""
+Church Information System - Membership Reports
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, cache
+from app.models import Member, CareGroup, Ministry, Job, ReportMember, ReportDaily, ReportDistribution
+
+reports_cli = AppGroup('reports', help='Membership report rollups.')
+
+logger = logging.getLogger('cis.reports')
+
+# (youngest age, label), youngest first
+AGE_BANDS = (
+    (0, '0-12'),
+    (13, '13-17'),
+    (18, '18-25'),
+    (26, '26-35'),
+    (36, '36-50'),
+    (51, '51-65'),
+    (66, '66+'),
+)
+UNKNOWN_AGE = 'Unknown'
+
+REFRESH_BATCH = 2000
+
+
+class RefreshConflict(Exception):
+    """Another refresh folded in the same changes first"""
+
+
+# ==================== ROLLUPS ====================
+
+def _watermark(conn):
+    """(updated_at, id) of the newest member change already folded in, or None"""
+    row = conn.execute(
+        sa.select(ReportMember.source_updated_at, ReportMember.member_id)
+        .order_by(ReportMember.source_updated_at.desc(), ReportMember.member_id.desc())
+        .limit(1)
+    ).first()
+    return tuple(row) if row else None
+
+
+def _deltas(rows, copies):
+    """{(day, care group id): [joined, left]} for the changed members
+
+    A member seen for the first time joined on created_at, and one that
+    is already inactive left at its last change. After that every switch
+    between care groups, or in or out of active, is a departure from the
+    old group and an arrival in the new one on the day it was made.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for member_id, caregroup_id, status, created_at, updated_at in rows:
+        group, active = caregroup_id or 0, status == 'active'
+        day = updated_at.date()
+        if member_id not in copies:
+            joined = (created_at or updated_at).date()
+            if active or day > joined:
+                deltas[joined, group][0] += 1
+            if not active and day > joined:
+                deltas[day, group][1] += 1
+            continue
+        old_group, was_active = copies[member_id]
+        if (old_group, was_active) == (group, active) or not (was_active or active):
+            continue
+        if was_active:
+            deltas[day, old_group][1] += 1
+        if active:
+            deltas[day, group][0] += 1
+    return deltas
+
+
+class _Bound:
+    """Stand-in for excluded in an UPDATE run once per row: each column is a bind parameter"""
+
+    def __getattr__(self, name):
+        return sa.bindparam(f'new_{name}')
+
+
+def _upsert(conn, model, keys, rows, updates):
+    """Insert rows, or update the ones whose keys already exist
+
+    updates maps the incoming row (excluded) to the values set on a
+    conflicting one. SQLite and PostgreSQL do it in one statement.
+    """
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        insert = None
+
+    if insert is not None:
+        statement = insert(model)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=keys, set_=updates(statement.excluded)
+        ), rows)
+        return
+    # Elsewhere look the keys up and split the rows; a refresh racing in
+    # fails on the unique key and rolls back, leaving the watermark as it was
+    columns = [getattr(model, key) for key in keys]
+    existing = set(conn.execute(sa.select(*columns).where(
+        sa.tuple_(*columns).in_([tuple(row[key] for key in keys) for row in rows])
+    )).all())
+    matched = [row for row in rows if tuple(row[key] for key in keys) in existing]
+    fresh = [row for row in rows if tuple(row[key] for key in keys) not in existing]
+    if matched:
+        conn.execute(
+            sa.update(model).where(*(column == sa.bindparam(f'key_{column.key}') for column in columns))
+            .values(updates(_Bound())),
+            [dict({f'new_{name}': value for name, value in row.items()},
+                  **{f'key_{key}': row[key] for key in keys}) for row in matched]
+        )
+    if fresh:
+        conn.execute(sa.insert(model), fresh)
+
+
+def _fold(after, horizon, batch_size):
+    """Fold the next batch of member changes in; returns (last position, rows read)"""
+    with db.engine.begin() as conn:
+        # Copies, rollups and the watermark move together, so a second
+        # refresh racing this one finds the watermark moved and stops
+        if _watermark(conn) != after:
+            raise RefreshConflict()
+        query = sa.select(
+            Member.id, Member.caregroup_id, Member.status, Member.created_at, Member.updated_at
+        ).where(Member.updated_at <= horizon)
+        if after is not None:
+            query = query.where(
+                sa.tuple_(Member.updated_at, Member.id) > sa.tuple_(sa.literal(after[0]), sa.literal(after[1]))
+            )
+        rows = conn.execute(query.order_by(Member.updated_at, Member.id).limit(batch_size)).all()
+        if not rows:
+            return after, 0
+
+        copies = {member_id: (group, active) for member_id, group, active in conn.execute(
+            sa.select(ReportMember.member_id, ReportMember.caregroup_id, ReportMember.active)
+            .where(ReportMember.member_id.in_([row.id for row in rows]))
+        )}
+        deltas = _deltas(rows, copies)
+
+        _upsert(conn, ReportMember, ['member_id'], [{
+            'member_id': row.id,
+            'caregroup_id': row.caregroup_id or 0,
+            'active': row.status == 'active',
+            'source_updated_at': row.updated_at,
+        } for row in rows], lambda excluded: {
+            'caregroup_id': excluded.caregroup_id,
+            'active': excluded.active,
+            'source_updated_at': excluded.source_updated_at,
+        })
+        if deltas:
+            _upsert(conn, ReportDaily, ['day', 'caregroup_id'], [
+                {'day': day, 'caregroup_id': group, 'joined': joined, 'left': left}
+                for (day, group), (joined, left) in deltas.items()
+            ], lambda excluded: {
+                'joined': ReportDaily.joined + excluded.joined,
+                'left': ReportDaily.left + excluded.left,
+            })
+        return (rows[-1].updated_at, rows[-1].id), len(rows)
+
+
+def _age_band(age):
+    bands = [(age >= youngest, label) for youngest, label in reversed(AGE_BANDS)]
+    return sa.case((age.is_(None), UNKNOWN_AGE), *bands, else_=UNKNOWN_AGE)
+
+
+def snapshot(day=None):
+    """Replace the day's distribution snapshot with one grouped query over active members"""
+    day = day or date.today()
+    # Count by exact age first so the bands are only worked out per group
+    ministry = sa.func.coalesce(Member.ministry_id, 0).label('ministry_id')
+    gender = sa.func.coalesce(Member.gender, '').label('gender')
+    ages = sa.select(
+        ministry, gender, Member.age.label('age'), sa.func.count(Member.id).label('members')
+    ).where(Member.status == 'active').group_by(ministry, gender, Member.age).subquery()
+    band = _age_band(ages.c.age)
+    grouped = sa.select(
+        sa.literal(day, sa.Date), ages.c.ministry_id, ages.c.gender, band, sa.func.sum(ages.c.members)
+    ).group_by(ages.c.ministry_id, ages.c.gender, band)
+    with db.engine.begin() as conn:
+        conn.execute(sa.delete(ReportDistribution).where(ReportDistribution.day == day))
+        conn.execute(sa.insert(ReportDistribution).from_select(
+            ['day', 'ministry_id', 'gender', 'age_band', 'members'], grouped
+        ))
+
+
+def refresh(batch_size=REFRESH_BATCH):
+    """Bring the rollups up to date with members; returns how many changes were folded in
+
+    Only members whose (updated_at, id) is past the newest copy are read,
+    so a refresh after a quiet day touches a handful of rows. Changes
+    younger than SYNC_SETTLE_SECONDS wait, as in the change feed, for
+    transactions that stamped an earlier time to commit. The day's
+    distribution snapshot is retaken when anything changed.
+    """
+    settle = current_app.config.get('SYNC_SETTLE_SECONDS', 5)
+    horizon = datetime.utcnow() - timedelta(seconds=settle)
+    with db.engine.connect() as conn:
+        after = _watermark(conn)
+
+    folded = 0
+    try:
+        while True:
+            after, read = _fold(after, horizon, batch_size)
+            folded += read
+            if read < batch_size:
+                break
+    except RefreshConflict:
+        logger.info('Another refresh is folding in member changes; leaving it to that one')
+
+    today = date.today()
+    has_snapshot = db.session.query(ReportDistribution.day).filter(
+        ReportDistribution.day == today
+    ).limit(1).scalar() is not None
+    db.session.rollback()
+    if folded or not has_snapshot:
+        snapshot(today)
+        cache.bump('reports')
+    cache.set('reports:refreshed', datetime.utcnow().isoformat(), ttl=7 * 86400)
+    return folded
+
+
+def rebuild():
+    """Drop the rollups and fold every member in again"""
+    with db.engine.begin() as conn:
+        conn.execute(sa.delete(ReportDaily))
+        conn.execute(sa.delete(ReportMember))
+        conn.execute(sa.delete(ReportDistribution).where(ReportDistribution.day == date.today()))
+    return refresh()
+
+
+def last_refreshed():
+    """When a refresh last finished, as far as this process's cache knows"""
+    value = cache.get('reports:refreshed')
+    return datetime.fromisoformat(value) if value else None
+
+
+def ensure_fresh():
+    """Queue a refresh unless one ran within REPORTS_REFRESH_SECONDS or is already queued"""
+    refreshed = last_refreshed()
+    interval = timedelta(seconds=current_app.config.get('REPORTS_REFRESH_SECONDS', 300))
+    if refreshed is not None and datetime.utcnow() - refreshed < interval:
+        return
+    pending = db.session.query(Job.id).filter(
+        Job.name == 'reports.refresh', Job.status.in_(('queued', 'running'))
+    ).limit(1).scalar()
+    if pending is None:
+        from app import jobs
+        jobs.enqueue('reports.refresh')
+
+
+# ==================== CHART DATA ====================
+
+def _month_labels(months, today):
+    labels = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        labels.append(f'{year:04d}-{month:02d}')
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return labels[::-1]
+
+
+def growth(months=12, caregroup_id=None, today=None):
+    """Members joining, leaving and active at each month end, chart-ready
+
+    Monthly sums come from report_daily; a running SUM() window over every
+    month turns them into the active total, so months before the window
+    still count towards it.
+    """
+    # year * 100 + month: EXTRACT compiles on every dialect, strftime() is SQLite's own
+    month = sa.extract('year', ReportDaily.day) * 100 + sa.extract('month', ReportDaily.day)
+    monthly = db.session.query(
+        month.label('month'),
+        sa.func.sum(ReportDaily.joined).label('joined'),
+        sa.func.sum(ReportDaily.left).label('left'),
+    )
+    if caregroup_id is not None:
+        monthly = monthly.filter(ReportDaily.caregroup_id == caregroup_id)
+    monthly = monthly.group_by(month).subquery()
+    active = sa.func.sum(monthly.c.joined - monthly.c.left).over(order_by=monthly.c.month)
+    rows = db.session.query(monthly.c.month, monthly.c.joined, monthly.c.left, active).order_by(
+        monthly.c.month
+    ).all()
+
+    labels = _month_labels(months, today or date.today())
+    rows = [(f'{int(row[0]) // 100:04d}-{int(row[0]) % 100:02d}', *row[1:]) for row in rows]
+    by_month = {row[0]: row for row in rows}
+    running = 0
+    for row in rows:
+        if row[0] >= labels[0]:
+            break
+        running = row[3]
+    active_data, joined_data, left_data = [], [], []
+    for label in labels:
+        row = by_month.get(label)
+        if row is not None:
+            running = row[3]
+        active_data.append(running)
+        joined_data.append(row[1] if row else 0)
+        left_data.append(row[2] if row else 0)
+    return {
+        'labels': labels,
+        'datasets': [
+            {'label': 'Active members', 'data': active_data},
+            {'label': 'Joined', 'data': joined_data},
+            {'label': 'Left', 'data': left_data},
+        ],
+    }
+
+
+def retention(months=12, today=None):
+    """Share of each care group's members at the window start still there at its end
+
+    Retention is (start - left) / start, with everyone who moved to
+    another group or went inactive counted as having left.
+    """
+    labels = _month_labels(months, today or date.today())
+    since = date.fromisoformat(labels[0] + '-01')
+    before = ReportDaily.day < since
+    rows = db.session.query(
+        ReportDaily.caregroup_id,
+        sa.func.sum(sa.case((before, ReportDaily.joined - ReportDaily.left), else_=0)),
+        sa.func.sum(sa.case((before, 0), else_=ReportDaily.joined)),
+        sa.func.sum(sa.case((before, 0), else_=ReportDaily.left)),
+    ).group_by(ReportDaily.caregroup_id).all()
+    groups = {id_: (name, color) for id_, name, color in
+              db.session.query(CareGroup.id, CareGroup.name, CareGroup.color)}
+
+    result = []
+    for caregroup_id, start, joined, left in rows:
+        if not (start or joined or left):
+            continue
+        name, color = groups.get(caregroup_id, ('Unassigned', None))
+        result.append({
+            'caregroup_id': caregroup_id or None,
+            'name': name,
+            'color': color,
+            'start': start,
+            'joined': joined,
+            'left': left,
+            'end': start + joined - left,
+            'retention': round(max(0, start - left) * 100 / start, 1) if start else None,
+        })
+    result.sort(key=lambda row: (row['caregroup_id'] is None, row['name']))
+    return {
+        'since': since.isoformat(),
+        'labels': [row['name'] for row in result],
+        'datasets': [{'label': 'Retention %', 'data': [row['retention'] for row in result]}],
+        'rows': result,
+    }
+
+
+def distribution(ministry_id=None):
+    """Active members by age band and gender in each ministry, from the latest snapshot
+
+    A SUM() window partitioned by ministry gives each cell its share of
+    the ministry. Pass ministry_id to get one ministry (0 for members
+    without one).
+    """
+    day = db.session.query(sa.func.max(ReportDistribution.day)).scalar()
+    if day is None:
+        return {'day': None, 'labels': [], 'ministries': []}
+    total = sa.func.sum(ReportDistribution.members).over(partition_by=ReportDistribution.ministry_id)
+    query = db.session.query(
+        ReportDistribution.ministry_id, ReportDistribution.gender, ReportDistribution.age_band,
+        ReportDistribution.members, total,
+    ).filter(ReportDistribution.day == day)
+    if ministry_id is not None:
+        query = query.filter(ReportDistribution.ministry_id == ministry_id)
+    names = dict(db.session.query(Ministry.id, Ministry.name))
+
+    labels = [label for _, label in AGE_BANDS] + [UNKNOWN_AGE]
+    position = {label: index for index, label in enumerate(labels)}
+    ministries = {}
+    for ministry, gender, band, members, ministry_total in query.all():
+        entry = ministries.setdefault(ministry, {
+            'id': ministry or None,
+            'name': names.get(ministry, 'No ministry'),
+            'total': ministry_total,
+            'datasets': {},
+        })
+        dataset = entry['datasets'].setdefault(gender, {
+            'label': gender or 'Not recorded',
+            'data': [0] * len(labels),
+            'share': [0.0] * len(labels),
+        })
+        dataset['data'][position[band]] = members
+        dataset['share'][position[band]] = round(members * 100 / ministry_total, 1)
+
+    result = sorted(ministries.values(), key=lambda entry: (entry['id'] is None, entry['name']))
+    for entry in result:
+        # Recorded genders alphabetically, then 'Not recorded'
+        entry['datasets'] = [entry['datasets'][gender]
+                             for gender in sorted(entry['datasets'], key=lambda g: (not g, g))]
+    return {'day': day.isoformat(), 'labels': labels, 'ministries': result}
+
+
+def chart(name, **params):
+    """One report's chart data, cached until the next refresh"""
+    builders = {'growth': growth, 'retention': retention, 'distribution': distribution}
+    key = f'reports:{name}:{sorted(params.items())}:{date.today().isoformat()}:' + cache.stamp(
+        'reports', 'caregroups', 'ministries'
+    )
+    return cache.get_or_set(key, lambda: builders[name](**params),
+                            ttl=current_app.config.get('REPORTS_CACHE_TTL', 3600))
+
+
+# ==================== CLI ====================
+
+@reports_cli.command('refresh')
+@click.option('--rebuild', 'from_scratch', is_flag=True, help='Drop the rollups and fold every member in again.')
+def refresh_command(from_scratch):
+    """Fold member changes into the report rollups."""
+    folded = rebuild() if from_scratch else refresh()
+    click.echo(f'Folded in {folded} member change(s).')
@@ -1,13 +1,24 @@
 """
 Church Information System - Routes (Blueprints)
 """
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import (Blueprint, render_template, redirect, url_for, request, flash, jsonify,
+                   current_app, Response, stream_with_context, send_from_directory, abort)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
-from app import db
-from app.models import User, Member, CareGroup, Ministry, Setting
+from app import db, cache
+from app.models import User, Member, CareGroup, Ministry, Job
+from app import queries, export, counters, jobs, attendance, reports, sync
+from app.pagination import keyset_paginate
+from app.settings_store import settings
+from app.validators import parse_date, parse_age, parse_page_size, MAX_PAGE_SIZE
+from app.importer import detect_format
+from app.instrumentation import metrics
+from app.database import use_replica, use_primary
+from sqlalchemy.orm import joinedload
 from functools import wraps
-from datetime import datetime
+from datetime import date, datetime
+import hmac
+import io
 
 # Create blueprints
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -16,6 +27,8 @@ members_bp = Blueprint('members', __name__, url_prefix='/members')
 caregroups_bp = Blueprint('caregroups', __name__, url_prefix='/caregroups')
 settings_bp = Blueprint('settings', __name__, url_prefix='/settings')
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+attendance_bp = Blueprint('attendance', __name__, url_prefix='/attendance')
+reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
 
 # ==================== DECORATORS ====================
 
@@ -61,6 +74,14 @@ def login():
                 flash('Your account has been disabled.', 'error')
                 return redirect(url_for('auth.login'))
             
+            # Upgrade the stored hash when PASSWORD_HASH_METHOD has changed
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+            
             login_user(user, remember=request.form.get('remember'))
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main.dashboard'))
@@ -87,34 +108,16 @@ def index():
     return redirect(url_for('auth.login'))
 
 @main_bp.route('/dashboard')
+@use_replica
 @login_required
 def dashboard():
     """Main dashboard"""
-    total_members = Member.query.filter_by(status='active').count()
-    total_caregroups = CareGroup.query.filter_by(status='active').count()
-    
-    # Get member count by ministry
-    ministry_stats = db.session.query(
-        Ministry.name,
-        db.func.count(Member.id).label('count')
-    ).outerjoin(Member).filter(
-        Member.status == 'active'
-    ).group_by(Ministry.id).all()
-    
-    # Get recent members
-    recent_members = Member.query.filter_by(status='active').order_by(
-        Member.created_at.desc()
-    ).limit(5).all()
-    
-    # Get care groups
-    caregroups = CareGroup.query.filter_by(status='active').all()
+    # The date is part of the key: birthdays and ages change at midnight
+    key = f'dashboard:{date.today().isoformat()}:' + cache.stamp('members', 'caregroups', 'ministries', 'users')
+    stats = cache.get_or_set(key, queries.dashboard_stats,
+                             ttl=current_app.config.get('DASHBOARD_CACHE_TTL', 60))
     
-    return render_template('main/dashboard.html',
-                         total_members=total_members,
-                         total_caregroups=total_caregroups,
-                         ministry_stats=ministry_stats,
-                         recent_members=recent_members,
-                         caregroups=caregroups)
+    return render_template('main/dashboard.html', **stats)
 
 @main_bp.route('/about')
 def about():
@@ -129,49 +132,173 @@ def about():
 # ==================== MEMBER ROUTES ====================
 
 @members_bp.route('/')
+@use_replica
 @login_required
 def list_members():
     """List all members with search and filter"""
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    ministry_id = request.args.get('ministry', type=int)
-    caregroup_id = request.args.get('caregroup', type=int)
-    status = request.args.get('status', 'active')
+    cursor = request.args.get('cursor')
+    filters = queries.member_filters(request.args)
+    query, rank = queries.filtered_members(current_user, filters)
     
-    query = Member.query
-    
-    # Apply filters
-    if status:
-        query = query.filter_by(status=status)
-    
-    if current_user.is_leader() and not current_user.is_admin():
-        # Leaders can only see their care group members
-        query = query.filter_by(caregroup_id=current_user.caregroup_id)
+    order_by = [Member.fullname, Member.id]
+    if rank is not None:
+        order_by.insert(0, rank)
     
-    if search:
-        query = query.filter(Member.fullname.ilike(f'%{search}%'))
-    
-    if ministry_id:
-        query = query.filter_by(ministry_id=ministry_id)
-    
-    if caregroup_id:
-        query = query.filter_by(caregroup_id=caregroup_id)
-    
-    paginated = query.paginate(page=page, per_page=10)
+    paginated = keyset_paginate(queries.with_member_relations(query), order_by, cursor=cursor)
     members = paginated.items
     
-    ministries = Ministry.query.filter_by(status='active').all()
-    caregroups = CareGroup.query.filter_by(status='active').all()
+    ministries = queries.active_ministries()
+    caregroups = queries.active_caregroups()
     
     return render_template('members/list.html',
                          members=members,
                          paginated=paginated,
                          ministries=ministries,
                          caregroups=caregroups,
-                         search=search,
-                         selected_ministry=ministry_id,
-                         selected_caregroup=caregroup_id,
-                         selected_status=status)
+                         search=filters['search'],
+                         selected_ministry=filters['ministry_id'],
+                         selected_caregroup=filters['caregroup_id'],
+                         selected_status=filters['status'])
+
+@members_bp.route('/export')
+@use_replica
+@login_required
+def export_members():
+    """Stream the filtered member directory as CSV or JSONL"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in export.EXPORT_FORMATS:
+        flash('Unsupported export format.', 'error')
+        return redirect(url_for('members.list_members'))
+    
+    query, _ = queries.filtered_members(current_user, queries.member_filters(request.args))
+    rows = export.export_rows(query)
+    if export_format == 'csv':
+        body = export.stream_csv(rows)
+    else:
+        body = export.stream_jsonl(rows)
+    
+    mimetype, extension = export.EXPORT_FORMATS[export_format]
+    filename = f'members-{datetime.utcnow():%Y%m%d}.{extension}'
+    return Response(stream_with_context(body),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+BULK_ACTIONS = ('assign_caregroup', 'assign_ministry', 'deactivate')
+MAX_BULK_IDS = 5000
+
+@members_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_update_members():
+    """Apply one change to many members with a single UPDATE"""
+    data = request.get_json(silent=True) if request.is_json else request.form
+    data = data or {}
+    
+    def respond(message, category, affected=0, status=200):
+        if request.is_json:
+            return jsonify({'success': category == 'success',
+                            'message': message,
+                            'affected': affected}), status
+        flash(message, category)
+        return redirect(request.referrer or url_for('members.list_members'))
+    
+    if request.is_json and not isinstance(data, dict):
+        return respond('Expected a JSON object.', 'error', status=400)
+    action = data.get('action')
+    if action not in BULK_ACTIONS:
+        return respond('Please choose a bulk action.', 'error', status=400)
+    
+    # Same permission rules as edit_member and deactivate_member
+    if action == 'deactivate' and not current_user.is_admin():
+        return respond('Only admins can deactivate members.', 'error', status=403)
+    if not (current_user.is_admin() or current_user.is_leader() or current_user.role == 'viewer'):
+        return respond('You do not have permission to edit members.', 'error', status=403)
+    
+    values = {'updated_at': datetime.utcnow()}
+    if action == 'deactivate':
+        values['status'] = 'inactive'
+    else:
+        model, column = ((CareGroup, 'caregroup_id') if action == 'assign_caregroup'
+                         else (Ministry, 'ministry_id'))
+        try:
+            target_id = int(data.get('target_id') or 0) or None
+        except (TypeError, ValueError):
+            return respond('Invalid target.', 'error', status=400)
+        if target_id and not model.query.filter_by(id=target_id, status='active').first():
+            return respond('The selected target does not exist.', 'error', status=400)
+        values[column] = target_id
+    
+    if data.get('scope') == 'filter':
+        # Every member matching the list filters sent with the request
+        targets, _ = queries.filtered_members(current_user, queries.member_filters(data))
+    else:
+        if hasattr(data, 'getlist'):
+            try:
+                member_ids = {int(i) for i in data.getlist('member_ids')}
+            except (TypeError, ValueError):
+                return respond('Invalid member selection.', 'error', status=400)
+        else:
+            # A JSON string would otherwise be read one character at a time
+            raw_ids = data.get('member_ids', [])
+            if not isinstance(raw_ids, list) or not all(
+                    isinstance(i, int) and not isinstance(i, bool) for i in raw_ids):
+                return respond('member_ids must be a list of integers.', 'error', status=400)
+            member_ids = set(raw_ids)
+        if not member_ids:
+            return respond('No members selected.', 'error', status=400)
+        if len(member_ids) > MAX_BULK_IDS:
+            return respond(f'Select at most {MAX_BULK_IDS} members, or apply to all matching.',
+                           'error', status=400)
+        targets = queries.scoped_members(current_user).filter(Member.id.in_(member_ids))
+    
+    target_ids = targets.with_entities(Member.id).order_by(None).subquery()
+    try:
+        # Counted up front: with a search the subquery holds a CTE, and
+        # sqlite3 reports -1 as the rowcount of an UPDATE that contains one
+        affected = db.session.scalar(db.select(db.func.count()).select_from(target_ids))
+        # The UPDATE skips the ORM flush, so the counters move alongside it
+        deltas = counters.bulk_deltas(db.select(target_ids.c.id), values)
+        if 'caregroup_id' in values:
+            sync.record_bulk_moves(db.select(target_ids.c.id), values['caregroup_id'])
+        Member.query.filter(
+            Member.id.in_(db.select(target_ids.c.id))
+        ).update(values, synchronize_session=False)
+        deltas.apply(db.session)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return respond(f'Error updating members: {str(e)}', 'error', status=500)
+    
+    return respond(f'{affected} member{"s" if affected != 1 else ""} updated.', 'success', affected)
+
+@members_bp.route('/import', methods=['GET', 'POST'])
+@admin_required
+def import_members_upload():
+    """Bulk import members from an uploaded CSV or JSONL file in the background"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import.', 'error')
+            return redirect(url_for('members.import_members_upload'))
+        
+        try:
+            path = jobs.stage_upload(upload)
+            job = jobs.enqueue('members.import', {
+                'path': path,
+                'import_format': detect_format(upload.filename),
+                'dry_run': bool(request.form.get('dry_run')),
+            }, user_id=current_user.id)
+            return redirect(url_for('members.import_members_upload', job=job.id))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error importing members: {str(e)}', 'error')
+            return redirect(url_for('members.import_members_upload'))
+    
+    job = None
+    job_id = request.args.get('job', type=int)
+    if job_id:
+        job = Job.query.filter_by(id=job_id, name='members.import').first()
+    return render_template('members/import.html',
+                         job=jobs.job_status(job) if job else None)
 
 @members_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -193,17 +320,17 @@ def add_member():
                 status='active'
             )
             
-            date_of_birth_str = request.form.get('date_of_birth')
-            if date_of_birth_str:
-                member.date_of_birth = datetime.strptime(date_of_birth_str, '%Y-%m-%d').date()
+            date_of_birth = parse_date(request.form.get('date_of_birth'))
+            if date_of_birth:
+                member.date_of_birth = date_of_birth
             
-            age_str = request.form.get('age')
-            if age_str:
-                member.age = int(age_str)
+            age = parse_age(request.form.get('age'))
+            if age is not None:
+                member.age = age
             
-            baptism_date_str = request.form.get('baptism_date')
-            if baptism_date_str:
-                member.baptism_date = datetime.strptime(baptism_date_str, '%Y-%m-%d').date()
+            baptism_date = parse_date(request.form.get('baptism_date'))
+            if baptism_date:
+                member.baptism_date = baptism_date
             
             db.session.add(member)
             db.session.commit()
@@ -244,17 +371,17 @@ def edit_member(member_id):
             member.ministry_id = request.form.get('ministry_id', type=int)
             member.caregroup_id = request.form.get('caregroup_id', type=int)
             
-            date_of_birth_str = request.form.get('date_of_birth')
-            if date_of_birth_str:
-                member.date_of_birth = datetime.strptime(date_of_birth_str, '%Y-%m-%d').date()
+            date_of_birth = parse_date(request.form.get('date_of_birth'))
+            if date_of_birth:
+                member.date_of_birth = date_of_birth
             
-            age_str = request.form.get('age')
-            if age_str:
-                member.age = int(age_str)
+            age = parse_age(request.form.get('age'))
+            if age is not None:
+                member.age = age
             
-            baptism_date_str = request.form.get('baptism_date')
-            if baptism_date_str:
-                member.baptism_date = datetime.strptime(baptism_date_str, '%Y-%m-%d').date()
+            baptism_date = parse_date(request.form.get('baptism_date'))
+            if baptism_date:
+                member.baptism_date = baptism_date
             
             member.updated_at = datetime.utcnow()
             db.session.commit()
@@ -273,6 +400,7 @@ def edit_member(member_id):
                          caregroups=caregroups)
 
 @members_bp.route('/<int:member_id>')
+@use_replica
 @login_required
 def view_member(member_id):
     """View member details"""
@@ -310,17 +438,21 @@ def deactivate_member(member_id):
 # ==================== CARE GROUP ROUTES ====================
 
 @caregroups_bp.route('/')
+@use_replica
 @login_required
 def list_caregroups():
     """List all care groups"""
-    caregroups = CareGroup.query.filter_by(status='active').all()
-    return render_template('caregroups/list.html', caregroups=caregroups)
+    # Called from inside the cached fragment, so a cache hit skips the query
+    return render_template('caregroups/list.html', load_caregroups=queries.active_caregroups)
 
 @caregroups_bp.route('/<int:caregroup_id>')
+@use_replica
 @login_required
 def view_caregroup(caregroup_id):
     """View care group details and members"""
-    caregroup = CareGroup.query.get_or_404(caregroup_id)
+    caregroup = CareGroup.query.options(
+        joinedload(CareGroup.leader)
+    ).get_or_404(caregroup_id)
     
     # Check permissions
     if current_user.is_leader() and not current_user.is_admin():
@@ -328,12 +460,23 @@ def view_caregroup(caregroup_id):
             flash('You can only view your assigned care group.', 'error')
             return redirect(url_for('caregroups.list_caregroups'))
     
-    page = request.args.get('page', 1, type=int)
-    members = caregroup.members
+    status = request.args.get('status', 'active')
+    if status not in queries.ROSTER_STATUSES:
+        status = ''
+    
+    # Active members are already counted on the care group
+    roster = queries.caregroup_roster(caregroup, status)
+    paginated = keyset_paginate(roster, [Member.fullname, Member.id],
+                                cursor=request.args.get('cursor'),
+                                with_total=status != 'active')
+    if status == 'active':
+        paginated.total = caregroup.member_count
     
     return render_template('caregroups/view.html',
                          caregroup=caregroup,
-                         members=members)
+                         members=paginated.items,
+                         paginated=paginated,
+                         selected_status=status)
 
 @caregroups_bp.route('/add', methods=['GET', 'POST'])
 @admin_required
@@ -349,6 +492,8 @@ def add_caregroup():
             
             leader_id = request.form.get('leader_id', type=int)
             if leader_id:
+                if queries.eligible_leader(leader_id) is None:
+                    raise ValueError('the leader must be an active user who is not an admin')
                 caregroup.leader_id = leader_id
             
             db.session.add(caregroup)
@@ -359,8 +504,8 @@ def add_caregroup():
             db.session.rollback()
             flash(f'Error adding care group: {str(e)}', 'error')
     
-    leaders = User.query.filter(User.role != 'admin', User.status == 'active').all()
-    return render_template('caregroups/add.html', leaders=leaders)
+    # Leaders are picked with the typeahead (/api/v1/typeahead?kind=leaders)
+    return render_template('caregroups/add.html')
 
 @caregroups_bp.route('/<int:caregroup_id>/edit', methods=['GET', 'POST'])
 @admin_required
@@ -374,6 +519,8 @@ def edit_caregroup(caregroup_id):
             caregroup.color = request.form.get('color', '#000000')
             
             leader_id = request.form.get('leader_id', type=int)
+            if leader_id and leader_id != caregroup.leader_id and queries.eligible_leader(leader_id) is None:
+                raise ValueError('the leader must be an active user who is not an admin')
             caregroup.leader_id = leader_id if leader_id else None
             
             caregroup.updated_at = datetime.utcnow()
@@ -384,10 +531,59 @@ def edit_caregroup(caregroup_id):
             db.session.rollback()
             flash(f'Error updating care group: {str(e)}', 'error')
     
-    leaders = User.query.filter(User.role != 'admin', User.status == 'active').all()
-    return render_template('caregroups/edit.html',
-                         caregroup=caregroup,
-                         leaders=leaders)
+    return render_template('caregroups/edit.html', caregroup=caregroup)
+
+# ==================== ATTENDANCE ROUTES ====================
+
+@attendance_bp.route('/')
+@login_required
+def checkin():
+    """Check-in station: a care group's roster plus the live headcount"""
+    try:
+        key = attendance.service_key(request.args.get('service_date') or None,
+                                     request.args.get('service'))
+    except ValueError:
+        flash('Unknown service or date.', 'error')
+        return redirect(url_for('attendance.checkin'))
+    
+    caregroups = queries.active_caregroups()
+    if current_user.is_leader() and not current_user.is_admin():
+        caregroup_id = current_user.caregroup_id
+    else:
+        caregroup_id = request.args.get('caregroup', type=int)
+    
+    roster = []
+    if caregroup_id:
+        roster = queries.scoped_members(current_user, status='active', caregroup_id=caregroup_id).with_entities(
+            Member.id, Member.fullname
+        ).order_by(Member.fullname, Member.id).all()
+    
+    return render_template('attendance/checkin.html',
+                         service_date=key[0],
+                         service=key[1],
+                         services=current_app.config.get('ATTENDANCE_SERVICES', ('sunday',)),
+                         caregroups=caregroups,
+                         selected_caregroup=caregroup_id,
+                         roster=roster,
+                         checked_in=attendance.get_buffer().checked_in(key),
+                         headcount=attendance.headcounts(key))
+
+# ==================== REPORT ROUTES ====================
+
+@reports_bp.route('/')
+@use_primary
+@admin_required
+def overview():
+    """Membership trends: growth, retention by care group, age and gender by ministry"""
+    months = min(max(request.args.get('months', current_app.config.get('REPORTS_MONTHS', 12), type=int), 1), 120)
+    # Charts load from the API; the page only makes sure a refresh is coming
+    reports.ensure_fresh()
+    
+    return render_template('reports/overview.html',
+                         months=months,
+                         caregroups=CareGroup.query.order_by(CareGroup.name).all(),
+                         retention=reports.chart('retention', months=months),
+                         refreshed=reports.last_refreshed())
 
 # ==================== SETTINGS ROUTES ====================
 
@@ -444,37 +640,21 @@ def church_settings():
     """Church settings"""
     if request.method == 'POST':
         try:
-            church_name = Setting.query.filter_by(setting_name='church_name').first()
-            if not church_name:
-                church_name = Setting(setting_name='church_name')
-            church_name.setting_value = request.form.get('church_name', '')
-            
-            church_address = Setting.query.filter_by(setting_name='church_address').first()
-            if not church_address:
-                church_address = Setting(setting_name='church_address')
-            church_address.setting_value = request.form.get('church_address', '')
-            
-            church_contact = Setting.query.filter_by(setting_name='church_contact').first()
-            if not church_contact:
-                church_contact = Setting(setting_name='church_contact')
-            church_contact.setting_value = request.form.get('church_contact', '')
-            
-            db.session.add_all([church_name, church_address, church_contact])
-            db.session.commit()
+            settings.update({
+                'church_name': request.form.get('church_name', ''),
+                'church_address': request.form.get('church_address', ''),
+                'church_contact': request.form.get('church_contact', ''),
+            })
             flash('Church settings updated successfully!', 'success')
             return redirect(url_for('settings.church_settings'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating church settings: {str(e)}', 'error')
     
-    church_name = Setting.query.filter_by(setting_name='church_name').first()
-    church_address = Setting.query.filter_by(setting_name='church_address').first()
-    church_contact = Setting.query.filter_by(setting_name='church_contact').first()
-    
     return render_template('settings/church.html',
-                         church_name=church_name.setting_value if church_name else '',
-                         church_address=church_address.setting_value if church_address else '',
-                         church_contact=church_contact.setting_value if church_contact else '')
+                         church_name=settings.church_name,
+                         church_address=settings.church_address,
+                         church_contact=settings.church_contact)
 
 # ==================== ADMIN ROUTES ====================
 
@@ -482,8 +662,10 @@ def church_settings():
 @admin_required
 def manage_users():
     """Manage users"""
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(page=page, per_page=10)
+    cursor = request.args.get('cursor')
+    users = keyset_paginate(User.query.options(joinedload(User.caregroup)),
+                            [User.created_at, User.id],
+                            cursor=cursor)
     
     return render_template('admin/users.html', users=users)
 
@@ -549,6 +731,7 @@ def edit_user(user_id):
                          caregroups=caregroups)
 
 @admin_bp.route('/ministries')
+@use_replica
 @admin_required
 def manage_ministries():
     """Manage ministries"""
@@ -605,6 +788,7 @@ def delete_ministry(ministry_id):
     
     try:
         ministry.status = 'inactive'
+        ministry.updated_at = datetime.utcnow()
         db.session.commit()
         flash(f'Ministry {ministry.name} deleted successfully!', 'success')
     except Exception as e:
@@ -617,33 +801,143 @@ def delete_ministry(ministry_id):
 @admin_required
 def system_settings():
     """System settings"""
-    default_theme = Setting.query.filter_by(setting_name='default_theme').first()
-    items_per_page = Setting.query.filter_by(setting_name='items_per_page').first()
-    
     return render_template('admin/system_settings.html',
-                         default_theme=default_theme.setting_value if default_theme else 'light',
-                         items_per_page=items_per_page.setting_value if items_per_page else '10')
+                         default_theme=settings.default_theme,
+                         items_per_page=settings.items_per_page,
+                         enable_baptism_field=settings.enable_baptism_field)
 
 @admin_bp.route('/system/update', methods=['POST'])
 @admin_required
 def update_system_settings():
     """Update system settings"""
     try:
-        default_theme = Setting.query.filter_by(setting_name='default_theme').first()
-        if not default_theme:
-            default_theme = Setting(setting_name='default_theme')
-        default_theme.setting_value = request.form.get('default_theme', 'light')
-        
-        items_per_page = Setting.query.filter_by(setting_name='items_per_page').first()
-        if not items_per_page:
-            items_per_page = Setting(setting_name='items_per_page')
-        items_per_page.setting_value = request.form.get('items_per_page', '10')
-        
-        db.session.add_all([default_theme, items_per_page])
-        db.session.commit()
+        items_per_page = parse_page_size(request.form.get('items_per_page', '10'))
+    except ValueError:
+        flash(f'Items per page must be a whole number from 1 to {MAX_PAGE_SIZE}.', 'error')
+        return redirect(url_for('admin.system_settings'))
+    
+    try:
+        settings.update({
+            'default_theme': request.form.get('default_theme', 'light'),
+            'items_per_page': str(items_per_page),
+            'enable_baptism_field': 'true' if request.form.get('enable_baptism_field') else 'false',
+        })
         flash('System settings updated successfully!', 'success')
         return redirect(url_for('admin.system_settings'))
     except Exception as e:
         db.session.rollback()
         flash(f'Error updating system settings: {str(e)}', 'error')
         return redirect(url_for('admin.system_settings'))
+
+@admin_bp.route('/metrics')
+@admin_required
+def view_metrics():
+    """Per-endpoint request and SQL metrics for this worker"""
+    return render_template('admin/metrics.html',
+                         endpoints=metrics.snapshot(),
+                         fragments=metrics.fragment_snapshot(),
+                         slow_queries=metrics.slow_queries,
+                         slow_query_threshold=current_app.config['SLOW_QUERY_THRESHOLD'],
+                         started=datetime.fromtimestamp(metrics.started))
+
+@admin_bp.route('/metrics.prom')
+def prometheus_metrics():
+    """Metrics in Prometheus text format for admins or a token-holding scraper"""
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    scraper = bool(token) and hmac.compare_digest(supplied, token)
+    if not scraper and not (current_user.is_authenticated and current_user.is_admin()):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/metrics/reset', methods=['POST'])
+@admin_required
+def reset_metrics():
+    """Clear collected metrics"""
+    metrics.reset()
+    flash('Metrics reset.', 'success')
+    return redirect(url_for('admin.view_metrics'))
+
+@admin_bp.route('/jobs')
+@admin_required
+def list_jobs():
+    """Recent background jobs"""
+    recent = Job.query.options(joinedload(Job.user)).order_by(Job.id.desc()).limit(50).all()
+    return render_template('admin/jobs.html', jobs=recent, export_formats=export.EXPORT_FORMATS)
+
+@admin_bp.route('/jobs/start', methods=['POST'])
+@admin_required
+def start_job():
+    """Queue one of the admin background tasks"""
+    name = request.form.get('task')
+    if name == 'members.export':
+        export_format = request.form.get('format', 'csv')
+        if export_format not in export.EXPORT_FORMATS:
+            flash('Unsupported export format.', 'error')
+            return redirect(url_for('admin.list_jobs'))
+        params = {'user_id': current_user.id, 'export_format': export_format,
+                  'filters': {'status': request.form.get('status', 'active')}}
+    elif name == 'members.reconcile_counts':
+        params = {}
+    elif name == 'reports.refresh':
+        params = {'rebuild': request.form.get('rebuild') == '1'}
+    else:
+        flash('Unknown job.', 'error')
+        return redirect(url_for('admin.list_jobs'))
+    
+    try:
+        job = jobs.enqueue(name, params, user_id=current_user.id)
+        flash(f'Job #{job.id} queued.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error queueing job: {str(e)}', 'error')
+    return redirect(url_for('admin.list_jobs'))
+
+@admin_bp.route('/jobs/<int:job_id>/status')
+@use_primary
+@admin_required
+def job_status(job_id):
+    """Job state as JSON, for progress polling"""
+    job = Job.query.get_or_404(job_id)
+    return jsonify(jobs.job_status(job))
+
+@admin_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_job(job_id):
+    """Cancel a queued job or ask a running one to stop"""
+    try:
+        if jobs.cancel(job_id):
+            db.session.commit()
+            flash(f'Cancellation requested for job #{job_id}.', 'success')
+        else:
+            flash('That job has already finished.', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error cancelling job: {str(e)}', 'error')
+    return redirect(request.referrer or url_for('admin.list_jobs'))
+
+@admin_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@admin_required
+def retry_job(job_id):
+    """Queue a failed or cancelled job again"""
+    try:
+        if jobs.retry(job_id):
+            db.session.commit()
+            flash(f'Job #{job_id} queued again.', 'success')
+        else:
+            flash('Only failed or cancelled jobs can be retried.', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error retrying job: {str(e)}', 'error')
+    return redirect(request.referrer or url_for('admin.list_jobs'))
+
+@admin_bp.route('/jobs/<int:job_id>/download')
+@admin_required
+def download_job_file(job_id):
+    """Download the file a finished job produced"""
+    job = Job.query.get_or_404(job_id)
+    result = jobs.job_status(job)['result'] or {}
+    if job.status != 'succeeded' or not result.get('file'):
+        abort(404)
+    return send_from_directory(jobs.job_folder(job.id, create=False), result['file'],
+                               mimetype=result.get('mimetype'), as_attachment=True)
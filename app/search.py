@@ -0,0 +1,112 @@
+"""
+Church Information System - Member Full-Text Search
+"""
+import re
+import sqlite3
+import sqlalchemy as sa
+from app import db
+from app.models import Member
+
+# External-content FTS5 index over the searchable member columns. The
+# triggers keep it in step with every write to members, including bulk
+# statements that bypass the ORM.
+SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS members_fts USING fts5(
+        fullname, address, contact,
+        content='members', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS members_fts_ai AFTER INSERT ON members BEGIN
+        INSERT INTO members_fts(rowid, fullname, address, contact)
+        VALUES (new.id, new.fullname, new.address, new.contact);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS members_fts_ad AFTER DELETE ON members BEGIN
+        INSERT INTO members_fts(members_fts, rowid, fullname, address, contact)
+        VALUES ('delete', old.id, old.fullname, old.address, old.contact);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS members_fts_au AFTER UPDATE OF fullname, address, contact ON members BEGIN
+        INSERT INTO members_fts(members_fts, rowid, fullname, address, contact)
+        VALUES ('delete', old.id, old.fullname, old.address, old.contact);
+        INSERT INTO members_fts(rowid, fullname, address, contact)
+        VALUES (new.id, new.fullname, new.address, new.contact);
+    END
+    """,
+]
+
+# Column weights for bm25(): a name hit outranks an address or contact hit
+RANK_WEIGHTS = (10.0, 2.0, 1.0)
+
+# AS MATERIALIZED is a syntax error before SQLite 3.35
+MATERIALIZED_CTE = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_fts_table = sa.table('members_fts', sa.column('rowid'))
+_fts_column = sa.literal_column('members_fts')
+
+
+def fts_enabled():
+    """Full-text search is available on SQLite only"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_index():
+    """Create the FTS table and triggers, backfilling a new index"""
+    if not fts_enabled():
+        return
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(sa.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'members_fts'"
+        )).first()
+        for statement in SEARCH_DDL:
+            conn.execute(sa.text(statement))
+        if not exists:
+            conn.execute(sa.text("INSERT INTO members_fts(members_fts) VALUES ('rebuild')"))
+
+
+def build_match(term):
+    """Turn free text into an FTS5 prefix query, e.g. 'jo sm' -> '"jo"* "sm"*'"""
+    tokens = re.findall(r'\w+', term or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def apply_search(query, term):
+    """Restrict a Member query to search matches
+
+    Returns the filtered query and a rank expression to order by (lower
+    is better), or None when no ranking is available.
+    """
+    if not fts_enabled():
+        pattern = f'%{term}%'
+        return query.filter(db.or_(
+            Member.fullname.ilike(pattern),
+            Member.address.ilike(pattern),
+            Member.contact.ilike(pattern)
+        )), None
+
+    match = build_match(term)
+    if match is None:
+        return query, None
+
+    # Materialized so the MATCH runs once. Left inlined, SQLite without
+    # table statistics may drive the join from members and re-run the
+    # MATCH per row, which turns a COUNT over 100k members into seconds.
+    # Older SQLite gets the plain CTE: slower on big counts, same results.
+    matches = sa.select(
+        _fts_table.c.rowid.label('member_id'),
+        sa.func.bm25(_fts_column, *RANK_WEIGHTS).label('rank')
+    ).select_from(_fts_table).where(
+        _fts_column.op('MATCH')(match)
+    ).cte('member_matches')
+    if MATERIALIZED_CTE:
+        matches = matches.prefix_with('MATERIALIZED')
+
+    return query.join(matches, Member.id == matches.c.member_id), matches.c.rank
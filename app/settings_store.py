@@ -0,0 +1,138 @@
+"""
+Church Information System - Settings Store
+"""
+import threading
+from datetime import datetime
+from flask import g, has_app_context
+from app import db, cache
+from app.models import Setting
+from config import Config
+
+# Default value (as stored) for every known setting
+DEFAULTS = {
+    'church_name': 'Mountain Brook Church',
+    'church_address': '',
+    'church_contact': '',
+    'default_theme': 'light',
+    'items_per_page': str(Config.ITEMS_PER_PAGE),
+    'enable_baptism_field': 'true',
+}
+
+
+def _to_int(value, default):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return int(default)
+
+
+def _to_bool(value, default):
+    if value is None:
+        value = default
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class SettingsStore:
+    """All Setting rows loaded in one query and kept per process
+
+    Every commit that writes the settings table bumps its version in the
+    shared cache, so other workers reload on their next request.
+    """
+
+    def __init__(self):
+        self._values = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        version = cache.stamp('settings')
+        if self._values is None or version != self._version:
+            rows = db.session.query(Setting.setting_name, Setting.setting_value).all()
+            with self._lock:
+                self._values = dict(DEFAULTS, **{name: value for name, value in rows})
+                self._version = version
+        return self._values
+
+    def all(self):
+        """Raw string values, checked for changes at most once per request"""
+        if not has_app_context():
+            return dict(DEFAULTS)
+        if '_settings' not in g:
+            g._settings = self._load()
+        return g._settings
+
+    def get(self, name, default=None):
+        return self.all().get(name, default)
+
+    def get_int(self, name):
+        return _to_int(self.get(name), DEFAULTS.get(name, 0))
+
+    def get_bool(self, name):
+        return _to_bool(self.get(name), DEFAULTS.get(name))
+
+    @property
+    def church_name(self):
+        return self.get('church_name', '')
+
+    @property
+    def church_address(self):
+        return self.get('church_address', '')
+
+    @property
+    def church_contact(self):
+        return self.get('church_contact', '')
+
+    @property
+    def default_theme(self):
+        return self.get('default_theme', 'light')
+
+    @property
+    def items_per_page(self):
+        return self.get_int('items_per_page')
+
+    @property
+    def enable_baptism_field(self):
+        return self.get_bool('enable_baptism_field')
+
+    def update(self, values):
+        """Write several settings in one upsert and commit"""
+        if not values:
+            return
+        now = datetime.utcnow()
+        rows = [{'setting_name': name,
+                 'setting_value': '' if value is None else str(value),
+                 'created_at': now,
+                 'updated_at': now} for name, value in values.items()]
+
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            insert = None
+
+        if insert is not None:
+            statement = insert(Setting).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Setting.setting_name],
+                set_={'setting_value': statement.excluded.setting_value,
+                      'updated_at': statement.excluded.updated_at}
+            )
+            db.session.execute(statement)
+        else:
+            existing = {s.setting_name: s for s in
+                        Setting.query.filter(Setting.setting_name.in_(list(values)))}
+            for row in rows:
+                setting = existing.get(row['setting_name'])
+                if setting is None:
+                    db.session.add(Setting(**row))
+                else:
+                    setting.setting_value = row['setting_value']
+                    setting.updated_at = now
+
+        db.session.commit()
+        g.pop('_settings', None)
+
+
+settings = SettingsStore()
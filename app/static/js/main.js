@@ -68,6 +68,11 @@ document.addEventListener('DOMContentLoaded', () => {
     new ThemeManager();
     initializeSidebar();
     initializeSearchForms();
+    initializeBulkActions();
+    initializeJobProgress();
+    initializeCheckIn();
+    initializeReports();
+    initializeTypeahead();
 });
 
 // Sidebar Toggle for Mobile
@@ -102,6 +107,342 @@ function initializeSearchForms() {
     });
 }
 
+// Bulk member actions
+function initializeBulkActions() {
+    const form = document.getElementById('bulkForm');
+    if (!form) return;
+    
+    const actionSelect = form.querySelector('.bulk-action');
+    const targets = form.querySelectorAll('.bulk-target');
+    const applySelected = form.querySelector('.bulk-apply-selected');
+    const applyAll = form.querySelector('.bulk-apply-all');
+    const count = form.querySelector('.bulk-count');
+    const selectAll = document.querySelector('.bulk-select-all');
+    const boxes = () => document.querySelectorAll('.bulk-select');
+    
+    const updateCount = () => {
+        const checked = Array.from(boxes()).filter(box => box.checked).length;
+        count.textContent = checked;
+        applySelected.disabled = checked === 0;
+    };
+    
+    // Only the target list for the chosen action is submitted
+    const updateTargets = () => {
+        targets.forEach(select => {
+            const active = select.dataset.action === actionSelect.value;
+            select.disabled = !active;
+            select.style.display = active ? '' : 'none';
+        });
+    };
+    
+    if (selectAll) {
+        selectAll.addEventListener('change', () => {
+            boxes().forEach(box => { box.checked = selectAll.checked; });
+            updateCount();
+        });
+    }
+    boxes().forEach(box => box.addEventListener('change', updateCount));
+    actionSelect.addEventListener('change', updateTargets);
+    
+    applyAll.addEventListener('click', (e) => {
+        if (!confirm('Apply this action to every member matching the current filters?')) {
+            e.preventDefault();
+        }
+    });
+    
+    updateTargets();
+    updateCount();
+}
+
+// Background job progress: poll each [data-job-status] element until its job finishes
+function initializeJobProgress() {
+    const finished = ['succeeded', 'failed', 'cancelled'];
+    document.querySelectorAll('[data-job-status]').forEach(element => {
+        if (finished.includes(element.dataset.jobState)) return;
+        
+        const poll = () => {
+            fetch(element.dataset.jobStatus, { headers: { 'Accept': 'application/json' } })
+                .then(response => response.json())
+                .then(job => {
+                    const bar = element.querySelector('.progress-bar');
+                    const message = element.querySelector('.job-message');
+                    const state = element.querySelector('.job-state');
+                    if (bar) bar.style.width = `${job.progress}%`;
+                    if (message) message.textContent = job.message || '';
+                    if (state) state.textContent = job.status;
+                    if (finished.includes(job.status)) {
+                        // The page renders the result once the job is done
+                        window.location.reload();
+                    } else {
+                        setTimeout(poll, 2000);
+                    }
+                })
+                .catch(error => console.error('Error polling job:', error));
+        };
+        setTimeout(poll, 1000);
+    });
+}
+
+// Attendance check-in: post each tap, keep the headcount live
+function initializeCheckIn() {
+    const roster = document.getElementById('checkinRoster');
+    const headcount = document.getElementById('headcount');
+    
+    const renderHeadcount = (data) => {
+        headcount.querySelector('.headcount-total').textContent = data.total;
+        const rows = headcount.querySelector('.headcount-rows');
+        rows.innerHTML = '';
+        data.caregroups.forEach(group => {
+            const row = document.createElement('tr');
+            const name = document.createElement('td');
+            const badge = document.createElement('span');
+            badge.className = 'badge badge-primary';
+            badge.textContent = group.name;
+            if (group.color) {
+                badge.style.backgroundColor = `${group.color}20`;
+                badge.style.color = group.color;
+            }
+            name.appendChild(badge);
+            const count = document.createElement('td');
+            count.style.textAlign = 'right';
+            count.innerHTML = `<strong>${group.count}</strong>`;
+            row.append(name, count);
+            rows.appendChild(row);
+        });
+    };
+    
+    if (roster) {
+        roster.querySelectorAll('.checkin-btn').forEach(button => {
+            button.addEventListener('click', () => {
+                button.disabled = true;
+                fetch(roster.dataset.checkinUrl, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        member_id: Number(button.dataset.memberId),
+                        service_date: roster.dataset.serviceDate,
+                        service: roster.dataset.service
+                    })
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) throw new Error(data.message);
+                    const status = data.results[0].status;
+                    if (status === 'not_found') throw new Error('Member not found');
+                    button.classList.replace('btn-primary', 'btn-success');
+                    button.innerHTML = '<i class="fas fa-check"></i> Checked in';
+                    if (headcount) headcount.querySelector('.headcount-total').textContent = data.total;
+                })
+                .catch(error => {
+                    console.error('Error checking in:', error);
+                    button.disabled = false;
+                });
+            });
+        });
+    }
+    
+    if (headcount) {
+        const poll = () => {
+            fetch(headcount.dataset.headcountUrl, { headers: { 'Accept': 'application/json' } })
+                .then(response => response.json())
+                .then(renderHeadcount)
+                .catch(error => console.error('Error loading headcount:', error))
+                .finally(() => setTimeout(poll, 5000));
+        };
+        setTimeout(poll, 5000);
+    }
+}
+
+// Report charts (Chart.js, loaded by the reports page)
+function initializeReports() {
+    const container = document.getElementById('reportCharts');
+    if (!container || typeof Chart === 'undefined') return;
+    
+    const charts = {};
+    const ministrySelect = container.querySelector('.report-ministry');
+    let ministries = [];
+    
+    const draw = (canvas, config) => {
+        if (charts[canvas.id]) charts[canvas.id].destroy();
+        charts[canvas.id] = new Chart(canvas, config);
+    };
+    
+    const renderers = {
+        growth: (canvas, data) => draw(canvas, {
+            type: 'bar',
+            data: {
+                labels: data.labels,
+                datasets: [
+                    { ...data.datasets[0], type: 'line', yAxisID: 'total', tension: 0.3 },
+                    data.datasets[1],
+                    { ...data.datasets[2], data: data.datasets[2].data.map(n => -n) }
+                ]
+            },
+            options: {
+                scales: {
+                    y: { title: { display: true, text: 'Joined / left' } },
+                    total: { position: 'right', grid: { drawOnChartArea: false } }
+                }
+            }
+        }),
+        retention: (canvas, data) => draw(canvas, {
+            type: 'bar',
+            data: data,
+            options: { indexAxis: 'y', scales: { x: { min: 0, max: 100 } }, plugins: { legend: { display: false } } }
+        }),
+        distribution: (canvas, data) => {
+            ministries = data.ministries;
+            if (ministrySelect && !ministrySelect.options.length) {
+                ministries.forEach((ministry, index) => {
+                    ministrySelect.add(new Option(`${ministry.name} (${ministry.total})`, index));
+                });
+            }
+            const ministry = ministries[Number(ministrySelect?.value || 0)];
+            draw(canvas, {
+                type: 'bar',
+                data: { labels: data.labels, datasets: ministry ? ministry.datasets : [] },
+                options: { scales: { x: { stacked: true }, y: { stacked: true } } }
+            });
+        }
+    };
+    
+    const load = (canvas, url) => {
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => renderers[canvas.dataset.chartType](canvas, data))
+            .catch(error => console.error('Error loading report:', error));
+    };
+    
+    container.querySelectorAll('.report-chart').forEach(canvas => load(canvas, canvas.dataset.url));
+    
+    container.querySelectorAll('.report-filter').forEach(select => {
+        select.addEventListener('change', () => {
+            const canvas = document.getElementById(select.dataset.target);
+            const url = new URL(canvas.dataset.url, window.location.origin);
+            if (select.value) url.searchParams.set(select.dataset.param, select.value);
+            load(canvas, url.toString());
+        });
+    });
+    
+    if (ministrySelect) {
+        ministrySelect.addEventListener('change', () => {
+            const canvas = document.getElementById(ministrySelect.dataset.target);
+            renderers.distribution(canvas, { labels: charts[canvas.id].data.labels, ministries });
+        });
+    }
+}
+
+// Typeahead: suggest names from /api/v1/typeahead as the user types
+function initializeTypeahead() {
+    document.querySelectorAll('[data-typeahead-url]').forEach(input => {
+        const target = input.dataset.typeaheadTarget ? document.getElementById(input.dataset.typeaheadTarget) : null;
+        const menu = document.createElement('div');
+        menu.className = 'typeahead-menu';
+        if (getComputedStyle(input.parentElement).position === 'static') {
+            input.parentElement.style.position = 'relative';
+        }
+        input.after(menu);
+        input.setAttribute('autocomplete', 'off');
+        
+        let items = [];
+        let active = -1;
+        let timer = null;
+        let controller = null;
+        
+        const close = () => {
+            menu.classList.remove('show');
+            active = -1;
+        };
+        
+        const highlight = (index) => {
+            active = index;
+            menu.querySelectorAll('.typeahead-item').forEach((el, i) => el.classList.toggle('active', i === index));
+        };
+        
+        const choose = (item) => {
+            close();
+            if (target) {
+                input.value = item.label;
+                target.value = item.id;
+                input.setCustomValidity('');
+            } else if (input.dataset.typeaheadLink) {
+                window.location.href = input.dataset.typeaheadLink.replace(/\/0$/, `/${item.id}`);
+            }
+        };
+        
+        const render = () => {
+            menu.innerHTML = '';
+            items.forEach((item, index) => {
+                const el = document.createElement('div');
+                el.className = 'typeahead-item';
+                el.textContent = item.label;
+                // mousedown fires before the input loses focus
+                el.addEventListener('mousedown', (e) => {
+                    e.preventDefault();
+                    choose(item);
+                });
+                el.addEventListener('mouseenter', () => highlight(index));
+                menu.appendChild(el);
+            });
+            menu.style.top = `${input.offsetTop + input.offsetHeight}px`;
+            menu.style.left = `${input.offsetLeft}px`;
+            menu.style.width = `${input.offsetWidth}px`;
+            menu.classList.toggle('show', items.length > 0);
+            active = -1;
+        };
+        
+        const lookup = () => {
+            const term = input.value.trim();
+            if (controller) controller.abort();
+            if (!term) {
+                items = [];
+                close();
+                return;
+            }
+            controller = new AbortController();
+            const url = new URL(input.dataset.typeaheadUrl, window.location.origin);
+            url.searchParams.set('q', term);
+            fetch(url, { headers: { 'Accept': 'application/json' }, signal: controller.signal })
+                .then(response => response.json())
+                .then(data => {
+                    items = data.data || [];
+                    render();
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') console.error('Error loading suggestions:', error);
+                });
+        };
+        
+        input.addEventListener('input', () => {
+            if (target) {
+                target.value = '';
+                // A typed name that was not picked from the list would be dropped silently
+                input.setCustomValidity(input.value.trim() ? 'Choose a name from the list.' : '');
+            }
+            clearTimeout(timer);
+            timer = setTimeout(lookup, 150);
+        });
+        
+        input.addEventListener('keydown', (e) => {
+            if (!menu.classList.contains('show')) return;
+            if (e.key === 'ArrowDown') {
+                e.preventDefault();
+                highlight((active + 1) % items.length);
+            } else if (e.key === 'ArrowUp') {
+                e.preventDefault();
+                highlight(active <= 0 ? items.length - 1 : active - 1);
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault();
+                choose(items[active]);
+            } else if (e.key === 'Escape') {
+                close();
+            }
+        });
+        
+        input.addEventListener('blur', close);
+    });
+}
+
 // Utility Functions
 
 // Format date
@@ -0,0 +1,206 @@
+"""
+Church Information System - Change Feed for Offline Clients
+"""
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from app import db
+from app.models import Member, CareGroup, Ministry, MemberMove
+
+# Synced field name -> column, per resource. Derived or denormalized
+# values (age, member_count, joined names) are left out: they change
+# without touching updated_at, so a client copy of them would go stale.
+MEMBER_FIELDS = {
+    'id': Member.id,
+    'fullname': Member.fullname,
+    'gender': Member.gender,
+    'date_of_birth': Member.date_of_birth,
+    'recorded_age': Member.recorded_age,
+    'address': Member.address,
+    'contact': Member.contact,
+    'baptism_date': Member.baptism_date,
+    'ministry_id': Member.ministry_id,
+    'caregroup_id': Member.caregroup_id,
+    'status': Member.status,
+    'created_at': Member.created_at,
+    'updated_at': Member.updated_at,
+}
+
+CAREGROUP_FIELDS = {
+    'id': CareGroup.id,
+    'name': CareGroup.name,
+    'color': CareGroup.color,
+    'leader_id': CareGroup.leader_id,
+    'status': CareGroup.status,
+    'created_at': CareGroup.created_at,
+    'updated_at': CareGroup.updated_at,
+}
+
+MINISTRY_FIELDS = {
+    'id': Ministry.id,
+    'name': Ministry.name,
+    'description': Ministry.description,
+    'status': Ministry.status,
+    'created_at': Ministry.created_at,
+    'updated_at': Ministry.updated_at,
+}
+
+
+_listening = False
+
+
+class CursorError(ValueError):
+    """Raised for a cursor that was not issued by this feed"""
+
+
+def _member_visible(user):
+    visible = Member.status == 'active'
+    if user.is_leader() and not user.is_admin():
+        # Same scoping as queries.scoped_members
+        visible = sa.and_(visible, Member.caregroup_id == user.caregroup_id)
+    return visible
+
+
+def _member_scope(user):
+    """Rows a leader is sent at all: their group's members and those who left it
+
+    Anyone else's rows would arrive as tombstones, which still leaks the
+    ids of other groups' members.
+    """
+    if not (user.is_leader() and not user.is_admin()):
+        return None
+    moved_out = sa.exists().where(
+        MemberMove.member_id == Member.id,
+        MemberMove.caregroup_id == user.caregroup_id,
+    )
+    return sa.or_(Member.caregroup_id == user.caregroup_id, moved_out)
+
+
+def _everyone(user):
+    return None
+
+
+# Resource -> (model, fields, expression that is false for a tombstone,
+# filter on the rows sent at all)
+FEEDS = {
+    'members': (Member, MEMBER_FIELDS, _member_visible, _member_scope),
+    'caregroups': (CareGroup, CAREGROUP_FIELDS, lambda user: CareGroup.status == 'active', _everyone),
+    'ministries': (Ministry, MINISTRY_FIELDS, lambda user: Ministry.status == 'active', _everyone),
+}
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='change-feed')
+
+
+def encode_cursor(positions):
+    """Opaque token holding the last (updated_at, id) read from each resource"""
+    return _serializer().dumps({name: [updated_at.isoformat(), row_id]
+                                for name, (updated_at, row_id) in positions.items()})
+
+
+def decode_cursor(token):
+    """Positions from a token; an empty token starts a full sync"""
+    if not token:
+        return {}
+    try:
+        data = _serializer().loads(token)
+        return {name: (datetime.fromisoformat(updated_at), int(row_id))
+                for name, (updated_at, row_id) in data.items() if name in FEEDS}
+    except (BadSignature, TypeError, ValueError):
+        raise CursorError(token)
+
+
+def _read(model, fields, visible, scope, after, horizon, limit):
+    """Up to limit + 1 rows changed after the position, oldest first"""
+    columns = [column.label(name) for name, column in fields.items()]
+    query = db.session.query(visible.label('_visible'), *columns).filter(
+        model.updated_at <= horizon
+    )
+    if scope is not None:
+        query = query.filter(scope)
+    if after is not None:
+        query = query.filter(
+            sa.tuple_(model.updated_at, model.id) > sa.tuple_(sa.literal(after[0]), sa.literal(after[1]))
+        )
+    return query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+
+def changes(user, cursor=None, limit=500):
+    """Rows changed since cursor, tombstones for rows the user no longer sees
+
+    Every row carries updated_at, and (updated_at, id) orders all writes to
+    a table, so each resource resumes right after the last row it returned
+    and cursors only move forward. Rows stamped within the last
+    SYNC_SETTLE_SECONDS are held back until concurrent transactions that
+    stamped earlier times have had time to commit.
+
+    A leader is only sent members of their care group and tombstones for
+    members who were deactivated in it or moved out of it.
+
+    Returns {'data': {resource: [row dicts]}, 'deleted': {resource: [ids]},
+    'cursor': token, 'has_more': bool}. Keep requesting with the returned
+    cursor while has_more is true.
+    """
+    positions = decode_cursor(cursor)
+    settle = current_app.config.get('SYNC_SETTLE_SECONDS', 5)
+    horizon = datetime.utcnow() - timedelta(seconds=settle)
+
+    result = {'data': {}, 'deleted': {}, 'has_more': False}
+    for name, (model, fields, visible, scope) in FEEDS.items():
+        rows = _read(model, fields, visible(user), scope(user), positions.get(name), horizon, limit)
+        if len(rows) > limit:
+            result['has_more'] = True
+            rows = rows[:limit]
+        names = list(fields)
+        result['data'][name] = [dict(zip(names, row[1:])) for row in rows if row[0]]
+        result['deleted'][name] = [row.id for row in rows if not row[0]]
+        if rows:
+            positions[name] = (rows[-1].updated_at, rows[-1].id)
+
+    result['cursor'] = encode_cursor(positions)
+    return result
+
+
+# ==================== MOVES BETWEEN CARE GROUPS ====================
+
+def record_bulk_moves(member_ids, caregroup_id):
+    """Record the groups members leave in a set-based UPDATE to caregroup_id
+
+    member_ids is a selectable of Member ids. Call it before the UPDATE runs.
+    """
+    leaving = sa.select(
+        Member.id, Member.caregroup_id, sa.literal(datetime.utcnow())
+    ).where(
+        Member.id.in_(member_ids),
+        Member.caregroup_id.isnot(None),
+    )
+    if caregroup_id is not None:
+        leaving = leaving.where(Member.caregroup_id != caregroup_id)
+    db.session.execute(sa.insert(MemberMove).from_select(
+        ['member_id', 'caregroup_id', 'moved_at'], leaving
+    ))
+
+
+def _after_flush(session, flush_context):
+    moves = []
+    for obj in session.dirty:
+        if not isinstance(obj, Member):
+            continue
+        history = sa.inspect(obj).attrs.caregroup_id.history
+        if history.deleted and history.deleted[0] is not None and history.added != history.deleted:
+            moves.append({'member_id': obj.id, 'caregroup_id': history.deleted[0],
+                          'moved_at': datetime.utcnow()})
+    if moves:
+        session.execute(sa.insert(MemberMove), moves)
+
+
+def init_app(app):
+    """Record every ORM change of a member's care group"""
+    global _listening
+    if not _listening:
+        event.listen(Session, 'after_flush', _after_flush)
+        _listening = True
@@ -0,0 +1,269 @@
+"""
+Church Information System - Typeahead Lookup
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import timedelta
+from flask import current_app
+from app import db, cache
+from app.models import Member, User
+
+# A lookup ranks up to SCAN_FACTOR candidates per result and examines at
+# most MAX_SCAN keys, so a one-letter query stays well under a millisecond
+SCAN_FACTOR = 20
+MAX_SCAN = 5000
+
+Entry = namedtuple('Entry', 'id label name status caregroup_id role')
+
+# caregroup_id for a member lookup over every group (None means members without one)
+ALL_GROUPS = object()
+
+
+def normalize(text):
+    """Lowercase words without accents, e.g. ' José  DELA-Cruz' -> 'jose dela cruz'"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+class PrefixIndex:
+    """Sorted array of name keys searched with bisect
+
+    Every word of a name starts one key ('maria dela cruz', 'dela cruz',
+    'cruz'), so a prefix finds surnames as well as first names. Keys end
+    in the zero-padded id, which makes each one unique: a change removes
+    and inserts exact keys instead of rebuilding the array.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.ids = []  # Entry id for each key, same order
+        self.entries = {}
+
+    @staticmethod
+    def _keys(entry):
+        words = entry.name.split()
+        return [f'{" ".join(words[i:])}\0{entry.id:010d}' for i in range(len(words))]
+
+    def load(self, entries):
+        """Replace the contents in one sort"""
+        self.entries = {entry.id: entry for entry in entries}
+        pairs = sorted((key, entry.id) for entry in self.entries.values() for key in self._keys(entry))
+        self.keys = [key for key, _ in pairs]
+        self.ids = [entry_id for _, entry_id in pairs]
+
+    def upsert(self, entry):
+        old = self.entries.get(entry.id)
+        if old == entry:
+            return False
+        if old is not None and old.name != entry.name:
+            self._remove_keys(old)
+        if old is None or old.name != entry.name:
+            for key in self._keys(entry):
+                index = bisect_left(self.keys, key)
+                self.keys.insert(index, key)
+                self.ids.insert(index, entry.id)
+        self.entries[entry.id] = entry
+        return True
+
+    def remove(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is not None:
+            self._remove_keys(entry)
+
+    def _remove_keys(self, entry):
+        for key in self._keys(entry):
+            index = bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                del self.keys[index]
+                del self.ids[index]
+
+    def search(self, query, limit=10, accept=None):
+        """Up to limit entries whose words start with every query word
+
+        Keys holding the whole query as a phrase ('maria san' in 'maria
+        santos') are contiguous, so they are read first; only when those
+        fall short does the range of the first word get scanned, with the
+        later words allowed anywhere in the name. Those matches all rank
+        below names that begin with the query, so that scan stops at limit.
+        Within each rank, alphabetical order.
+        """
+        words = normalize(query).split()
+        if not words:
+            return []
+        prefix = ' '.join(words)
+        seen, found = set(), []
+
+        def scan(start_with, match, wanted):
+            start = bisect_left(self.keys, start_with)
+            for index in range(start, min(start + MAX_SCAN, len(self.keys))):
+                if not self.keys[index].startswith(start_with):
+                    break
+                entry_id = self.ids[index]
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                entry = self.entries[entry_id]
+                if accept is not None and not accept(entry):
+                    continue
+                if match is not None and not match(entry):
+                    continue
+                found.append(entry)
+                if len(found) >= wanted:
+                    break
+
+        scan(prefix, None, limit * SCAN_FACTOR)
+        if len(words) > 1 and len(found) < limit:
+            def has_words(entry):
+                name_words = entry.name.split()
+                return all(any(w.startswith(word) for w in name_words) for word in words[1:])
+            scan(words[0], has_words, len(found) + limit)
+        found.sort(key=lambda entry: (not entry.name.startswith(prefix), entry.name, entry.id))
+        return found[:limit]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Typeahead:
+    """Per-process prefix indexes of member names and usernames
+
+    Members also get one index per care group, so a leader's lookup only
+    scans their own group and MAX_SCAN never runs out on other groups.
+
+    Built on the first lookup. Later lookups fold in rows whose
+    updated_at moved, when the cache stamp of members or users changed
+    (every commit bumps it) or at least every TYPEAHEAD_REFRESH_SECONDS
+    for writes made by other processes with a per-process cache. Rows
+    are re-read from SYNC_SETTLE_SECONDS before the newest one seen, so
+    a transaction that committed late is still picked up.
+    """
+
+    def __init__(self):
+        self.members = PrefixIndex()
+        self.member_groups = {}  # caregroup_id -> PrefixIndex of that group's members
+        self.users = PrefixIndex()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stamp = None
+        self._checked = 0.0
+        self._since = {}
+
+    def _member_rows(self, since=None):
+        query = db.session.query(Member.id, Member.fullname, Member.status, Member.caregroup_id,
+                                 Member.updated_at)
+        if since is not None:
+            query = query.filter(Member.updated_at >= since)
+        for member_id, fullname, status, caregroup_id, updated_at in query:
+            yield Entry(member_id, fullname, normalize(fullname), status, caregroup_id, None), updated_at
+
+    def _user_rows(self, since=None):
+        query = db.session.query(User.id, User.username, User.status, User.caregroup_id, User.role,
+                                 User.updated_at)
+        if since is not None:
+            query = query.filter(User.updated_at >= since)
+        for user_id, username, status, caregroup_id, role, updated_at in query:
+            yield Entry(user_id, username, normalize(username), status, caregroup_id, role), updated_at
+
+    def _sources(self):
+        return (('members', self.members, self._member_rows), ('users', self.users, self._user_rows))
+
+    def ensure_current(self):
+        stamp = cache.stamp('members', 'users')
+        interval = current_app.config.get('TYPEAHEAD_REFRESH_SECONDS', 5)
+        if self._loaded and stamp == self._stamp and time.monotonic() - self._checked < interval:
+            return
+        with self._lock:
+            settle = timedelta(seconds=current_app.config.get('SYNC_SETTLE_SECONDS', 5))
+            checked = time.monotonic()
+            for name, index, rows in self._sources():
+                since = self._since.get(name)
+                if not self._loaded or since is None:
+                    loaded = list(rows())
+                    index.load(entry for entry, _ in loaded)
+                    if index is self.members:
+                        self._load_groups()
+                else:
+                    loaded = list(rows(since - settle))
+                    for entry, _ in loaded:
+                        old = index.entries.get(entry.id)
+                        if index.upsert(entry) and index is self.members:
+                            self._regroup(old, entry)
+                stamps = [updated_at for _, updated_at in loaded if updated_at is not None]
+                if stamps:
+                    self._since[name] = max(stamps + ([since] if since else []))
+            self._loaded = True
+            self._stamp = stamp
+            self._checked = checked
+
+    def _load_groups(self):
+        grouped = {}
+        for entry in self.members.entries.values():
+            grouped.setdefault(entry.caregroup_id, []).append(entry)
+        self.member_groups = {}
+        for caregroup_id, entries in grouped.items():
+            self.member_groups[caregroup_id] = PrefixIndex()
+            self.member_groups[caregroup_id].load(entries)
+
+    def _regroup(self, old, entry):
+        if old is not None and old.caregroup_id != entry.caregroup_id:
+            self.member_groups[old.caregroup_id].remove(old.id)
+        self.member_groups.setdefault(entry.caregroup_id, PrefixIndex()).upsert(entry)
+
+    def search(self, kind, query, limit=10, accept=None, caregroup_id=ALL_GROUPS):
+        """Matches from one index; members of a single care group unless caregroup_id is ALL_GROUPS"""
+        self.ensure_current()
+        with self._lock:
+            if kind != 'members':
+                index = self.users
+            elif caregroup_id is not ALL_GROUPS:
+                index = self.member_groups.get(caregroup_id)
+                if index is None:
+                    return []
+            else:
+                index = self.members
+            return index.search(query, limit, accept)
+
+
+# ==================== APP INTEGRATION ====================
+
+_typeahead = None
+_typeahead_pid = None
+_typeahead_lock = threading.Lock()
+
+
+def get_typeahead():
+    """This process's indexes; a forked worker builds its own"""
+    global _typeahead, _typeahead_pid
+    with _typeahead_lock:
+        if _typeahead_pid != os.getpid():
+            _typeahead = Typeahead()
+            _typeahead_pid = os.getpid()
+        return _typeahead
+
+
+def member_matches(user, query, limit=10, status='active'):
+    """Members whose names start with the query words, scoped like the member list"""
+    leader_scope = user.is_leader() and not user.is_admin()
+    # Read once: user is usually current_user, a proxy that is slow per attribute
+    caregroup_id = user.caregroup_id
+
+    def visible(entry):
+        return not status or entry.status == status
+
+    # A leader searches their group's own index, so the scan cap only counts rows they can see
+    return get_typeahead().search('members', query, limit, visible,
+                                  caregroup_id=caregroup_id if leader_scope else ALL_GROUPS)
+
+
+def leader_matches(query, limit=10):
+    """Active users who can be made a care group leader (everyone but admins)"""
+    return get_typeahead().search('users', query, limit,
+                                  lambda entry: entry.status == 'active' and entry.role != 'admin')
@@ -0,0 +1,32 @@
+"""
+Church Information System - Input Validation
+"""
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%d'
+MAX_PAGE_SIZE = 200
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD date; blank values mean no date"""
+    if not value:
+        return None
+    return datetime.strptime(value.strip(), DATE_FORMAT).date()
+
+
+def parse_age(value):
+    """Parse an age in years; blank values mean no age"""
+    if value is None or str(value).strip() == '':
+        return None
+    age = int(value)
+    if age < 0 or age > 150:
+        raise ValueError(f'age {age} is out of range')
+    return age
+
+
+def parse_page_size(value):
+    """Parse a list page size from 1 to MAX_PAGE_SIZE"""
+    size = int(value)
+    if size < 1 or size > MAX_PAGE_SIZE:
+        raise ValueError(f'items per page must be between 1 and {MAX_PAGE_SIZE}')
+    return size
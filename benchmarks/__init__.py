@@ -0,0 +1,6 @@
+"""
+Church Information System - Benchmark Harness
+
+Run with `python -m benchmarks run --scale 10k` from the project root;
+see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,149 @@
+"""
+Church Information System - Benchmark Command Line
+"""
+import json
+import os
+import sys
+import tempfile
+import click
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+
+def parse_scale(value):
+    try:
+        return SCALES.get(value.lower()) or int(value)
+    except ValueError:
+        raise click.BadParameter(f'{value} is not one of {", ".join(SCALES)} or a number')
+
+
+@click.group()
+def cli():
+    """Seed large datasets and benchmark the busiest pages."""
+
+
+@cli.command()
+@click.option('--scale', 'scales', multiple=True, default=['1k'], show_default=True,
+              help='Members to seed: 1k, 10k, 100k or a number. Repeatable.')
+@click.option('--iterations', default=50, show_default=True, help='Timed requests per scenario.')
+@click.option('--warmup', default=5, show_default=True, help='Untimed requests per scenario.')
+@click.option('--memory-iterations', default=5, show_default=True,
+              help='Requests traced for peak memory per scenario.')
+@click.option('--scenario', 'only', multiple=True, help='Run only these scenarios.')
+@click.option('--db-dir', type=click.Path(file_okay=False),
+              help='Keep seeded databases here and reuse them on later runs.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def run(scales, iterations, warmup, memory_iterations, only, db_dir, output):
+    """Benchmark every scenario at each scale."""
+    from benchmarks.runner import run_scale, metadata
+
+    runs = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = db_dir or scratch
+        os.makedirs(directory, exist_ok=True)
+        for scale in scales:
+            members = parse_scale(scale)
+            click.echo(f'{members} members')
+            runs[str(members)] = run_scale(members, directory, iterations, warmup,
+                                           memory_iterations, only=only, echo=click.echo)
+
+    results = {'meta': metadata(iterations, warmup), 'runs': runs}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f'Wrote {output}')
+
+
+@cli.command()
+@click.option('--scale', default='1k', show_default=True, help='Members to seed.')
+@click.option('--readers', default=4, show_default=True, help='Reader processes.')
+@click.option('--writers', default=4, show_default=True, help='Writer processes.')
+@click.option('--duration', default=10.0, show_default=True, help='Seconds to run.')
+@click.option('--config', 'config_name', default='production', show_default=True,
+              help='Config class whose SQLITE_PRAGMAS and pool settings to use.')
+@click.option('--legacy', is_flag=True, help='Use rollback-journal SQLite for comparison.')
+@click.option('--db-dir', type=click.Path(file_okay=False),
+              help='Keep seeded databases here and reuse them on later runs.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def concurrency(scale, readers, writers, duration, config_name, legacy, db_dir, output):
+    """Run reader and writer processes together; exits 1 on lock errors."""
+    from benchmarks.concurrency import run_concurrency
+    from benchmarks.runner import metadata
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = db_dir or scratch
+        os.makedirs(directory, exist_ok=True)
+        result = run_concurrency(parse_scale(scale), directory, readers, writers, duration,
+                                 config_name=config_name, legacy=legacy, echo=click.echo)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'meta': metadata(0, 0), 'concurrency': result}, f, indent=2)
+        click.echo(f'Wrote {output}')
+    sys.exit(1 if any(r['lock_errors'] for r in result['roles'].values()) else 0)
+
+
+@cli.command()
+@click.option('--scale', default='1k', show_default=True, help='Members to seed.')
+@click.option('--threads', default=16, show_default=True, help='Concurrent check-in tablets.')
+@click.option('--checkins', default=1000, show_default=True, help='Check-ins to send in total.')
+@click.option('--repeat-rate', default=0.1, show_default=True,
+              help='Share of check-ins that repeat a member already in.')
+@click.option('--direct', is_flag=True, help='Also run with ATTENDANCE_WRITE_BEHIND off for comparison.')
+@click.option('--db-dir', type=click.Path(file_okay=False),
+              help='Keep seeded databases here and reuse them on later runs.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def checkin(scale, threads, checkins, repeat_rate, direct, db_dir, output):
+    """Simulate the Sunday check-in burst; exits 1 on lost or duplicate rows."""
+    from benchmarks.checkin import run_checkin
+    from benchmarks.runner import BenchmarkError, metadata
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = db_dir or scratch
+        os.makedirs(directory, exist_ok=True)
+        try:
+            for write_behind in ((True, False) if direct else (True,)):
+                results.append(run_checkin(parse_scale(scale), directory, threads, checkins,
+                                           repeat_rate=repeat_rate, write_behind=write_behind,
+                                           echo=click.echo))
+        except BenchmarkError as e:
+            click.echo(f'FAILED: {e}', err=True)
+            sys.exit(1)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'meta': metadata(0, 0), 'checkin': results}, f, indent=2)
+        click.echo(f'Wrote {output}')
+
+
+@cli.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', default=0.2, show_default=True,
+              help='Relative slowdown that counts as a regression.')
+def compare_command(baseline, current, threshold):
+    """Flag regressions in CURRENT against BASELINE; exits 1 if any."""
+    from benchmarks.compare import compare
+
+    with open(baseline) as f:
+        baseline = json.load(f)
+    with open(current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, threshold)
+    regressions = 0
+    for scale, name, metric, old, new, change, regressed in rows:
+        regressions += regressed
+        mark = 'REGRESSION' if regressed else ''
+        click.echo(f'{scale:>7} {name:<24} {metric:<20} {old:10.2f} -> {new:10.2f} '
+                   f'{change:+7.1%} {mark}')
+
+    if not rows:
+        click.echo('No scales or scenarios in common.')
+    click.echo(f'{regressions} regression(s) at a {threshold:.0%} threshold.')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    cli()
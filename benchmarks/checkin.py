@@ -0,0 +1,131 @@
+"""
+Church Information System - Sunday Check-in Burst Benchmark
+"""
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from benchmarks.runner import BenchmarkError, benchmark_app, login, percentile, prepare_database
+
+
+def _last_sunday():
+    today = date.today()
+    return today - timedelta(days=(today.weekday() + 1) % 7)
+
+
+def run_checkin(members, db_dir, threads, checkins, repeat_rate=0.1, pollers=2,
+                write_behind=True, echo=print):
+    """Fire check-ins from many threads at once against one SQLite file
+
+    Each thread stands in for a check-in tablet (gunicorn thread) and
+    posts as fast as it can; a share of the check-ins repeat a member
+    already in, as double taps and second tablets do. Pollers keep
+    reading the live headcount. Afterwards the table must hold exactly
+    one row per member checked in, and the in-memory headcount must
+    match it.
+    """
+    database_path = os.path.join(db_dir, f'benchmark-{members}.db')
+    _, seed_seconds = prepare_database(database_path, members)
+    if seed_seconds:
+        echo(f'Seeded {members} members in {seed_seconds:.1f}s')
+
+    # One connection per tablet and poller, as DB_POOL_SIZE should match gunicorn --threads
+    app = benchmark_app(database_path, ATTENDANCE_WRITE_BEHIND=write_behind,
+                        DB_POOL_SIZE=threads + pollers + 1)
+    from app import attendance, db
+    from app.models import Attendance, Member
+    service_date = _last_sunday()
+    with app.app_context():
+        db.session.query(Attendance).filter(Attendance.service_date == service_date).delete()
+        db.session.commit()
+        member_ids = [id_ for (id_,) in db.session.query(Member.id).filter(
+            Member.status == 'active').limit(checkins)]
+    # A fresh buffer for this run, even when an earlier run used this process
+    attendance._buffer_pid = None
+
+    plan = []
+    rng = random.Random(42)
+    for index in range(checkins):
+        if plan and rng.random() < repeat_rate:
+            plan.append(rng.choice(plan))
+        else:
+            plan.append(member_ids[index % len(member_ids)])
+    shares = [plan[n::threads] for n in range(threads)]
+
+    latencies, failures, polls = [], [], []
+    lock = threading.Lock()
+    # The clock starts once every tablet has logged in
+    started = []
+    start = threading.Barrier(threads + pollers, action=lambda: started.append(time.perf_counter()))
+    done = threading.Event()
+    payload = {'service_date': service_date.isoformat(), 'service': 'sunday'}
+
+    def tablet(share):
+        client = login(app, 'admin')
+        start.wait()
+        for member_id in share:
+            began = time.perf_counter()
+            response = client.post('/api/v1/attendance/checkin', json=dict(payload, member_id=member_id))
+            elapsed = (time.perf_counter() - began) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+    def poller():
+        client = login(app, 'admin')
+        start.wait()
+        while not done.is_set():
+            began = time.perf_counter()
+            response = client.get('/api/v1/attendance/headcount', query_string=payload)
+            with lock:
+                polls.append((time.perf_counter() - began) * 1000)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+            time.sleep(0.05)
+
+    workers = [threading.Thread(target=tablet, args=(share,)) for share in shares]
+    watchers = [threading.Thread(target=poller) for _ in range(pollers)]
+    for thread in workers + watchers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started[0]
+    done.set()
+    for thread in watchers:
+        thread.join()
+
+    with app.app_context():
+        buffer = attendance.get_buffer()
+        buffer.stop()
+        rows = db.session.query(Attendance).filter(Attendance.service_date == service_date).count()
+        headcount = sum(buffer.headcount((service_date, 'sunday')).values())
+        stats = dict(buffer.stats)
+    unique = len(set(plan))
+    if failures:
+        raise BenchmarkError(f'{len(failures)} check-in requests failed: {sorted(set(failures))}')
+    if rows != unique or headcount != unique:
+        raise BenchmarkError(f'expected {unique} check-ins, table has {rows}, headcount says {headcount}')
+
+    result = {
+        'members': members,
+        'mode': 'write-behind' if write_behind else 'direct',
+        'threads': threads,
+        'checkins': checkins,
+        'unique_members': unique,
+        'seconds': elapsed,
+        'throughput_rps': checkins / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else 0.0,
+        'headcount_p95_ms': percentile(polls, 95),
+        'flushes': stats['flushes'],
+        'largest_batch': stats['largest_batch'],
+    }
+    echo(f'  {result["mode"]:<13} {checkins} check-ins ({unique} members) from {threads} threads '
+         f'in {elapsed:.2f}s  {result["throughput_rps"]:7.1f}/s  p95 {result["p95_ms"]:7.1f} ms  '
+         f'p99 {result["p99_ms"]:7.1f} ms  headcount p95 {result["headcount_p95_ms"]:5.1f} ms  '
+         f'{stats["flushes"]} transactions')
+    return result
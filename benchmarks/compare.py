@@ -0,0 +1,33 @@
+"""
+Church Information System - Benchmark Comparison
+"""
+
+# Metric -> (relative tolerance multiplier, absolute slack). A result is a
+# regression only when it is worse by both the relative threshold (scaled
+# by the multiplier) and the absolute slack, which keeps timer noise on
+# sub-millisecond pages from being reported.
+CHECKS = {
+    'p50_ms': (1.0, 1.0),
+    'p95_ms': (1.0, 2.0),
+    'queries_per_request': (0.0, 0.5),
+    'peak_memory_kb': (1.0, 64.0),
+}
+
+
+def compare(baseline, current, threshold=0.2):
+    """Rows of (scale, scenario, metric, old, new, change, regressed)"""
+    rows = []
+    for scale, run in sorted(current['runs'].items(), key=lambda item: int(item[0])):
+        base_run = baseline['runs'].get(scale)
+        if base_run is None:
+            continue
+        for name, result in run['scenarios'].items():
+            base = base_run['scenarios'].get(name)
+            if base is None:
+                continue
+            for metric, (multiplier, slack) in CHECKS.items():
+                old, new = base[metric], result[metric]
+                change = (new - old) / old if old else 0.0
+                regressed = new > old * (1 + threshold * multiplier) and new - old > slack
+                rows.append((scale, name, metric, old, new, change, regressed))
+    return rows
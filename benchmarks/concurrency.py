@@ -0,0 +1,110 @@
+"""
+Church Information System - Concurrent Reader/Writer Benchmark
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+from benchmarks.runner import benchmark_app, login, percentile, prepare_database
+
+# SQLite as it behaved before SQLITE_PRAGMAS existed. The rollback journal
+# is switched on once, before the workers start, since changing the journal
+# mode needs the database to itself.
+LEGACY_JOURNAL_MODE = 'DELETE'
+LEGACY_PRAGMAS = {'synchronous': 'FULL'}
+
+
+def _worker(args):
+    """One process standing in for a gunicorn worker"""
+    database_path, config_name, pragmas, role, duration, member_ids, seed = args
+    overrides = {'SQLITE_PRAGMAS': pragmas} if pragmas is not None else {}
+    app = benchmark_app(database_path, config_name, **overrides)
+
+    client = login(app, 'admin')
+    rng = random.Random(seed)
+    latencies, errors, locked = [], 0, 0
+    deadline = time.monotonic() + duration
+    step = 0
+    while time.monotonic() < deadline:
+        step += 1
+        started = time.perf_counter()
+        if role == 'reader':
+            response = client.get('/members/' if step % 2 else '/dashboard')
+            ok = response.status_code == 200
+        elif step % 2:
+            response = client.post('/settings/appearance/theme', json={'theme': 'dark' if step % 4 == 1 else 'light'})
+            ok = response.status_code == 200
+        else:
+            member_id = rng.choice(member_ids)
+            response = client.post(f'/members/{member_id}/edit', data={
+                'fullname': f'Concurrency Member {member_id}',
+                'gender': 'Female',
+                'address': f'{step} Writer St',
+                'contact': f'09{rng.randrange(10 ** 9):09d}',
+            })
+            # Success redirects; a failed commit re-renders the form
+            ok = response.status_code == 302
+        body = response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors += 1
+            if b'database is locked' in body or response.status_code == 500:
+                locked += 1
+    return role, latencies, errors, locked
+
+
+def run_concurrency(members, db_dir, readers, writers, duration, config_name='production',
+                    legacy=False, echo=print):
+    """Run readers and writers in separate processes against one database file"""
+    database_path = os.path.join(db_dir, f'benchmark-{members}.db')
+    app, seed_seconds = prepare_database(database_path, members)
+    if seed_seconds:
+        echo(f'Seeded {members} members in {seed_seconds:.1f}s')
+
+    from app import db, database
+    from app.models import Member
+    with app.app_context():
+        member_ids = [id_ for (id_,) in db.session.query(Member.id).limit(500)]
+        database.release_connections()
+    connection = sqlite3.connect(database_path)
+    try:
+        journal_mode = LEGACY_JOURNAL_MODE if legacy else app.config['SQLITE_PRAGMAS'].get('journal_mode', 'WAL')
+        connection.execute(f'PRAGMA journal_mode={journal_mode}')
+    finally:
+        connection.close()
+
+    pragmas = LEGACY_PRAGMAS if legacy else None
+    jobs = [(database_path, config_name, pragmas, 'reader', duration, member_ids, n)
+            for n in range(readers)]
+    jobs += [(database_path, config_name, pragmas, 'writer', duration, member_ids, 1000 + n)
+             for n in range(writers)]
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(len(jobs)) as pool:
+        outcomes = pool.map(_worker, jobs)
+
+    summary = {}
+    for role in ('reader', 'writer'):
+        latencies = [ms for r, values, _, _ in outcomes if r == role for ms in values]
+        summary[role] = {
+            'processes': sum(1 for r, *_ in outcomes if r == role),
+            'requests': len(latencies),
+            'errors': sum(e for r, _, e, _ in outcomes if r == role),
+            'lock_errors': sum(l for r, _, _, l in outcomes if r == role),
+            'throughput_rps': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': max(latencies) if latencies else 0.0,
+        }
+        row = summary[role]
+        echo(f'  {role + "s":<8} {row["processes"]:3d} procs  {row["requests"]:6d} requests  '
+             f'{row["throughput_rps"]:7.1f}/s  p95 {row["p95_ms"]:8.1f} ms  '
+             f'{row["errors"]} errors ({row["lock_errors"]} locked)')
+    return {
+        'members': members,
+        'duration': duration,
+        'journal': 'legacy' if legacy else 'configured',
+        'roles': summary,
+    }
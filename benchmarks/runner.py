@@ -0,0 +1,184 @@
+"""
+Church Information System - Benchmark Runner
+"""
+import os
+import platform
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime
+from sqlalchemy import event
+import config
+from app import create_app, db
+from app.models import Member
+from benchmarks import seed as seeding
+from benchmarks.scenarios import SCENARIOS, CREDENTIALS, load_fixtures
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class BenchmarkError(RuntimeError):
+    """A scenario request failed, so its timings would be meaningless"""
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def benchmark_app(database_path, config_name='production', **overrides):
+    """An application bound to a benchmark database, configured like config_name"""
+    base = config.config[config_name]
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(database_path)}',
+        'SQLALCHEMY_ECHO': False,
+        'DEBUG': False,
+        'TESTING': False,
+        'CACHE_BACKEND': 'memory',
+        'JOBS_WORKER': 'external',
+    }
+    settings.update(overrides)
+    config.config['benchmark'] = type('BenchmarkConfig', (base,), settings)
+    return create_app('benchmark')
+
+
+def prepare_database(database_path, members, rng_seed=42):
+    """Create and seed the database unless it already holds this many members"""
+    app = benchmark_app(database_path)
+    with app.app_context():
+        existing = Member.query.count()
+        if existing == members:
+            return app, 0.0
+        if existing:
+            raise BenchmarkError(f'{database_path} holds {existing} members, not {members}; '
+                                 'remove it or pick another --db-dir')
+        started = time.perf_counter()
+        seeding.seed(members, rng_seed)
+        return app, time.perf_counter() - started
+
+
+def login(app, user):
+    client = app.test_client()
+    username, password = CREDENTIALS[user]
+    response = client.post('/auth/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise BenchmarkError(f'login as {username} failed ({response.status_code})')
+    return client
+
+
+def measure(app, client, scenario, fixtures, iterations, warmup, memory_iterations):
+    """Time one scenario; returns latency percentiles, queries and peak memory"""
+    path = scenario.url(fixtures)
+    counter = {'queries': 0}
+
+    def count(*args, **kwargs):
+        counter['queries'] += 1
+
+    def request():
+        if scenario.before:
+            with app.app_context():
+                scenario.before()
+        counter['queries'] = 0
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise BenchmarkError(f'{scenario.name}: GET {path} returned {response.status_code}')
+        return elapsed
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(warmup):
+            request()
+
+        latencies, queries = [], []
+        for _ in range(iterations):
+            latencies.append(request() * 1000)
+            queries.append(counter['queries'])
+
+        # Allocation tracing slows requests down, so it gets its own pass
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(memory_iterations):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                request()
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'path': path,
+        'user': scenario.user,
+        'iterations': iterations,
+        'mean_ms': sum(latencies) / len(latencies),
+        'min_ms': min(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies),
+        'queries_per_request': sum(queries) / len(queries),
+        'max_queries': max(queries),
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def run_scale(members, db_dir, iterations, warmup, memory_iterations, only=None, echo=print):
+    """Seed (or reuse) a database with `members` rows and run every scenario"""
+    database_path = os.path.join(db_dir, f'benchmark-{members}.db')
+    app, seed_seconds = prepare_database(database_path, members)
+    if seed_seconds:
+        echo(f'Seeded {members} members in {seed_seconds:.1f}s')
+
+    with app.app_context():
+        fixtures = load_fixtures()
+
+    clients = {}
+    results = {}
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        if scenario.user not in clients:
+            clients[scenario.user] = login(app, scenario.user)
+        results[scenario.name] = measure(app, clients[scenario.user], scenario, fixtures,
+                                         iterations, warmup, memory_iterations)
+        row = results[scenario.name]
+        echo(f'  {scenario.name:<24} p50 {row["p50_ms"]:8.2f} ms  p95 {row["p95_ms"]:8.2f} ms  '
+             f'{row["queries_per_request"]:5.1f} queries  {row["peak_memory_kb"]:8.0f} KiB')
+
+    return {
+        'members': members,
+        'plan': seeding.scale_plan(members),
+        'seed_seconds': seed_seconds,
+        'scenarios': results,
+    }
+
+
+def metadata(iterations, warmup):
+    meta = {
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'iterations': iterations,
+        'warmup': warmup,
+    }
+    if resource is not None:
+        meta['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return meta
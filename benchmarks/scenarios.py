@@ -0,0 +1,74 @@
+"""
+Church Information System - Benchmark Scenarios
+"""
+from app import db, cache
+from app.models import User, Member, CareGroup, Ministry
+from benchmarks.seed import BENCHMARK_PASSWORD
+
+CREDENTIALS = {
+    'admin': ('admin', 'admin123'),
+}
+
+
+class Scenario:
+    """One page request to time: a path (or a builder taking the fixtures) and who asks"""
+
+    def __init__(self, name, path, user='admin', before=None):
+        self.name = name
+        self.path = path
+        self.user = user
+        self.before = before
+
+    def url(self, fixtures):
+        return self.path(fixtures) if callable(self.path) else self.path
+
+
+def load_fixtures():
+    """Ids and names the scenarios point at, chosen as the busiest rows"""
+    busiest_caregroup = db.session.query(Member.caregroup_id).filter(
+        Member.status == 'active', Member.caregroup_id.isnot(None)
+    ).group_by(Member.caregroup_id).order_by(db.func.count().desc()).limit(1).scalar()
+    busiest_ministry = db.session.query(Member.ministry_id).filter(
+        Member.status == 'active', Member.ministry_id.isnot(None)
+    ).group_by(Member.ministry_id).order_by(db.func.count().desc()).limit(1).scalar()
+    leader = db.session.query(User.username).join(
+        CareGroup, CareGroup.leader_id == User.id
+    ).filter(CareGroup.id == busiest_caregroup).scalar()
+
+    if leader:
+        CREDENTIALS['leader'] = (leader, BENCHMARK_PASSWORD)
+    return {
+        'caregroup_id': busiest_caregroup or db.session.query(CareGroup.id).limit(1).scalar(),
+        'ministry_id': busiest_ministry or db.session.query(Ministry.id).limit(1).scalar(),
+        'search': 'Santos',
+        'prefix': 'Ma',
+    }
+
+
+def _bust_dashboard_cache():
+    cache.bump('members')
+
+
+def _refresh_reports():
+    # Builds the rollups on first use; afterwards only the chart cache is dropped
+    from app import reports
+    reports.refresh()
+    cache.bump('reports')
+
+
+SCENARIOS = [
+    Scenario('dashboard', '/dashboard'),
+    Scenario('dashboard_uncached', '/dashboard', before=_bust_dashboard_cache),
+    Scenario('list_members', '/members/'),
+    Scenario('list_members_search', lambda f: f'/members/?search={f["search"]}'),
+    Scenario('list_members_filtered',
+             lambda f: f'/members/?ministry={f["ministry_id"]}&caregroup={f["caregroup_id"]}'),
+    Scenario('list_members_leader', '/members/', user='leader'),
+    Scenario('view_caregroup', lambda f: f'/caregroups/{f["caregroup_id"]}'),
+    Scenario('manage_ministries', '/admin/ministries'),
+    Scenario('reports_growth', '/api/v1/reports/growth', before=_refresh_reports),
+    Scenario('reports_retention', '/api/v1/reports/retention', before=_refresh_reports),
+    Scenario('reports_distribution', '/api/v1/reports/distribution', before=_refresh_reports),
+    Scenario('typeahead_members', lambda f: f'/api/v1/typeahead?q={f["prefix"]}'),
+    Scenario('typeahead_members_leader', lambda f: f'/api/v1/typeahead?q={f["prefix"]}', user='leader'),
+]
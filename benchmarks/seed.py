@@ -0,0 +1,86 @@
+"""
+Church Information System - Benchmark Data Seeding
+"""
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db, counters
+from app.models import User, Member, CareGroup, Ministry, password_hash_method
+
+BENCHMARK_PASSWORD = 'benchmark'
+BATCH_SIZE = 5000
+
+FIRST_NAMES = ('Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Grace', 'John', 'Joy', 'Paul', 'Faith',
+               'Peter', 'Ruth', 'James', 'Hope', 'David', 'Esther', 'Daniel', 'Sarah', 'Samuel', 'Leah')
+LAST_NAMES = ('Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores',
+              'Ramos', 'Castillo', 'Villanueva', 'Aquino', 'Navarro', 'Dela Cruz', 'Curtina', 'Lopez')
+STREETS = ('Rizal St', 'Mabini Ave', 'Bonifacio Rd', 'Luna St', 'Quezon Blvd', 'Del Pilar St')
+
+
+def scale_plan(members):
+    """Care group, ministry and user counts that grow with the member count"""
+    return {
+        'members': members,
+        'caregroups': max(4, members // 250),
+        'ministries': max(6, members // 2000),
+        'viewers': max(2, members // 5000),
+    }
+
+
+def seed(members, rng_seed=42):
+    """Fill an empty database (beyond the default rows) at the given scale"""
+    plan = scale_plan(members)
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    # Hashing is deliberately slow, so every benchmark user shares one hash
+    password = generate_password_hash(BENCHMARK_PASSWORD, method=password_hash_method())
+
+    existing = CareGroup.query.count()
+    for i in range(existing, plan['caregroups']):
+        db.session.add(CareGroup(name=f'Care Group {i + 1:03d}',
+                                 color='#%06X' % rng.randrange(0x1000000)))
+    existing = Ministry.query.count()
+    for i in range(existing, plan['ministries']):
+        db.session.add(Ministry(name=f'Ministry {i + 1:03d}'))
+    db.session.flush()
+
+    caregroup_ids = [id_ for (id_,) in db.session.query(CareGroup.id).order_by(CareGroup.id)]
+    ministry_ids = [id_ for (id_,) in db.session.query(Ministry.id).order_by(Ministry.id)]
+
+    for index, caregroup_id in enumerate(caregroup_ids, 1):
+        leader = User(username=f'leader{index:03d}', password=password, role='leader',
+                      caregroup_id=caregroup_id, status='active')
+        db.session.add(leader)
+        db.session.flush()
+        CareGroup.query.filter_by(id=caregroup_id).update({'leader_id': leader.id})
+    for index in range(1, plan['viewers'] + 1):
+        db.session.add(User(username=f'viewer{index:03d}', password=password, role='viewer',
+                            status='active'))
+
+    batch = []
+    for i in range(members):
+        born = date(1940, 1, 1) + timedelta(days=rng.randrange(30000))
+        created = now - timedelta(days=rng.randrange(3650), seconds=rng.randrange(86400))
+        batch.append({
+            'fullname': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i:06d}',
+            'gender': rng.choice(('Male', 'Female')),
+            'date_of_birth': born,
+            'address': f'{rng.randrange(1, 999)} {rng.choice(STREETS)}',
+            'contact': f'09{rng.randrange(10 ** 9):09d}',
+            'baptism_date': born + timedelta(days=rng.randrange(365 * 12, 365 * 30)) if rng.random() < 0.6 else None,
+            'ministry_id': rng.choice(ministry_ids) if rng.random() < 0.8 else None,
+            'caregroup_id': rng.choice(caregroup_ids) if rng.random() < 0.9 else None,
+            'status': 'active' if rng.random() < 0.9 else 'inactive',
+            'created_at': created,
+            'updated_at': created,
+        })
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(insert(Member), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Member), batch)
+
+    counters.reconcile()
+    db.session.commit()
+    return plan
@@ -14,6 +14,31 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///church_system.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite pragmas applied to every new connection. WAL lets readers carry
+    # on while one writer commits; busy_timeout makes writers wait for the
+    # lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,  # Milliseconds; first, so switching to WAL waits too
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable across app crashes; fsync at checkpoints
+        'cache_size': -16000,  # Negative is KiB, so 16 MB per connection
+        'mmap_size': 134217728,  # 128 MB
+        'temp_store': 'MEMORY',
+    }
+    
+    # Connection pool per worker process; match DB_POOL_SIZE to gunicorn --threads
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = 10  # Seconds to wait for a free connection
+    
+    # Read routing: reads go to a replica bind when one is configured, either a
+    # server replica URL or the SQLite file opened a second time read-only.
+    # 'method' routes every GET/HEAD there; 'explicit' only @use_replica views.
+    READ_REPLICA_URI = os.environ.get('READ_REPLICA_URL')
+    SQLITE_READ_ONLY_POOL = False
+    READ_ROUTING = 'method'
+    READ_YOUR_WRITES_SECONDS = 5  # After a write, the user's next requests read the primary
+    
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = True  # Set to True in production with HTTPS
@@ -24,8 +49,65 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'app/static/uploads'
     
+    # Authentication: Werkzeug hash method for new passwords; older hashes are
+    # upgraded at the next successful login. Raising the cost slows every login.
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:600000'
+    USER_CACHE_TTL = 60  # Seconds current_user is served from the cache; 0 disables
+    
     # Pagination
     ITEMS_PER_PAGE = 10
+    PAGINATION_COUNT_TTL = 60  # Seconds to reuse list totals; 0 disables caching
+    
+    # Change feed (/api/v1/changes) for offline clients
+    SYNC_PAGE_SIZE = 500  # Rows per resource per request
+    SYNC_SETTLE_SECONDS = 5  # Changes younger than this wait for in-flight commits
+    
+    # Caching: 'memory' is per process, 'sqlite' is a local file shared by all workers
+    CACHE_BACKEND = 'memory'
+    CACHE_PATH = None  # Defaults to <instance>/cache.db for the sqlite backend
+    CACHE_DEFAULT_TTL = 300
+    DASHBOARD_CACHE_TTL = 60
+    FRAGMENT_CACHE_TTL = 300  # Seconds rendered template fragments are reused; 0 disables
+    
+    # Instrumentation: per-endpoint request/SQL metrics and the slow query log
+    METRICS_ENABLED = True
+    METRICS_TOKEN = None  # Bearer token that lets a Prometheus scraper read /admin/metrics.prom
+    SLOW_QUERY_THRESHOLD = 0.2  # Seconds
+    
+    # Background jobs: 'thread' runs a worker pool in each web process,
+    # 'external' leaves the queue to `flask jobs work`
+    JOBS_WORKER = 'thread'
+    JOBS_THREADS = 2
+    JOBS_POLL_INTERVAL = 2.0  # Seconds between queue checks when idle
+    JOBS_RETRY_DELAY = 30  # Seconds before the first retry; doubles each attempt
+    JOBS_STALE_SECONDS = 300  # A running job without a heartbeat this long is requeued
+    JOBS_FOLDER = None  # Defaults to <instance>/jobs for uploads and job output
+    
+    # Attendance check-in: write-behind batches plus in-memory headcounts per process
+    ATTENDANCE_SERVICES = ('sunday', 'evening', 'midweek')  # The first is the default
+    ATTENDANCE_WRITE_BEHIND = True  # False writes every check-in before answering
+    ATTENDANCE_FLUSH_MS = 250  # Longest a check-in waits in memory
+    ATTENDANCE_FLUSH_ROWS = 200  # Write early once this many are waiting
+    ATTENDANCE_SYNC_SECONDS = 10  # How often headcounts pick up other workers' check-ins
+    
+    # Reports: rollups refreshed incrementally by the reports.refresh job
+    REPORTS_REFRESH_SECONDS = 300  # Opening the reports page queues a refresh after this long
+    REPORTS_CACHE_TTL = 3600  # Chart data is also dropped whenever a refresh changes the rollups
+    REPORTS_MONTHS = 12  # Default window for growth and retention
+    
+    # Typeahead: per-process prefix index of member names and usernames
+    TYPEAHEAD_REFRESH_SECONDS = 5  # Longest before writes from other processes show up
+    TYPEAHEAD_LIMIT = 10  # Default number of suggestions
+    
+    # Static assets: minified, fingerprinted and precompressed into static/build
+    ASSETS_ENABLED = True
+    ASSETS_BUILD_ON_STARTUP = True  # False: use the manifest from `flask assets build`
+    ASSETS_FOLDER = 'build'
+    HTML_COMPRESSION = True  # gzip/brotli for rendered pages
+    COMPRESS_MIMETYPES = ('text/html',)
+    COMPRESS_MIN_SIZE = 500  # Bytes
+    COMPRESS_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
     
     # Application info
     APP_NAME = "Church Information System (CIS)"
@@ -36,6 +118,7 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    ASSETS_ENABLED = False  # Serve css/js as edited
     TESTING = False
     SESSION_COOKIE_SECURE = False
 
@@ -43,13 +126,23 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
+    CACHE_BACKEND = 'sqlite'
+    SQLITE_READ_ONLY_POOL = True
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS,
+                          cache_size=-64000,  # 64 MB
+                          mmap_size=268435456)  # 256 MB
 
 class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLITE_PRAGMAS = {}  # Nothing to tune for an in-memory database
+    JOBS_WORKER = 'external'
+    ATTENDANCE_WRITE_BEHIND = False
     WTF_CSRF_ENABLED = False
+    ASSETS_ENABLED = False  # Never write build output into app/static from a test run
+    ASSETS_BUILD_ON_STARTUP = False
 
 # Configuration dictionary
 config = {
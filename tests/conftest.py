@@ -0,0 +1,72 @@
+"""
+Church Information System - Test Fixtures
+"""
+import pytest
+from sqlalchemy import event
+import config
+from app import create_app, db
+from app.models import Member, CareGroup, Ministry
+
+
+def make_app(database_path=None, **overrides):
+    """A testing application, on a fresh SQLite file when database_path is given"""
+    settings = dict(overrides)
+    if database_path is not None:
+        settings.setdefault('SQLALCHEMY_DATABASE_URI', f'sqlite:///{database_path}')
+    config.config['pytest'] = type('PytestConfig', (config.TestingConfig,), settings)
+    return create_app('pytest')
+
+
+def add_members(count, offset=0):
+    """Spread count active members over the default care groups and ministries"""
+    caregroups = CareGroup.query.order_by(CareGroup.id).all()
+    ministries = Ministry.query.order_by(Ministry.id).all()
+    for i in range(offset, offset + count):
+        db.session.add(Member(fullname=f'Member {i:05d}', address=f'{i} Main St', contact=f'555-{i:05d}',
+                              caregroup_id=caregroups[i % len(caregroups)].id,
+                              ministry_id=ministries[i % len(ministries)].id, status='active'))
+    db.session.commit()
+
+
+def login(app, username='admin', password='admin123'):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path / 'test.db')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return login(app)
@@ -0,0 +1,70 @@
+"""
+Church Information System - Asset Minifier Tests
+"""
+import os
+import shutil
+import subprocess
+import pytest
+from flask import Flask
+from app import assets
+from app.assets import minify_js, minify_css
+from tests.conftest import make_app
+
+STATIC = os.path.join(os.path.dirname(__file__), os.pardir, 'app', 'static')
+
+
+@pytest.mark.parametrize('source, expected', [
+    # '//' inside a regex is not a comment
+    ("    path = path.replace(/\\/\\//g, '/');  // collapse\n",
+     "path = path.replace(/\\/\\//g, '/');\n"),
+    # A quote inside a regex does not open a string that swallows the rest
+    ("const quote = /'/;\n// note\nconst next = 'it''s';\n",
+     "const quote = /'/;\nconst next = 'it''s';\n"),
+    # '/' inside a character class does not end the regex
+    ("function ok(x) {\n    return /[/\"]+$/.test(x); // slash or quote\n}\n",
+     "function ok(x) {\nreturn /[/\"]+$/.test(x);\n}\n"),
+    ("link.replace(/\\/0$/, `/${id}`);\n",
+     "link.replace(/\\/0$/, `/${id}`);\n"),
+    # Division stays division, and the comment after it still goes
+    ("const half = total / 2; // half\nconst rate = a / b / c;\n",
+     "const half = total / 2;\nconst rate = a / b / c;\n"),
+    ("const url = 'http://example.com'; /* block */ const n = (x) / 2;\n",
+     "const url = 'http://example.com';  const n = (x) / 2;\n"),
+])
+def test_minify_js_keeps_regex_literals(source, expected):
+    assert minify_js(source) == expected
+
+
+def test_minify_css_keeps_strings():
+    assert minify_css('a { background: url("//cdn/x.png"); } /* c */\n') == 'a{background:url("//cdn/x.png")}\n'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_minified_main_js_is_valid(tmp_path):
+    with open(os.path.join(STATIC, 'js', 'main.js')) as f:
+        minified = minify_js(f.read())
+    path = tmp_path / 'main.min.js'
+    path.write_text(minified)
+    result = subprocess.run(['node', '--check', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_build_writes_into_the_static_folder_given(tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(os.path.join(STATIC, 'css'), static / 'css')
+    shutil.copytree(os.path.join(STATIC, 'js'), static / 'js')
+    app = Flask(__name__, static_folder=str(static))
+
+    manifest = assets.build(app)
+    assert set(manifest) == {'css/style.css', 'js/main.js'}
+    for name, built in manifest.items():
+        assert built.startswith('build/')
+        assert (static / built).exists() and (static / (built + '.gz')).exists()
+    assert (static / manifest['js/main.js']).read_text() == minify_js((static / 'js' / 'main.js').read_text())
+    assert assets.load_manifest(app) == manifest
+
+
+def test_testing_config_leaves_app_static_alone(tmp_path):
+    app = make_app(tmp_path / 'test.db')
+    assert not app.config['ASSETS_ENABLED']
+    assert app.extensions['assets'] == {}
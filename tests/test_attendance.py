@@ -0,0 +1,88 @@
+"""
+Church Information System - Attendance Check-in Tests
+"""
+import threading
+from datetime import date
+import pytest
+import config
+from app import db, attendance
+from app.models import Attendance, Member
+from tests.conftest import add_members, login, make_app
+
+SUNDAY = date(2024, 6, 9)
+PAYLOAD = {'service_date': SUNDAY.isoformat(), 'service': 'sunday'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_buffer(monkeypatch):
+    # The buffer is per process; each test gets its own
+    monkeypatch.setattr(attendance, '_buffer_pid', None)
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'member', 7, {'member_ids': '123'}, {'member_id': '1'},
+                                  {'member_ids': [1, True]}])
+def test_checkin_rejects_malformed_bodies(client, body):
+    response = client.post('/api/v1/attendance/checkin', json=body)
+    assert response.status_code == 400
+
+
+def test_burst_of_concurrent_checkins_writes_each_member_once(tmp_path):
+    app = make_app(tmp_path / 'checkin.db',
+                   SQLITE_PRAGMAS=config.Config.SQLITE_PRAGMAS,
+                   ATTENDANCE_WRITE_BEHIND=True,
+                   ATTENDANCE_FLUSH_MS=20,
+                   ATTENDANCE_FLUSH_ROWS=25,
+                   DB_POOL_SIZE=10)
+    with app.app_context():
+        add_members(60)
+        member_ids = [m.id for m in Member.query.order_by(Member.id)]
+        # A second worker process with its own buffer sees some of the same members
+        other_worker = attendance.CheckInBuffer(app).start()
+        for member_id in member_ids[:20]:
+            other_worker.check_in((SUNDAY, 'sunday'), member_id, None)
+
+    failures = []
+    start = threading.Barrier(6)
+
+    def tablet(offset):
+        client = login(app)
+        start.wait()
+        # Every tablet walks all members, so each one is tapped six times
+        for index in range(len(member_ids)):
+            member_id = member_ids[(index + offset * 10) % len(member_ids)]
+            response = client.post('/api/v1/attendance/checkin', json=dict(PAYLOAD, member_id=member_id))
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=tablet, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    other_worker.stop()
+
+    with app.app_context():
+        buffer = attendance.get_buffer()
+        buffer.stop()
+        assert failures == []
+        rows = db.session.query(Attendance.member_id).filter(Attendance.service_date == SUNDAY).all()
+        assert sorted(member_id for (member_id,) in rows) == member_ids
+        assert sum(buffer.headcount((SUNDAY, 'sunday')).values()) == len(member_ids)
+        assert buffer.stats['failures'] == 0
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_insert_new_skips_recorded_rows_without_on_conflict(app, monkeypatch):
+    with app.app_context():
+        add_members(3)
+        member_ids = [m.id for m in Member.query.order_by(Member.id)]
+        rows = [dict(member_id=member_id, caregroup_id=None, service_date=SUNDAY, service='sunday',
+                     checked_in_at=None, checked_in_by=None) for member_id in member_ids]
+        with db.engine.begin() as conn:
+            attendance.insert_new(conn, rows[:2])
+        # A database without ON CONFLICT takes the select-then-insert path
+        with db.engine.begin() as conn:
+            monkeypatch.setattr(conn.dialect, 'name', 'mysql')
+            attendance.insert_new(conn, rows)
+        assert Attendance.query.filter_by(service_date=SUNDAY).count() == 3
@@ -0,0 +1,61 @@
+"""
+Church Information System - Bulk Member Update Tests
+"""
+import pytest
+from app import db
+from app.models import Member, CareGroup
+
+
+def _setup(app):
+    with app.app_context():
+        caregroup_ids = [cg.id for cg in CareGroup.query.order_by(CareGroup.id)]
+        for i in range(12):
+            db.session.add(Member(fullname=f'{"Anna Smith" if i % 3 == 0 else "Mark Reyes"} {i:02d}',
+                                  caregroup_id=caregroup_ids[0], status='active'))
+        db.session.commit()
+        return caregroup_ids[1]
+
+
+def test_bulk_update_scoped_by_search_reports_affected_rows(app, client):
+    target_id = _setup(app)
+    response = client.post('/members/bulk', json={
+        'action': 'assign_caregroup', 'target_id': target_id, 'scope': 'filter', 'search': 'smith',
+    })
+    assert response.status_code == 200
+    assert response.json['success']
+    assert response.json['affected'] == 4
+    assert response.json['message'] == '4 members updated.'
+    with app.app_context():
+        moved = Member.query.filter_by(caregroup_id=target_id).all()
+        assert sorted(m.fullname for m in moved) == ['Anna Smith 00', 'Anna Smith 03',
+                                                     'Anna Smith 06', 'Anna Smith 09']
+        assert db.session.get(CareGroup, target_id).member_count == 4
+
+
+def test_bulk_update_by_ids_reports_affected_rows(app, client):
+    target_id = _setup(app)
+    with app.app_context():
+        ids = [m.id for m in Member.query.order_by(Member.id).limit(5)]
+    response = client.post('/members/bulk', json={
+        'action': 'assign_caregroup', 'target_id': target_id, 'member_ids': ids,
+    })
+    assert response.json['affected'] == 5
+    with app.app_context():
+        assert Member.query.filter_by(caregroup_id=target_id).count() == 5
+
+
+@pytest.mark.parametrize('member_ids', ['123', 123, ['1', '2'], [1.5], [True], {'1': 1}])
+def test_bulk_update_rejects_member_ids_that_are_not_a_list_of_ints(app, client, member_ids):
+    target_id = _setup(app)
+    response = client.post('/members/bulk', json={
+        'action': 'assign_caregroup', 'target_id': target_id, 'member_ids': member_ids,
+    })
+    assert response.status_code == 400
+    assert response.json['affected'] == 0
+    with app.app_context():
+        assert Member.query.filter_by(caregroup_id=target_id).count() == 0
+
+
+def test_bulk_update_rejects_a_json_body_that_is_not_an_object(client):
+    response = client.post('/members/bulk', json=[1, 2, 3])
+    assert response.status_code == 400
@@ -0,0 +1,49 @@
+"""
+Church Information System - Cache Tests
+"""
+import threading
+from app import db, cache, queries
+from app.pagination import cached_count
+from app.cache import SQLiteCache
+from app.models import Member, Ministry
+from tests.conftest import add_members, QueryCounter
+
+
+def test_sqlite_cache_incr_counts_every_bump_across_threads(tmp_path):
+    backend = SQLiteCache(str(tmp_path / 'cache.db'))
+    assert backend.incr('version:members') == 1
+
+    def bump():
+        for _ in range(50):
+            backend.incr('version:members')
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.counters(['version:members', 'version:other']) == [201, 0]
+
+
+def test_dashboard_lists_active_ministries_only(app):
+    with app.app_context():
+        add_members(12)
+        retired = Ministry.query.order_by(Ministry.id).first()
+        retired.status = 'inactive'
+        db.session.commit()
+        cache.clear()
+        names = [name for name, _ in queries.dashboard_stats()['ministry_stats']]
+        assert names and retired.name not in names
+
+
+def test_list_total_is_recounted_after_a_write(app):
+    with app.app_context():
+        add_members(3)
+        active = Member.query.filter(Member.status == 'active')
+        assert cached_count(active) == 3
+        add_members(2, offset=3)
+        # Within PAGINATION_COUNT_TTL, but the members stamp moved
+        assert cached_count(active) == 5
+        with QueryCounter(db.engine) as counter:
+            assert cached_count(active) == 5
+        assert counter.count == 0
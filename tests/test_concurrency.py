@@ -0,0 +1,76 @@
+"""
+Church Information System - Concurrent Reader/Writer Tests
+"""
+import threading
+import sqlalchemy as sa
+import config
+from app import db
+from app.models import Member
+from tests.conftest import add_members, login, make_app
+
+READERS = 4
+WRITERS = 4
+STEPS = 25
+
+
+def test_mixed_readers_and_writers_proceed_without_lock_errors(tmp_path):
+    app = make_app(tmp_path / 'concurrency.db',
+                   SQLITE_PRAGMAS=config.Config.SQLITE_PRAGMAS,
+                   SQLITE_READ_ONLY_POOL=True,
+                   DB_POOL_SIZE=READERS + WRITERS + 1)
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.execute(sa.text('PRAGMA journal_mode')).scalar() == 'wal'
+        add_members(50)
+        member_ids = [m.id for m in Member.query.all()]
+
+    failures = []
+    lock = threading.Lock()
+    start = threading.Barrier(READERS + WRITERS)
+
+    def record(role, step, response, expected):
+        body = response.get_data()
+        if response.status_code != expected or b'database is locked' in body:
+            with lock:
+                failures.append((role, step, response.status_code, b'database is locked' in body))
+
+    def reader():
+        client = login(app)
+        start.wait()
+        for step in range(STEPS):
+            response = client.get('/members/' if step % 2 else '/dashboard')
+            record('reader', step, response, 200)
+
+    def writer(seed):
+        client = login(app)
+        start.wait()
+        for step in range(STEPS):
+            if step % 2:
+                response = client.post('/settings/appearance/theme',
+                                       json={'theme': 'dark' if step % 4 == 1 else 'light'})
+                record('theme', step, response, 200)
+            else:
+                member_id = member_ids[(seed * STEPS + step) % len(member_ids)]
+                response = client.post(f'/members/{member_id}/edit', data={
+                    'fullname': f'Concurrent Member {member_id}',
+                    'gender': 'Female',
+                    'address': f'{step} Writer St',
+                    'contact': f'09{seed:02d}{step:07d}',
+                })
+                # Success redirects; a failed commit re-renders the form
+                record('edit', step, response, 302)
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    with app.app_context():
+        edited = Member.query.filter(Member.fullname.like('Concurrent Member %')).count()
+        assert edited == len({(n * STEPS + step) % len(member_ids)
+                              for n in range(WRITERS) for step in range(0, STEPS, 2)})
+        db.session.remove()
+        db.engine.dispose()
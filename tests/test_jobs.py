@@ -0,0 +1,65 @@
+"""
+Church Information System - Background Job Tests
+"""
+import os
+import pytest
+from app import db, jobs, importer
+from app.models import Job, Member
+from tests.conftest import make_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path / 'jobs.db', JOBS_FOLDER=str(tmp_path / 'jobs'))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _run_next():
+    job = jobs.claim('pytest')
+    jobs.execute(job)
+    return db.session.get(Job, job.id)
+
+
+def test_failed_import_keeps_its_upload_for_a_retry(app, monkeypatch):
+    with app.app_context():
+        path = os.path.join(jobs.job_folder(), 'staged.csv')
+        with open(path, 'w') as f:
+            f.write('fullname,status\nRetry Member,active\n')
+        job_id = jobs.enqueue('members.import', {'path': path, 'import_format': 'csv'}).id
+        db.session.commit()
+
+        real_import = importer.import_members
+
+        def broken(*args, **kwargs):
+            raise RuntimeError('database went away')
+
+        monkeypatch.setattr(importer, 'import_members', broken)
+        job = _run_next()
+        assert job.status == 'failed'
+        assert os.path.exists(path)
+
+        monkeypatch.setattr(importer, 'import_members', real_import)
+        assert jobs.retry(job_id)
+        db.session.commit()
+        job = _run_next()
+        assert job.status == 'succeeded'
+        assert Member.query.filter_by(fullname='Retry Member').count() == 1
+        assert not os.path.exists(path)
+
+
+def test_prune_removes_uploads_of_failed_imports(app, monkeypatch):
+    with app.app_context():
+        path = os.path.join(jobs.job_folder(), 'staged.csv')
+        with open(path, 'w') as f:
+            f.write('fullname\n')
+        jobs.enqueue('members.import', {'path': path})
+        db.session.commit()
+        monkeypatch.setattr(importer, 'import_members', lambda *a, **k: 1 / 0)
+        assert _run_next().status == 'failed'
+
+    result = app.test_cli_runner().invoke(args=['jobs', 'prune', '--days', '0'])
+    assert 'Deleted 1 job(s).' in result.output
+    assert not os.path.exists(path)
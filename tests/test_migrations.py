@@ -0,0 +1,44 @@
+"""
+Church Information System - Migration and Query Plan Tests
+"""
+import sqlalchemy as sa
+from app import db, migrations
+from app.models import Member, CareGroup, Ministry
+from tests.conftest import add_members
+
+
+def _migrated_indexes():
+    return [index.name for model in (Member, CareGroup, Ministry) for index in model.__table__.indexes
+            if index.name.startswith(('ix_members_status_', 'ix_members_updated',
+                                      'ix_caregroups_updated', 'ix_ministries_updated'))]
+
+
+def test_fresh_database_is_at_head_and_hot_queries_use_indexes(app):
+    with app.app_context():
+        add_members(50)
+        with db.engine.connect() as conn:
+            assert migrations.current_version(conn) == migrations.head_version()
+        assert migrations.check_query_plans() == {}
+
+
+def test_upgrade_from_version_zero_restores_index_plans(app):
+    with app.app_context():
+        add_members(50)
+        # Back to the schema before any migration: no composite indexes, no version rows
+        with db.engine.begin() as conn:
+            for name in _migrated_indexes():
+                conn.execute(sa.text(f'DROP INDEX IF EXISTS {name}'))
+            conn.execute(sa.text('DELETE FROM schema_version'))
+
+        # Without the indexes the check has to fail loudly
+        failures = migrations.check_query_plans()
+        assert 'list by care group' in failures
+        assert any(line.startswith('SCAN') for line in failures['list by care group'])
+        # End the session's read transaction, which still sees the old schema
+        db.session.rollback()
+
+        applied = migrations.upgrade()
+        assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+        assert migrations.check_query_plans() == {}
+        # Applied once only
+        assert migrations.upgrade() == []
@@ -0,0 +1,29 @@
+"""
+Church Information System - Model Tests
+"""
+from datetime import date
+import pytest
+from app import db, models
+from app.api import MEMBER_FIELDS
+from app.models import Member
+
+
+class Birthday(date):
+    """date with today() pinned to the day before a birthday, not the database's UTC date"""
+
+    @classmethod
+    def today(cls):
+        return cls(2024, 6, 14)
+
+
+@pytest.mark.parametrize('expression', [lambda: Member.age, lambda: MEMBER_FIELDS['age']],
+                         ids=['fresh', 'built-at-import'])
+def test_age_in_sql_matches_python_on_the_local_date(app, monkeypatch, expression):
+    with app.app_context():
+        db.session.add(Member(fullname='June Baby', date_of_birth=date(2000, 6, 15), status='active'))
+        db.session.commit()
+        monkeypatch.setattr(models, 'date', Birthday)
+        member = Member.query.one()
+        assert member.age == 23
+        assert db.session.query(expression()).scalar() == 23
+        assert Member.query.filter(Member.age == 23).count() == 1
@@ -0,0 +1,60 @@
+"""
+Church Information System - Query Count Tests
+"""
+import pytest
+from app import db, cache
+from app.models import CareGroup, Ministry
+from tests.conftest import QueryCounter, add_members
+
+# Statements per request with cold data caches; the bound must hold at any size
+PAGES = {
+    '/members/': 4,
+    '/caregroups/': 3,
+    '/caregroups/{caregroup_id}': 4,
+    '/admin/ministries': 3,
+}
+
+
+def _grow(app, step):
+    """More care groups, ministries and members than the step before"""
+    with app.app_context():
+        for i in range(3):
+            db.session.add(CareGroup(name=f'Group {step}-{i}', color='#336699'))
+            db.session.add(Ministry(name=f'Ministry {step}-{i}'))
+        db.session.commit()
+        add_members(1 + step * 40, offset=step * 1000)
+        return CareGroup.query.order_by(CareGroup.id).first().id
+
+
+def _count(app, client, path):
+    # Warm the per-process settings and identity, then drop cached page data
+    assert client.get(path).status_code == 200
+    with app.app_context():
+        engine = db.engine
+        cache.bump('members', 'caregroups', 'ministries')
+    with QueryCounter(engine) as counter:
+        response = client.get(path)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize('path', sorted(PAGES))
+def test_pages_run_a_fixed_number_of_queries(app, client, path):
+    counts = []
+    for step in range(2):
+        caregroup_id = _grow(app, step)
+        counts.append(_count(app, client, path.format(caregroup_id=caregroup_id)))
+    assert counts[0] == counts[1], f'{path} ran {counts} queries as the tables grew'
+    assert counts[1] <= PAGES[path]
+
+
+def test_cached_caregroup_list_runs_no_queries(app, client):
+    _grow(app, 1)
+    assert client.get('/caregroups/').status_code == 200
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        response = client.get('/caregroups/')
+    assert response.status_code == 200
+    assert b'Group 1-0' in response.data
+    assert counter.count == 0
@@ -0,0 +1,45 @@
+"""
+Church Information System - Report Rollup Tests
+"""
+import pytest
+from app import db, reports
+from app.models import Member, CareGroup, ReportMember, ReportDaily
+from tests.conftest import make_app, add_members
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path / 'test.db', SYNC_SETTLE_SECONDS=0)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+# mysql stands for a database without ON CONFLICT: the rollups are
+# upserted with a lookup, an UPDATE per existing row and an INSERT
+@pytest.mark.parametrize('dialect', ['sqlite', 'mysql'])
+def test_refresh_folds_in_joins_and_moves(app, monkeypatch, dialect):
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, 'name', dialect)
+        add_members(8)
+        assert reports.refresh() == 8
+
+        first, second = CareGroup.query.order_by(CareGroup.id).limit(2).all()
+        moved = Member.query.filter_by(caregroup_id=first.id).order_by(Member.id).first()
+        moved.caregroup_id = second.id
+        db.session.commit()
+        assert reports.refresh() == 1
+
+        assert ReportMember.query.count() == 8
+        assert db.session.get(ReportMember, moved.id).caregroup_id == second.id
+        totals = {group: (joined, left) for group, joined, left in db.session.query(
+            ReportDaily.caregroup_id, db.func.sum(ReportDaily.joined), db.func.sum(ReportDaily.left)
+        ).group_by(ReportDaily.caregroup_id)}
+        assert totals[first.id] == (2, 1)
+        assert totals[second.id] == (3, 0)
+
+        growth = reports.growth(months=3)
+        assert growth['datasets'][0]['data'][-1] == 8
+        assert growth['datasets'][1]['data'] == [0, 0, 9]
+        assert growth['datasets'][2]['data'] == [0, 0, 1]
@@ -0,0 +1,18 @@
+"""
+Church Information System - Member Search Tests
+"""
+import pytest
+from app import search
+from tests.conftest import add_members
+
+
+@pytest.mark.parametrize('materialized', [True, False])
+def test_search_with_and_without_materialized_cte(app, client, monkeypatch, materialized):
+    # SQLite before 3.35 cannot parse AS MATERIALIZED
+    monkeypatch.setattr(search, 'MATERIALIZED_CTE', materialized)
+    with app.app_context():
+        add_members(30)
+    response = client.get('/members/?search=Member 00011')
+    assert response.status_code == 200
+    assert b'Member 00011' in response.data
+    assert b'Member 00012' not in response.data
@@ -0,0 +1,20 @@
+"""
+Church Information System - System Settings Tests
+"""
+import pytest
+from app.settings_store import settings
+
+
+@pytest.mark.parametrize('value', ['0', '201', '-5', 'ten', ''])
+def test_items_per_page_out_of_range_is_rejected(app, client, value):
+    response = client.post('/admin/system/update', data={'items_per_page': value}, follow_redirects=True)
+    assert b'Items per page must be a whole number from 1 to 200.' in response.data
+    with app.app_context():
+        assert settings.items_per_page == app.config['ITEMS_PER_PAGE']
+
+
+def test_items_per_page_is_saved(app, client):
+    response = client.post('/admin/system/update', data={'items_per_page': '50'}, follow_redirects=True)
+    assert b'System settings updated successfully!' in response.data
+    with app.app_context():
+        assert settings.items_per_page == 50
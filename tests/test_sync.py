@@ -0,0 +1,60 @@
+"""
+Church Information System - Change Feed Tests
+"""
+import pytest
+from app import db, sync
+from app.models import User, Member, CareGroup, MemberMove
+from tests.conftest import make_app, login
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path / 'test.db', SYNC_SETTLE_SECONDS=0)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_leader_gets_tombstones_only_for_members_who_left_their_group(app):
+    with app.app_context():
+        mine, other = CareGroup.query.order_by(CareGroup.id).limit(2).all()
+        leader = User(username='leader', role='leader', caregroup_id=mine.id)
+        leader.set_password('leader123')
+        members = {name: Member(fullname=name, caregroup_id=group.id, status='active')
+                   for name, group in (('stays', mine), ('edited', mine), ('bulk', mine),
+                                       ('deactivated', mine), ('elsewhere', other))}
+        db.session.add_all([leader, *members.values()])
+        db.session.commit()
+        ids = {name: member.id for name, member in members.items()}
+        mine_id, other_id = mine.id, other.id
+
+        feed = sync.changes(leader)
+        assert {row['id'] for row in feed['data']['members']} == {
+            ids['stays'], ids['edited'], ids['bulk'], ids['deactivated']}
+        assert feed['deleted']['members'] == []
+        cursor = feed['cursor']
+
+        members['edited'].caregroup_id = other_id
+        members['deactivated'].status = 'inactive'
+        members['elsewhere'].fullname = 'elsewhere, edited'
+        db.session.commit()
+
+    response = login(app).post('/members/bulk', json={
+        'action': 'assign_caregroup', 'target_id': other_id, 'member_ids': [ids['bulk']]})
+    assert response.get_json()['affected'] == 1
+
+    with app.app_context():
+        leader = User.query.filter_by(username='leader').one()
+        assert {(move.member_id, move.caregroup_id) for move in MemberMove.query} == {
+            (ids['edited'], mine_id), (ids['bulk'], mine_id)}
+        feed = sync.changes(leader, cursor)
+        assert feed['data']['members'] == []
+        assert sorted(feed['deleted']['members']) == sorted([ids['edited'], ids['bulk'], ids['deactivated']])
+
+        # An admin still sees everything, with every inactive row as a tombstone
+        admin = User.query.filter_by(username='admin').one()
+        feed = sync.changes(admin, cursor)
+        assert {row['id'] for row in feed['data']['members']} == {
+            ids['edited'], ids['bulk'], ids['elsewhere']}
+        assert feed['deleted']['members'] == [ids['deactivated']]
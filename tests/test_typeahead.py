@@ -0,0 +1,35 @@
+"""
+Church Information System - Typeahead Tests
+"""
+from app import db, typeahead
+from app.models import User, Member, CareGroup
+
+
+def test_leader_lookup_scans_only_their_care_group(app, monkeypatch):
+    monkeypatch.setattr(typeahead, 'MAX_SCAN', 10)
+    monkeypatch.setattr(typeahead, '_typeahead_pid', None)
+    with app.app_context():
+        mine, other = CareGroup.query.order_by(CareGroup.id).limit(2).all()
+        # Other groups' Alexes sort first and fill the scan cap on their own
+        db.session.add_all(Member(fullname=f'Alex A{i:03d}', caregroup_id=other.id, status='active')
+                           for i in range(50))
+        db.session.add_all(Member(fullname=f'Alex Z{i:03d}', caregroup_id=mine.id, status='active')
+                           for i in range(3))
+        leader = User(username='leader', role='leader', caregroup_id=mine.id)
+        leader.set_password('leader123')
+        db.session.add(leader)
+        db.session.commit()
+
+        assert [entry.label for entry in typeahead.member_matches(leader, 'alex')] == [
+            'Alex Z000', 'Alex Z001', 'Alex Z002']
+        admin = User.query.filter_by(username='admin').one()
+        assert len(typeahead.member_matches(admin, 'alex')) == 10
+
+        # A move is picked up by both groups' indexes
+        moved = Member.query.filter_by(fullname='Alex Z001').one()
+        moved.caregroup_id = other.id
+        db.session.commit()
+        assert [entry.label for entry in typeahead.member_matches(leader, 'alex')] == [
+            'Alex Z000', 'Alex Z002']
+        leader.caregroup_id = other.id
+        assert 'Alex Z001' in [entry.label for entry in typeahead.member_matches(leader, 'alex z')]